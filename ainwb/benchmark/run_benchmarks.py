@@ -0,0 +1,287 @@
+#!/usr/bin/python
+"""
+Benchmarks for the API's writer hot paths
+
+Each benchmark creates files in a temporary directory, which is
+removed when the benchmarks finish. Results are written as JSON
+(to stdout, or to the file given with --output) so they can be
+compared across commits. A previous results file can be given with
+--compare to print the change in each benchmark
+
+Usage:
+    python run_benchmarks.py [--output results.json] [--repeat N]
+        [--only name[,name...]] [--large] [--compare old.json]
+
+The 1 GB set_data benchmark needs several GB of memory and disk, and
+is only run when --large is specified
+"""
+import sys
+import os
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import timeit
+import h5py
+import numpy as np
+import nwb
+
+MB = 1024 * 1024
+
+# list of (name, function, parameters). functions return the time,
+#   in seconds, of the operation being measured, and the number of
+#   items processed
+BENCHMARKS = []
+
+def benchmark(name, **params):
+    def register(func):
+        BENCHMARKS.append((name, func, params))
+        return func
+    return register
+
+timer = timeit.default_timer
+
+# counter used to give each file a unique name
+file_count = [0]
+
+def create_file(tmp_dir, **vargs):
+    file_count[0] += 1
+    settings = {}
+    settings["filename"] = os.path.join(tmp_dir, "bench_%d.nwb" % file_count[0])
+    settings["identifier"] = nwb.create_identifier("benchmark")
+    settings["overwrite"] = True
+    settings["description"] = "Benchmark file"
+    settings.update(vargs)
+    return nwb.NWB(**settings)
+
+def add_series(neurodata, name, samples, modality="acquisition"):
+    ts = neurodata.create_timeseries("TimeSeries", name, modality)
+    ts.set_data(np.zeros(samples, dtype=np.float32), "Volts", 1.0, 0.001)
+    ts.set_time(np.arange(samples) * 0.001)
+    return ts
+
+########################################################################
+# benchmarks
+
+@benchmark("construct", count=50)
+def bench_construct(tmp_dir, count):
+    files = []
+    t0 = timer()
+    for i in range(count):
+        files.append(create_file(tmp_dir))
+    elapsed = timer() - t0
+    for neurodata in files:
+        neurodata.close()
+    return elapsed, count
+
+@benchmark("create_timeseries", count=1000)
+def bench_create_timeseries(tmp_dir, count):
+    neurodata = create_file(tmp_dir)
+    series = []
+    t0 = timer()
+    for i in range(count):
+        series.append(neurodata.create_timeseries("TwoPhotonSeries", "ts%d" % i, "acquisition"))
+    elapsed = timer() - t0
+    for ts in series:
+        ts.set_data(np.zeros((1, 2, 2), dtype=np.uint8), "grayscale", 1.0, 1.0)
+        ts.set_time([0.0])
+        ts.set_value("format", "raw")
+        ts.set_value("dimension", [2, 2])
+        ts.set_value("imaging_plane", "plane")
+        ts.set_value("bits_per_pixel", 8)
+        ts.set_value("field_of_view", [0.1, 0.1])
+        ts.set_value("scan_line_rate", 1.0)
+        ts.set_value("pmt_gain", 1.0)
+        ts.finalize()
+    neurodata.close()
+    return elapsed, count
+
+def bench_set_data(tmp_dir, size_mb):
+    neurodata = create_file(tmp_dir)
+    samples = size_mb * MB // 4
+    data = np.random.random(samples).astype(np.float32)
+    t0 = timer()
+    ts = neurodata.create_timeseries("TimeSeries", "data", "acquisition")
+    ts.set_data(data, "Volts", 1.0, 0.001)
+    ts.set_time_by_rate(0.0, 1000.0)
+    ts.set_value("num_samples", samples)
+    ts.finalize()
+    neurodata.sync_writer()
+    elapsed = timer() - t0
+    neurodata.close()
+    return elapsed, samples
+
+benchmark("set_data_1MB", size_mb=1)(bench_set_data)
+benchmark("set_data_100MB", size_mb=100)(bench_set_data)
+benchmark("set_data_1GB", size_mb=1024, large=True)(bench_set_data)
+
+@benchmark("add_annotation", count=100000)
+def bench_add_annotation(tmp_dir, count):
+    neurodata = create_file(tmp_dir)
+    annot = neurodata.create_timeseries("AnnotationSeries", "notes", "acquisition")
+    annot.set_description("Benchmark annotations")
+    t0 = timer()
+    for i in range(count):
+        annot.add_annotation("event %d" % i, i * 0.01)
+    annot.finalize()
+    neurodata.sync_writer()
+    elapsed = timer() - t0
+    neurodata.close()
+    return elapsed, count
+
+@benchmark("epoch_add_timeseries", samples=10000000, epochs=100)
+def bench_epoch_add_timeseries(tmp_dir, samples, epochs):
+    neurodata = create_file(tmp_dir, auto_compress=False)
+    ts = add_series(neurodata, "long", samples)
+    ts.finalize()
+    duration = samples * 0.001
+    t0 = timer()
+    for i in range(epochs):
+        start = duration * i / epochs
+        ep = neurodata.create_epoch("ep%d" % i, start, start + duration / (2.0 * epochs))
+        ep.add_timeseries("long", ts)
+        ep.finalize()
+    elapsed = timer() - t0
+    neurodata.close()
+    return elapsed, epochs
+
+@benchmark("add_unit", count=10000)
+def bench_add_unit(tmp_dir, count):
+    neurodata = create_file(tmp_dir)
+    mod = neurodata.create_module("units")
+    iface = mod.create_interface("UnitTimes")
+    times = np.arange(100) * 0.1
+    t0 = timer()
+    for i in range(count):
+        iface.add_unit("unit_%d" % i, times, "benchmark unit", "benchmark")
+    iface.finalize()
+    mod.finalize()
+    neurodata.sync_writer()
+    elapsed = timer() - t0
+    neurodata.close()
+    return elapsed, count
+
+@benchmark("add_roi", count=1000, size=64)
+def bench_add_roi(tmp_dir, count, size):
+    neurodata = create_file(tmp_dir)
+    mod = neurodata.create_module("segmentation")
+    iface = mod.create_interface("ImageSegmentation")
+    iface.create_imaging_plane("plane", "benchmark plane")
+    iface.add_reference_image("plane", "reference", np.zeros((size, size), dtype=np.uint8))
+    pixels = [[x, y] for x in range(8) for y in range(8)]
+    t0 = timer()
+    for i in range(count):
+        iface.add_roi_mask_pixels("plane", "roi_%d" % i, "benchmark roi", pixels, None, size, size)
+    iface.finalize()
+    mod.finalize()
+    neurodata.sync_writer()
+    elapsed = timer() - t0
+    neurodata.close()
+    return elapsed, count
+
+@benchmark("close", series=500, epochs=50)
+def bench_close(tmp_dir, series, epochs):
+    neurodata = create_file(tmp_dir)
+    for i in range(series):
+        add_series(neurodata, "ts%d" % i, 100)
+    for i in range(epochs):
+        ep = neurodata.create_epoch("ep%d" % i, i * 0.001, (i + 1) * 0.001)
+        ep.add_tag("benchmark")
+    t0 = timer()
+    neurodata.close()
+    elapsed = timer() - t0
+    return elapsed, series
+
+########################################################################
+
+def git_commit():
+    try:
+        out = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.STDOUT)
+        return out.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(names, repeat, large):
+    results = []
+    tmp_dir = tempfile.mkdtemp(prefix="nwb_bench_")
+    try:
+        for name, func, params in BENCHMARKS:
+            if names is not None and name not in names:
+                continue
+            args = dict(params)
+            if args.pop("large", False) and not large:
+                continue
+            runs = []
+            for i in range(repeat):
+                elapsed, items = func(tmp_dir, **args)
+                runs.append(elapsed)
+                # remove files between runs to limit disk use
+                for fname in os.listdir(tmp_dir):
+                    os.remove(os.path.join(tmp_dir, fname))
+            best = min(runs)
+            result = {}
+            result["name"] = name
+            result["params"] = args
+            result["seconds"] = best
+            result["runs"] = runs
+            result["items"] = items
+            result["us_per_item"] = 1e6 * best / items
+            results.append(result)
+            sys.stderr.write("%-24s %10.4f s  %10.2f us/item\n" % (name, best, result["us_per_item"]))
+    finally:
+        shutil.rmtree(tmp_dir)
+    return results
+
+def compare(results, fname):
+    with open(fname, "r") as f:
+        old = json.load(f)
+    prev = {}
+    for r in old["results"]:
+        prev[r["name"]] = r
+    sys.stderr.write("\nChange relative to %s\n" % fname)
+    for r in results:
+        if r["name"] not in prev:
+            continue
+        ratio = r["seconds"] / prev[r["name"]]["seconds"]
+        sys.stderr.write("%-24s %+8.1f%%\n" % (r["name"], 100.0 * (ratio - 1.0)))
+
+def main():
+    parser = argparse.ArgumentParser(description="NWB API benchmarks")
+    parser.add_argument("--output", help="file to write JSON results to (default stdout)")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs of each benchmark (fastest is reported)")
+    parser.add_argument("--only", help="comma-separated list of benchmarks to run")
+    parser.add_argument("--large", action="store_true", help="include benchmarks that need several GB")
+    parser.add_argument("--compare", help="previous JSON results to compare against")
+    parser.add_argument("--list", action="store_true", help="list benchmarks and exit")
+    args = parser.parse_args()
+    if args.list:
+        for name, func, params in BENCHMARKS:
+            print(name)
+        return
+    names = None
+    if args.only is not None:
+        names = args.only.split(",")
+    results = run(names, args.repeat, args.large)
+    report = {}
+    report["nwb_version"] = nwb.__version__
+    report["commit"] = git_commit()
+    report["date"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    report["python"] = platform.python_version()
+    report["numpy"] = np.__version__
+    report["h5py"] = h5py.version.version
+    report["hdf5"] = h5py.version.hdf5_version
+    report["platform"] = platform.platform()
+    report["results"] = results
+    if args.output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare is not None:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,3 @@
-from .nwb import create_identifier, NWB, get_major_vers, get_minor_vers, get_patch_vers, get_file_vers_string, __version__
-
+from .nwb import create_identifier, NWB, get_major_vers, get_minor_vers, get_patch_vers, get_file_vers_string, chunk_shape, preload_spec, __version__
+from .nwbrd import NWBReader
+from .nwbcat import build_catalog
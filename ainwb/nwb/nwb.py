@@ -38,9 +38,20 @@ import os.path
 import shutil
 import time
 import json
+import pickle
 import traceback
 import h5py
 import copy
+import zlib
+import itertools
+import bisect
+import collections
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+from multiprocessing.pool import ThreadPool
 import numpy as np
 from . import nwbts
 from . import nwbep
@@ -53,6 +64,120 @@ VERS_PATCH = 5
 __version__ = "%d.%d.%d" % (VERS_MAJOR, VERS_MINOR, VERS_PATCH)
 FILE_VERSION_STR = "NWB-%s" % __version__
 
+# chunking and compression presets that can be selected as a file's
+#   default storage policy
+STORAGE_PRESETS = {
+    "gzip": { "compression": "gzip", "compression_opts": 4, "chunks": True },
+    "lzf": { "compression": "lzf", "chunks": True },
+    "none": {}
+}
+
+# number of datasets kept in the storage log (see get_storage_log()).
+#   older entries are discarded, so the log doesn't grow without limit
+#   for files with many datasets
+STORAGE_LOG_ENTRIES = 10000
+
+# storage settings that belong to a particular compression filter.
+#   these are dropped from the file's policy when a field selects a
+#   different filter
+FILTER_OPTIONS = ["compression_opts"]
+
+# arrays smaller than this are compressed by HDF5 even when multiple
+#   compression threads are requested
+PARALLEL_COMPRESSION_BYTES = 4 * 1024 * 1024
+
+# external arrays (eg, np.memmap) are copied into the file in slabs of
+#   approximately this size
+SLAB_BYTES = 64 * 1024 * 1024
+
+# target size of a dataset chunk, in bytes, when the library chooses the
+#   chunk shape
+CHUNK_BYTES = 1024 * 1024
+
+# layout of the object index written at the root of each file. there's
+#   one row per time series, module, interface and epoch (see
+#   NWB.write_object_index())
+OBJECT_INDEX_TEXT = h5py.special_dtype(vlen=str)
+OBJECT_INDEX_DTYPE = np.dtype([
+    ("path", OBJECT_INDEX_TEXT),
+    ("neurodata_type", OBJECT_INDEX_TEXT),
+    ("ancestry", OBJECT_INDEX_TEXT),
+    ("num_samples", np.int64),
+    ("start_time", np.float64),
+    ("stop_time", np.float64),
+    ("dtype", OBJECT_INDEX_TEXT),
+    ("shape", OBJECT_INDEX_TEXT)
+])
+
+# default memory limit for the indexes of time series timestamps that
+#   are kept for finding the overlap with epochs
+TIMESTAMP_CACHE_BYTES = 256 * 1024 * 1024
+
+# number of epoch overlaps found for a time series by searching its
+#   timestamps before an index is built for it. a search reads a few
+#   blocks of timestamps, while building an index reads all of them
+TIMESTAMP_INDEX_QUERIES = 16
+
+# chunk layouts for TimeSeries types, and the fraction of the target
+#   chunk size to use. 'frame' chunks always hold whole frames, so
+#   reading one frame touches a single chunk. 'time' chunks hold all
+#   channels for a window of time, and are only split across channels
+#   when a single sample is larger than the target. types that aren't
+#   listed use the layout of their nearest listed ancestor
+CHUNK_LAYOUTS = {
+    "TimeSeries": ("time", 1.0),
+    "AnnotationSeries": ("time", 1.0 / 64),
+    "ImageSeries": ("frame", 1.0),
+    "ImageMaskSeries": ("frame", 1.0)
+}
+
+def chunk_shape(ancestry, shape, itemsize, target_bytes=CHUNK_BYTES, resizable=False):
+    """ Calculates the chunk shape for a TimeSeries dataset. The first
+        dimension of the dataset is time. The layout is selected from
+        the TimeSeries ancestry (see CHUNK_LAYOUTS)
+
+        Arguments:
+            *ancestry* (text array) Ancestry of the TimeSeries, eg
+            ['TimeSeries', 'ImageSeries', 'TwoPhotonSeries']
+
+            *shape* (int tuple) Shape of the dataset
+
+            *itemsize* (int) Size of one dataset element, in bytes
+
+            *target_bytes* (int) Approximate size of one chunk, in bytes
+
+            *resizable* (boolean) True if the dataset can grow along its
+            first dimension
+
+        Returns:
+            Chunk shape (int tuple), or None if the dataset can't be
+            chunked (eg, it's a scalar or empty)
+    """
+    shape = tuple(int(x) for x in shape)
+    if len(shape) == 0 or (min(shape) == 0 and not resizable):
+        return None
+    layout, scale = "time", 1.0
+    for i in range(len(ancestry)-1, -1, -1):
+        if ancestry[i] in CHUNK_LAYOUTS:
+            layout, scale = CHUNK_LAYOUTS[ancestry[i]]
+            break
+    target = max(int(target_bytes * scale), itemsize)
+    row = list(shape[1:])
+    row_bytes = itemsize * int(np.prod(row))
+    if row_bytes == 0:
+        return None
+    # a single sample (time point) larger than the target is split
+    #   along its largest dimension, except for frames
+    if layout == "time":
+        while row_bytes > target and max(row) > 1:
+            k = row.index(max(row))
+            row[k] = (row[k] + 1) // 2
+            row_bytes = itemsize * int(np.prod(row))
+    n = max(1, target // row_bytes)
+    if not resizable:
+        n = min(n, shape[0])
+    return tuple([n] + row)
+
 def get_major_vers():
     return VERS_MAJOR
 
@@ -86,6 +211,275 @@ def recursive_dictionary_merge(x, y):
             x[key] = y[key]
     return x
 
+# converts text read from the file (bytes, or arrays of bytes) to str.
+#   arrays are returned as object arrays of str
+def decode_value(val):
+    if isinstance(val, bytes):
+        return val.decode('utf-8')
+    if isinstance(val, np.ndarray):
+        if val.dtype.kind == "S":
+            return np.char.decode(val, 'utf-8').astype(object)
+        if val.dtype.kind == "O":
+            # variable-length strings, which may be bytes or str
+            out = np.empty(val.shape, dtype=object)
+            out[...] = decode_objects(val)
+            return out
+    return val
+
+decode_objects = np.frompyfunc(lambda x: x.decode('utf-8') if isinstance(x, bytes) else x, 1, 1)
+
+# finds the time series, modules, interfaces and epochs in their standard
+#   locations in a file, for files that don't have an object index.
+#   returns a dict mapping path to neurodata_type
+def find_objects(fp):
+    objects = {}
+    for base in ["/acquisition/timeseries", "/stimulus/presentation", "/stimulus/templates"]:
+        if base in fp:
+            for name in fp[base]:
+                objects[base + "/" + name] = "TimeSeries"
+    if "processing" in fp:
+        for mod in fp["processing"]:
+            path = "/processing/" + mod
+            objects[path] = "Module"
+            for iface in fp[path]:
+                grp = fp[path + "/" + iface]
+                if not isinstance(grp, h5py.Group):
+                    continue
+                objects[grp.name] = "Interface"
+                for name in grp:
+                    if decode_value(grp[name].attrs.get("neurodata_type")) == "TimeSeries":
+                        objects[grp.name + "/" + name] = "TimeSeries"
+    if "epochs" in fp:
+        for name in fp["epochs"]:
+            objects["/epochs/" + name] = "Epoch"
+    return objects
+
+# returns the object index row for a group in the file
+def object_index_row(grp, kind):
+    ancestry = ""
+    num_samples = -1
+    t0 = np.nan
+    t1 = np.nan
+    dtype = ""
+    shape = ""
+    if kind == "TimeSeries":
+        if "ancestry" in grp.attrs:
+            ancestry = ",".join(decode_value(x) for x in np.atleast_1d(grp.attrs["ancestry"]))
+        # data may be an external link, which isn't followed
+        link = grp.get("data", getlink=True)
+        data = None
+        if link is not None and not isinstance(link, h5py.ExternalLink):
+            data = grp["data"]
+            dtype = str(data.dtype)
+            shape = ",".join(str(n) for n in data.shape)
+        if "num_samples" in grp:
+            num_samples = int(grp["num_samples"][()])
+        elif data is not None and len(data.shape) > 0:
+            num_samples = data.shape[0]
+        if "timestamps" in grp:
+            ts = grp["timestamps"]
+            n = len(ts)
+            block = nwbep.search_block_size(ts)
+            cache = {}
+            i, first = nwbep.next_valid_time(ts, 0, n, block, cache)
+            if i is not None:
+                t0 = first
+                t1 = nwbep.prev_valid_time(ts, n - 1, 0, block, cache)[1]
+        elif "starting_time" in grp and num_samples > 0:
+            start = float(grp["starting_time"][()])
+            rate = grp["starting_time"].attrs["rate"]
+            t0 = start
+            t1 = nwbep.rate_sample_time(start, rate, num_samples - 1)
+    elif kind == "Interface":
+        ancestry = grp.name.split('/')[-1]
+    elif kind == "Epoch":
+        t0 = float(grp["start_time"][()])
+        t1 = float(grp["stop_time"][()])
+    return (grp.name, kind, ancestry, num_samples, t0, t1, dtype, shape)
+
+# copy-on-write view of a specification dictionary. a node is created
+#   from a template dictionary, which is shared rather than copied.
+#   dictionaries and lists in the template are copied when they're
+#   first read from the node, so changes made through the node don't
+#   affect the template. this makes copying the specification for a new
+#   object proportional to the number of fields that are used, rather
+#   than the size of the specification
+# templates must not be changed once nodes are created from them.
+#   compiled (frozen) nodes enforce this
+# the names of a node's fields (ie, children that aren't control keys
+#   or templates) are cached, so writers and validators don't need to
+#   examine every key
+class SpecNode(dict):
+    __slots__ = ("owned", "field_keys", "frozen")
+
+    def __init__(self, template=()):
+        dict.__init__(self, template)
+        # keys whose values belong to this node (ie, aren't shared
+        #   with the template)
+        self.owned = set()
+        self.frozen = False
+        if isinstance(template, SpecNode):
+            self.field_keys = template.field_keys
+        else:
+            self.field_keys = None
+
+    def __getitem__(self, key):
+        val = dict.__getitem__(self, key)
+        if key not in self.owned and not self.frozen:
+            self.owned.add(key)
+            if isinstance(val, dict):
+                val = SpecNode(val)
+                dict.__setitem__(self, key, val)
+            elif isinstance(val, list):
+                val = copy.deepcopy(val)
+                dict.__setitem__(self, key, val)
+        return val
+
+    def __setitem__(self, key, val):
+        if self.frozen:
+            raise TypeError("Compiled specification can't be modified")
+        if key not in self:
+            self.field_keys = None
+        self.owned.add(key)
+        dict.__setitem__(self, key, val)
+
+    def __delitem__(self, key):
+        if self.frozen:
+            raise TypeError("Compiled specification can't be modified")
+        self.field_keys = None
+        self.owned.discard(key)
+        dict.__delitem__(self, key)
+
+    # only values that belong to this node need to be copied
+    def __deepcopy__(self, memo):
+        node = SpecNode(self)
+        if self.frozen:
+            return node
+        for key in self.owned:
+            dict.__setitem__(node, key, copy.deepcopy(dict.__getitem__(self, key), memo))
+        node.owned = set(self.owned)
+        return node
+
+    def __reduce__(self):
+        return (SpecNode, (dict(self),))
+
+    # returns names of child fields and groups
+    def fields(self):
+        if self.field_keys is None:
+            self.field_keys = tuple(k for k in self if not k.startswith('_') and k != "<>" and k != "[]")
+        return self.field_keys
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, *default):
+        if key in self:
+            val = self[key]
+            del self[key]
+            return val
+        return dict.pop(self, key, *default)
+
+    def update(self, *args, **kwargs):
+        for key, val in dict(*args, **kwargs).items():
+            self[key] = val
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def copy(self):
+        return copy.deepcopy(self)
+
+# converts a specification dictionary to a tree of frozen nodes, for
+#   use as a shared template
+def compile_spec(spec):
+    node = SpecNode()
+    for key, val in spec.items():
+        if isinstance(val, dict):
+            val = compile_spec(val)
+        dict.__setitem__(node, key, val)
+    node.fields()
+    node.frozen = True
+    return node
+
+# returns a copy of a specification that can be modified without
+#   affecting the original
+def copy_spec(spec):
+    if isinstance(spec, SpecNode) and not spec.frozen:
+        return copy.deepcopy(spec)
+    return SpecNode(spec)
+
+# returns the compiled definition of a time series or interface type,
+#   as used to create them. definitions are compiled once and stored in
+#   *definitions* (see load_spec_and_definitions()), so they must not
+#   be modified. *error* is called with a message if the type or its
+#   specification is invalid
+def get_definition(spec, definitions, kind, def_type, error):
+    key = (kind, def_type)
+    if key not in definitions:
+        if kind == "TimeSeries":
+            defn, ancestry = create_timeseries_definition(spec, def_type, [], error)
+            defn["_attributes"]["ancestry"]["_value"] = ancestry
+        else:
+            super_spec = copy.deepcopy(spec["Interface"]["SuperInterface"])
+            if_spec = copy.deepcopy(spec["Interface"][def_type])
+            defn = recursive_dictionary_merge(super_spec, if_spec)
+        validate_definition(def_type, defn, error)
+        definitions[key] = compile_spec(defn)
+    return definitions[key]
+
+# read spec to create time series definition. do it recursively
+#   if time series are subclassed. *subclasses* are the types being
+#   defined that derive from this one
+def create_timeseries_definition(spec, ts_type, ancestry, error, subclasses=()):
+    ts_dict = spec["TimeSeries"]
+    if ts_type not in ts_dict:
+        error("'%s' is not a recognized time series" % ts_type)
+    defn = copy.deepcopy(ts_dict[ts_type])
+    # pull in data from superclass
+    if "_superclass" in defn:
+        # avoid infinite loops in specification
+        subclasses = subclasses + (ts_type,)
+        if defn["_superclass"] in subclasses:
+            error("Infinite loop in spec for TS " + ts_type)
+        parent = defn["_superclass"]
+        del defn["_superclass"]
+        # add parent definition to this
+        par, ancestry = create_timeseries_definition(spec, parent, ancestry, error, subclasses)
+        defn = recursive_dictionary_merge(par, defn)
+    # make ancestry record
+    # string cast is necessary because sometimes string is unicode (why??)
+    ancestry.append(str(ts_type))
+    return defn, ancestry
+
+# checks that each field of a definition has a data type
+def validate_definition(def_type, defn, error):
+    for k, v in defn.items():
+        if k.startswith("_") or k == "[]" or k == "<>":
+            continue
+        if not isinstance(v, dict) or "_datatype" not in v:
+            error("Field '%s' of %s has no data type in specification" % (k, def_type))
+
+# returns names of the fields and groups in a specification dictionary
+def spec_fields(spec):
+    if isinstance(spec, SpecNode):
+        return spec.fields()
+    return [k for k in spec if not k.startswith('_') and k != "<>" and k != "[]"]
+
+# returns a child of a specification dictionary without making a copy
+#   of it. the returned value must not be modified
+def peek_spec(spec, key):
+    return dict.__getitem__(spec, key)
+
 def load_json(fname):
     # correct the path, in case calling from remote directory
     fname = os.path.join( os.path.dirname(__file__), fname)
@@ -119,24 +513,81 @@ def load_spec_file(fname):
     else: # try json as default
         return load_json(fname)
 
-def load_spec(custom_spec):
-    spec = load_spec_file("spec_file.json")
-    ts = load_spec_file("spec_ts.json")
-    recursive_dictionary_merge(spec, ts)
-    mod = load_spec_file("spec_mod.json")
-    recursive_dictionary_merge(spec, mod)
-    iface = load_spec_file("spec_iface.json")
-    recursive_dictionary_merge(spec, iface)
-    gen = load_spec_file("spec_general.json")
-    recursive_dictionary_merge(spec, gen)
-    ep = load_spec_file("spec_epoch.json")
-    recursive_dictionary_merge(spec, ep)
+# files that make up the format specification, in the order they're
+#   merged
+SPEC_FILES = [ "spec_file.json", "spec_ts.json", "spec_mod.json",
+    "spec_iface.json", "spec_general.json", "spec_epoch.json" ]
+
+# merged specifications are cached for the life of the process, so
+#   creating many files doesn't re-read and re-merge the spec files each
+#   time. the cache is keyed by the custom spec file, and stores the
+#   modification times of the spec files along with the pickled spec.
+#   each NWB instance gets its own copy of the spec, as it's modified
+#   by the API. compiled TimeSeries and Interface definitions, which
+#   don't change, are shared by all files that use the same spec
+spec_cache = {}
+spec_cache_lock = threading.Lock()
+
+def merge_spec_files(custom_spec):
+    spec = load_spec_file(SPEC_FILES[0])
+    for fname in SPEC_FILES[1:]:
+        recursive_dictionary_merge(spec, load_spec_file(fname))
     if len(custom_spec) > 0:
         custom = load_spec_file(custom_spec)
         recursive_dictionary_merge(spec, custom)
     #write_json("fullspec.json", spec)
     return spec
 
+# returns modification times of spec files, or None if a file can't
+#   be found (it's reported when the spec is loaded)
+def spec_file_times(custom_spec):
+    files = list(SPEC_FILES)
+    if len(custom_spec) > 0:
+        files.append(custom_spec)
+    times = []
+    for fname in files:
+        try:
+            times.append(os.path.getmtime(os.path.join(os.path.dirname(__file__), fname)))
+        except OSError:
+            return None
+    return tuple(times)
+
+def load_spec(custom_spec):
+    return load_spec_and_definitions(custom_spec)[0]
+
+# returns a copy of the merged spec, and the dictionary of compiled
+#   definitions that belongs to it
+def load_spec_and_definitions(custom_spec):
+    times = spec_file_times(custom_spec)
+    if times is None:
+        return merge_spec_files(custom_spec), {}
+    key = str(custom_spec)
+    with spec_cache_lock:
+        entry = spec_cache.get(key)
+    if entry is None or entry[0] != times:
+        spec = merge_spec_files(custom_spec)
+        entry = (times, pickle.dumps(spec, pickle.HIGHEST_PROTOCOL), {})
+        with spec_cache_lock:
+            spec_cache[key] = entry
+    # unpickling is faster than copy.deepcopy
+    return pickle.loads(entry[1]), entry[2]
+
+def preload_spec(custom_spec=[]):
+    """ Loads and merges the format specification, so that it's ready
+        when files are created. This is optional -- the specification
+        is loaded when the first file is created, and is reused by
+        later files that have the same custom_spec. It's reloaded if
+        a specification file has changed
+
+        Arguments:
+            *custom_spec* (text -- optional) A custom specification file,
+            as passed to NWB()
+
+        Returns:
+            Nothing
+    """
+    load_spec(custom_spec)
+
 def write_json(fname, js):
     with open(fname, "w") as f:
         json.dump(js, f, indent=2)
@@ -222,13 +673,92 @@ class NWB(object):
             *keep_original* (boolean -- optional) -- If true, a back-up copy 
             of the original file will be kept, named '<filename>.prev'
 
+            *copy_on_modify* (boolean -- optional) -- By default, files
+            opened with 'modify' are changed in place. Objects created
+            are recorded in a journal ('<filename>.journal') and are
+            removed again if an error occurs, or when the file is next
+            opened if the program exits before close() is called. If
+            this flag is set, the file is instead copied and the copy
+            is modified, replacing the original on close(). This is
+            also the case if 'keep_original' is set. Note that space
+            used by rolled-back objects is not returned by HDF5
+
             *auto_compress* (boolean -- optional) Data is compressed
             automatically through the API. Setting 'auto_compress=False'
             disables this behavior
 
+            *compression* (text or dict -- optional) Default chunking
+            and compression policy for datasets. Presets are 'gzip'
+            (the default, level 4), 'lzf' and 'none'. A dictionary of
+            h5py storage settings (eg, {'compression': 'gzip',
+            'compression_opts': 1, 'shuffle': True}) can also be
+            supplied. Settings can be overridden for individual
+            fields through set_data()
+
+            *chunk_bytes* (int -- optional) Target chunk size, in bytes,
+            used when the library chooses the chunk shape of TimeSeries
+            data. The shape is chosen according to the TimeSeries type
+            (see chunk_shape()). Default is 1 MiB
+
+            *text_storage* (text -- optional) How arrays of text (eg,
+            AnnotationSeries data) are stored. 'fixed' (the default)
+            stores each entry in a fixed-length string the size of the
+            longest entry. 'vlen' uses variable-length strings, which
+            is more compact when entry lengths vary widely
+
+            *compression_threads* (int -- optional) Number of threads
+            used to compress large gzip-compressed datasets. Chunks are
+            compressed in parallel and stored directly, producing the
+            same encoding as the standard HDF5 gzip filter. Default is
+            1 (compression is performed by HDF5 on the calling thread)
+
+            *background_writer* (boolean -- optional) Finalized
+            TimeSeries, Interfaces and Epochs are written to disk by a
+            dedicated writer thread, so finalize() returns without
+            waiting for data to be written and compressed. Objects are
+            written in the order they're finalized. close() waits for
+            all pending writes to complete. Arrays are copied when an
+            object is finalized, so buffers can be reused afterward,
+            except for np.memmap and other arrays not held in memory,
+            which are read when the object is written
+
+            *profile* (boolean or function -- optional) If set, close()
+            records the time taken by each of its phases (finalizing
+            time series, writing link attributes, finalizing epochs,
+            writing metadata, etc) along with the number of datasets and
+            bytes written, both per phase and per object. The report is
+            available from get_profile(). If a function is supplied, it
+            is also called with each phase's record as it completes
+
+            *write_through* (boolean -- optional) TimeSeries data and
+            timestamps are written to disk as soon as they are set
+            (and the TimeSeries location is known), rather than being
+            held in memory until the TimeSeries is finalized. This
+            can be overridden for individual calls to set_data() and
+            set_time() using the 'flush' argument
+
+            *contiguous_bytes* (int -- optional) Numeric arrays of at
+            least this many bytes (in the type of the array provided)
+            are stored uncompressed, in a single contiguous block,
+            rather than following the compression policy. This
+            includes arrays copied from chunked HDF5 datasets. These
+            can be memory-mapped by readers (see NWBReader). Fields
+            with storage settings of their own (eg, from set_data())
+            and data written with append_data() are not affected
+
+            *timestamp_cache* (int -- optional) Maximum memory, in bytes,
+            used by indexes of TimeSeries timestamps. The overlap of
+            an epoch with a time series is found by searching its
+            timestamps. Once a time series has been added to several
+            epochs, an index of its timestamps is built and reused by
+            later epochs. The least recently used indexes are
+            discarded to stay within this limit. Default is 256 MiB
+
             *custom_spec* (text -- optional) A json, yaml or toml file
             used to customize the format specification (pyyaml or toml
-            must be installed to use those formats)
+            must be installed to use those formats). The merged
+            specification is cached, and is reloaded if this file or
+            the library's specification files change
     """
     def __init__(self, **vargs):
         self.read_arguments(**vargs)
@@ -242,15 +772,49 @@ class NWB(object):
         # record of all tags used in epochs
         # use a dict as it's easier to filter out dups
         self.epoch_tag_dict = {}
+        # record of storage settings used for the most recent datasets
+        #   written
+        self.storage_log = collections.deque(maxlen=STORAGE_LOG_ENTRIES)
+        # HDF5 type and dataspace objects for writing scalars
+        self.scalar_types = {}
+        self.scalar_space = None
+        # indexes of time series timestamps, by path, in order of use
+        self.timestamp_indexes = collections.OrderedDict()
+        self.timestamp_cache_bytes = 0
+        self.timestamp_cache_hits = 0
+        self.timestamp_cache_misses = 0
+        self.timestamp_cache_evictions = 0
+        # number of overlap searches of time series without an index
+        self.timestamp_queries = {}
+        self.timestamp_searches = 0
+        # phase records for close(), if profiling, and the storage log
+        #   entries of the present phase
+        self.profile_report = []
+        self.profile_phase = None
+        self.profile_entries = []
         # load specification
-        self.spec = load_spec(self.custom_spec)
+        self.spec, self.definitions = load_spec_and_definitions(self.custom_spec)
         # flag to keep backup of original file, using ".prev" suffix
         self.keep_original = False 
         #
         self.tmp_name = self.file_name + ".tmp"
+        # journal of changes, for modifying existing file in place
+        self.journal_name = self.file_name + ".journal"
+        self.journal = None
+        self.in_place = False
+        self.modify_existing = False
+        # writer thread, for writing finalized objects in the background
+        self.write_queue = None
+        self.writer_thread = None
+        self.writer_error = None
+        self.error_flag = False
         if self.file_exists:
             # file exists -- see if modify flag set
             if "modify" in vargs and vargs["modify"] == True:
+                if "keep_original" in vargs and vargs["keep_original"]:
+                    self.keep_original = True
+                self.in_place = not (self.copy_on_modify or self.keep_original)
+                self.modify_existing = True
                 self.open_existing()
             elif "overwrite" in vargs and vargs["overwrite"] == True:
                 self.create_file()
@@ -282,7 +846,8 @@ class NWB(object):
         #import atexit
         #atexit.register(self.close)
         self.is_open = True
-        self.error_flag = False
+        if self.background_writer:
+            self.start_writer()
         # users may specify different spellings of dtypes than the library
         #   expects. here's a table to handle conversions from some common
         #   forms
@@ -330,6 +895,58 @@ class NWB(object):
             self.auto_compress = vargs["auto_compress"]
         else:
             self.auto_compress = True
+        if "compression" in vargs:
+            policy = vargs["compression"]
+        elif self.auto_compress:
+            policy = "gzip"
+        else:
+            policy = "none"
+        if policy is None or policy is False:
+            policy = "none"
+        if isinstance(policy, dict):
+            self.storage_policy = dict(policy)
+        elif policy in STORAGE_PRESETS:
+            self.storage_policy = dict(STORAGE_PRESETS[policy])
+        else:
+            err_str += "    unrecognized compression policy '%s'\n" % policy
+        if "chunk_bytes" in vargs:
+            self.chunk_bytes = int(vargs["chunk_bytes"])
+        else:
+            self.chunk_bytes = CHUNK_BYTES
+        if "text_storage" in vargs:
+            self.text_storage = vargs["text_storage"]
+            if self.text_storage not in ["fixed", "vlen"]:
+                err_str += "    text_storage must be 'fixed' or 'vlen'\n"
+        else:
+            self.text_storage = "fixed"
+        if "compression_threads" in vargs:
+            self.compression_threads = int(vargs["compression_threads"])
+        else:
+            self.compression_threads = 1
+        if "background_writer" in vargs:
+            self.background_writer = vargs["background_writer"]
+        else:
+            self.background_writer = False
+        if "profile" in vargs:
+            self.profile = vargs["profile"]
+        else:
+            self.profile = False
+        if "copy_on_modify" in vargs:
+            self.copy_on_modify = vargs["copy_on_modify"]
+        else:
+            self.copy_on_modify = False
+        if "write_through" in vargs:
+            self.write_through = vargs["write_through"]
+        else:
+            self.write_through = False
+        if "contiguous_bytes" in vargs:
+            self.contiguous_bytes = vargs["contiguous_bytes"]
+        else:
+            self.contiguous_bytes = None
+        if "timestamp_cache" in vargs:
+            self.timestamp_cache_max = int(vargs["timestamp_cache"])
+        else:
+            self.timestamp_cache_max = TIMESTAMP_CACHE_BYTES
         # allow user to specify custom json specification file
         # when the request to specify multiple files comes in, allow
         #   multiple files to be submitted as a dictionary or list
@@ -359,6 +976,10 @@ class NWB(object):
         print("Stack trace follows")
         print("-------------------")
         traceback.print_stack()
+        # undo changes to a file modified in place. if the error is on
+        #   the writer thread, this happens when it's reported
+        if self.journal is not None and threading.current_thread() is not self.writer_thread:
+            self.rollback()
         sys.exit(1)
 
     # internfal function that stores all tags that were used in epochs,
@@ -417,15 +1038,34 @@ class NWB(object):
     # internal function to open existing file for writing
     # TODO read timeseries data/time links. add to kernel's link tracking
     def open_existing(self):
-        # make backup copy before modifying anything
-        # copy2 preserves file metadata (eg, create date)
-        shutil.copy2(self.file_name, self.tmp_name)
-        # open tmp file for appending
-        try:
-            self.file_pointer = h5py.File(self.tmp_name, "a")
-        except IOError:
-            print("Unable to open temp output file '%s'" % self.tmp_name)
-            sys.exit(1)
+        if self.in_place:
+            try:
+                self.file_pointer = h5py.File(self.file_name, "a")
+            except IOError:
+                print("Unable to open output file '%s'" % self.file_name)
+                sys.exit(1)
+            self.start_journal()
+        else:
+            # undo incomplete changes from an earlier in-place
+            #   modification before the file is copied
+            if os.path.isfile(self.journal_name):
+                try:
+                    fp = h5py.File(self.file_name, "a")
+                except IOError:
+                    print("Unable to open output file '%s'" % self.file_name)
+                    sys.exit(1)
+                self.replay_journal(fp)
+                fp.close()
+                os.remove(self.journal_name)
+            # make backup copy before modifying anything
+            # copy2 preserves file metadata (eg, create date)
+            shutil.copy2(self.file_name, self.tmp_name)
+            # open tmp file for appending
+            try:
+                self.file_pointer = h5py.File(self.tmp_name, "a")
+            except IOError:
+                print("Unable to open temp output file '%s'" % self.tmp_name)
+                sys.exit(1)
         fp = self.file_pointer
         # TODO verify version
         # append timestamp to file create date's modification attribute
@@ -435,6 +1075,7 @@ class NWB(object):
         new_time = time.ctime()
         create = fp["file_create_date"]
         entries = len(create)
+        self.journal_resize(create, entries)
         create.resize((entries+1,))
         create[entries] = new_time
 
@@ -445,14 +1086,302 @@ class NWB(object):
         #if type(mod_time).__name__ == "ndarray":
             mod_time = mod_time.tolist()
         mod_time.append(np.string_(new_time))
+        self.journal_attribute(create, "modification_time")
         create.attrs["modification_time"] = mod_time
 
+    ####################################################################
+    ####################################################################
+    # Journal
+    #
+    # when an existing file is modified in place, each change is recorded
+    #   in a journal file before it's made. if there's an error, changes
+    #   are undone by working back through the journal. the journal is
+    #   deleted when the file is closed successfully. if a journal is
+    #   found when the file is opened, the previous session didn't
+    #   complete and its changes are undone
+
+    # internal function to open the journal, rolling back changes from
+    #   a previous session that didn't complete
+    def start_journal(self):
+        if os.path.isfile(self.journal_name):
+            self.replay_journal(self.file_pointer)
+            self.file_pointer.flush()
+        self.journal_entries = []
+        self.journal = open(self.journal_name, "w")
+
+    # internal function to undo the changes recorded in a journal left
+    #   by a previous session that didn't complete
+    def replay_journal(self, fp):
+        print("Warning -- '%s' was not closed after last modification" % self.file_name)
+        print("Rolling back incomplete changes")
+        entries = []
+        with open(self.journal_name, "r") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    break   # partially written entry
+        self.undo_journal_entries(fp, entries)
+
+    # internal function to add an entry to the journal
+    def journal_write(self, entry):
+        if self.journal is None:
+            return
+        self.journal_entries.append(entry)
+        self.journal.write(json.dumps(entry) + "\n")
+        self.journal.flush()
+
+    # internal API function to record the creation of an HDF5 object
+    def journal_create(self, path):
+        entry = {}
+        entry["op"] = "create"
+        entry["path"] = path
+        self.journal_write(entry)
+
+    # internal API function to record the size of a dataset before
+    #   it's resized
+    def journal_resize(self, dset, size):
+        entry = {}
+        entry["op"] = "resize"
+        entry["path"] = dset.name
+        entry["size"] = int(size)
+        self.journal_write(entry)
+
+    # internal API function to record the value of a text attribute
+    #   before it's changed
+    def journal_attribute(self, obj, name):
+        if self.journal is None:
+            return
+        entry = {}
+        entry["op"] = "attr"
+        entry["path"] = obj.name
+        entry["name"] = name
+        entry["value"] = None
+        if name in obj.attrs:
+            val = obj.attrs[name]
+            if isinstance(val, np.ndarray):
+                val = val.tolist()
+            else:
+                val = [val]
+            entry["value"] = [v.decode() if isinstance(v, bytes) else str(v) for v in val]
+        self.journal_write(entry)
+
+    # internal API function to create a group, recording it in the
+    #   journal. returns the existing group if there is one. groups
+    #   created along the path are recorded too
+    def require_group_internal(self, path):
+        fp = self.file_pointer
+        if path in fp:
+            return fp[path]
+        grp = fp
+        for name in path.split('/'):
+            if len(name) == 0:
+                continue
+            if name not in grp:
+                self.journal_create(grp.name.rstrip('/') + '/' + name)
+                grp = grp.create_group(name)
+            else:
+                grp = grp[name]
+        return grp
+
+    # internal function to record the metadata objects that will be
+    #   created under a group, before they're written. for a new group,
+    #   only the group is recorded
+    def journal_new_fields(self, grp, path, spec):
+        for k in spec_fields(spec):
+            local_spec = peek_spec(spec, k)
+            name = path + k
+            if local_spec["_datatype"] == "group":
+                if name in grp:
+                    self.journal_new_fields(grp, name + "/", local_spec)
+                else:
+                    self.journal_create(grp.name + "/" + name)
+            elif name not in grp:
+                for v in ["_value", "_value_softlink", "_value_hardlink"]:
+                    if v in local_spec:
+                        self.journal_create(grp.name + "/" + name)
+                        break
+
+    # internal function to undo journaled changes, in reverse order
+    def undo_journal_entries(self, fp, entries):
+        for i in range(len(entries)-1, -1, -1):
+            entry = entries[i]
+            path = entry["path"]
+            if path not in fp:
+                continue
+            if entry["op"] == "create":
+                del fp[path]
+            elif entry["op"] == "resize":
+                fp[path].resize((entry["size"],))
+            elif entry["op"] == "attr":
+                obj = fp[path]
+                if entry["value"] is None:
+                    if entry["name"] in obj.attrs:
+                        del obj.attrs[entry["name"]]
+                else:
+                    obj.attrs[entry["name"]] = [np.string_(v) for v in entry["value"]]
+
+    # internal function to undo all changes made to a file that was
+    #   modified in place, and close it
+    def rollback(self):
+        if self.journal is None:
+            return
+        print("Rolling back changes to '%s'" % self.file_name)
+        if self.writer_thread is not None:
+            self.write_queue.put(None)
+            self.writer_thread.join()
+            self.writer_thread = None
+        self.undo_journal_entries(self.file_pointer, self.journal_entries)
+        self.file_pointer.close()
+        self.end_journal()
+        self.is_open = False
+
+    # internal function to close and delete the journal
+    def end_journal(self):
+        if self.journal is None:
+            return
+        self.journal.close()
+        self.journal = None
+        os.remove(self.journal_name)
+
+    ####################################################################
+    ####################################################################
+    # Background writer
+    #
+    # a single writer thread performs all writes of finalized objects,
+    #   in the order they were submitted. the main thread continues to
+    #   write to the file as well (eg, append_data(), and groups created
+    #   by create_epoch() and create_module()). this relies on h5py,
+    #   which serializes all HDF5 calls with a global lock -- HDF5
+    #   itself isn't thread-safe. code that reads objects from the file
+    #   that may have been finalized must call sync_writer() first
+
+    # internal function to start the writer thread
+    def start_writer(self):
+        self.write_queue = queue.Queue()
+        self.writer_thread = threading.Thread(target=self.run_writer)
+        self.writer_thread.daemon = True
+        self.writer_thread.start()
+
+    # internal function -- main loop of the writer thread
+    def run_writer(self):
+        while True:
+            job = self.write_queue.get()
+            try:
+                if job is None:
+                    return
+                # after an error, discard remaining writes
+                if self.writer_error is None and not self.error_flag:
+                    job()
+            except BaseException:
+                # includes SystemExit from fatal_error(). save the
+                #   error so it can be reported on the main thread
+                self.writer_error = traceback.format_exc()
+            finally:
+                self.write_queue.task_done()
+
+    # internal function to write a finalized object. the write is
+    #   performed immediately if there's no writer thread. otherwise
+    #   arrays in the object's specification are copied before the
+    #   write is queued, so the caller can reuse its buffers
+    def submit_write(self, job, spec=None):
+        if self.writer_thread is None:
+            job()
+        else:
+            if self.writer_error is not None:
+                self.sync_writer()  # report error
+            if spec is not None:
+                self.detach_arrays(spec)
+            self.write_queue.put(job)
+
+    # internal function to replace in-memory arrays in a specification
+    #   with copies. arrays that aren't held in memory (eg, np.memmap,
+    #   h5py.Dataset) are read when the object is written
+    def detach_arrays(self, spec):
+        for k in spec_fields(spec):
+            field = peek_spec(spec, k)
+            if not isinstance(field, dict):
+                continue
+            if "_value" in field:
+                val = peek_spec(field, "_value")
+                if isinstance(val, np.ndarray) and not isinstance(val, np.memmap):
+                    spec[k]["_value"] = val.copy()
+            else:
+                self.detach_arrays(field)
+
+    # internal function to wait for all pending writes to complete.
+    #   errors that occurred on the writer thread are reported here
+    def sync_writer(self):
+        if self.writer_thread is None:
+            return
+        self.write_queue.join()
+        if self.writer_error is not None:
+            print(self.writer_error)
+            self.fatal_error("Error writing data in background writer thread")
+
+    # internal function to wait for pending writes and stop the writer
+    def stop_writer(self):
+        if self.writer_thread is None:
+            return
+        self.sync_writer()
+        self.write_queue.put(None)
+        self.writer_thread.join()
+        self.writer_thread = None
+
     # internal function that pushes metadata to the file on file closing
     def write_metadata(self):
         grp = self.file_pointer["general"]
         spec = self.spec["General"]
+        if self.journal is not None:
+            self.journal_new_fields(grp, "", spec)
         self.write_datasets(grp, "", spec)
 
+    # internal function to write the object index (/object_index). this
+    #   lists the time series, modules, interfaces and epochs in the file
+    #   so readers can find them without walking the file. objects
+    #   created in this session are known; when modifying a file, the
+    #   rows of the existing index are kept, or if it doesn't have one,
+    #   objects are found in their standard locations
+    def write_object_index(self):
+        fp = self.file_pointer
+        objects = {}
+        rows = {}
+        for ts in self.ts_list:
+            objects["/" + ts.full_path().lstrip("/")] = "TimeSeries"
+        # rows for objects other than time series don't need to read
+        #   from the file
+        for mod in self.modules:
+            path = "/" + mod.full_path()
+            rows[path] = (path, "Module", "", -1, np.nan, np.nan, "", "")
+            for iface in mod.ifaces.values():
+                path = "/" + iface.full_path()
+                rows[path] = (path, "Interface", iface.name, -1, np.nan, np.nan, "", "")
+        for epoch in self.epoch_list:
+            path = "/epochs/" + epoch.name
+            rows[path] = (path, "Epoch", "", -1, epoch.start_time, epoch.stop_time, "", "")
+        if "object_index" in fp:
+            for row in fp["object_index"][()]:
+                row = tuple(decode_value(x) for x in row)
+                if row[0] not in objects and row[0] not in rows and row[0] in fp:
+                    rows[row[0]] = row
+            # when modifying in place, a rollback after this point
+            #   leaves the file without an index, and readers find
+            #   objects by walking the file
+            del fp["object_index"]
+        elif self.modify_existing:
+            for path, kind in find_objects(fp).items():
+                if path not in rows:
+                    objects[path] = kind
+        for path, kind in objects.items():
+            if path in fp:
+                rows[path] = object_index_row(fp[path], kind)
+        table = np.zeros(len(rows), dtype=OBJECT_INDEX_DTYPE)
+        for i, path in enumerate(sorted(rows.keys())):
+            table[i] = rows[path]
+        self.journal_create("/object_index")
+        dset = fp.create_dataset("object_index", data=table)
+        dset.attrs["help"] = np.string_("Index of the time series, modules, interfaces and epochs in the file")
+
     def close(self):
         """ Finishes and closes an NWB file. This includes writing pending
             data to disk and adding annotations.
@@ -468,47 +1397,182 @@ class NWB(object):
         # quit gracefully quietly, otherwise errors here may mask 
         #   previous real problems
         if self.error_flag:
+            if self.journal is not None:
+                self.rollback()
+            if self.writer_thread is not None:
+                self.write_queue.put(None)
+                self.writer_thread.join()
+                self.writer_thread = None
             self.file_pointer.close()
+            if self.writer_error is not None:
+                # error on writer thread that hasn't been reported yet
+                print(self.writer_error)
+                print("Error writing data in background writer thread")
+                sys.exit(1)
             return
         if not self.is_open:
             return
         self.is_open = False
         # finalize all time series
         # this will be a no-op for series that have already been finalized
+        self.begin_phase("finalize_timeseries")
         for i in range(len(self.ts_list)):
-            self.ts_list[i].finalize()
+            ts = self.ts_list[i]
+            if ts.finalized:
+                continue
+            self.profile_call(ts.full_path(), ts.finalize)
+        self.sync_writer()
+        self.end_phase()
         # after time series are finalized, go back and document links
         # TODO check to see if data_link and timestamp_link exist
+        self.begin_phase("timeseries_links")
         for k, lst in self.ts_data_link_lists.items():
             for i in range(len(lst)):
+                self.journal_attribute(self.file_pointer[lst[i]], "data_link")
                 self.file_pointer[lst[i]].attrs["data_link"] = lst
                 #self.file_pointer[lst[i]].attrs["data_link"] = np.string_(lst) # VALIDATOR
         for k, lst in self.ts_time_link_lists.items():
             for i in range(len(lst)):
                 obj = self.file_pointer[lst[i]]
+                self.journal_attribute(obj, "timestamp_link")
                 obj.attrs["timestamp_link"] = lst
                 #obj.attrs["timestamp_link"] = np.string_(lst)
         #for k, lnk in self.ts_time_softlinks.items():
         #    self.file_pointer[k].attrs["data_softlink"] = np.string_(lnk)
+        self.end_phase()
         # TODO finalize all modules
         # finalize epochs and write epoch tag list to epoch group
+        self.begin_phase("finalize_epochs")
         for i in range(len(self.epoch_list)):
-            self.epoch_list[i].finalize()
+            epoch = self.epoch_list[i]
+            if epoch.finalized:
+                continue
+            self.profile_call("/epochs/" + epoch.name, epoch.finalize)
+        self.stop_writer()
+        self.end_phase()
+        self.begin_phase("epoch_tags")
         tags = []
         for k in self.epoch_tag_dict:
             tags.append(k)
+        self.journal_attribute(self.file_pointer["epochs"], "tags")
         self.file_pointer["epochs"].attrs["tags"] = np.string_(tags)
+        self.end_phase()
         # make sure there are no registered objects that aren't finalized
+        self.begin_phase("check_finalization")
         check_finalization()
+        self.end_phase()
         # write out metadata
+        self.begin_phase("write_metadata")
         self.write_metadata()
+        self.end_phase()
+        self.begin_phase("object_index")
+        self.write_object_index()
+        self.end_phase()
         # close file
+        self.begin_phase("close_file")
+        self.clear_timestamp_cache()
         self.file_pointer.close()
+        if self.in_place:
+            # changes are complete -- journal no longer needed
+            self.end_journal()
+            self.end_phase()
+            return
         # replace orig w/ tmp
         # keep old file around with suffix '.prev'
         if self.keep_original and os.path.isfile(self.file_name):
             shutil.move(self.file_name, self.file_name + ".prev")
         shutil.move(self.tmp_name, self.file_name)
+        # a journal left by an in-place modification of an overwritten
+        #   file doesn't apply to the new one
+        if os.path.isfile(self.journal_name):
+            os.remove(self.journal_name)
+        self.end_phase()
+
+    ####################################################################
+    ####################################################################
+    # Profiling
+    #
+    # when profiling is enabled, close() is divided into phases. each
+    #   phase records its run time and the datasets written during it
+    #   (from the storage log). objects finalized in a phase record
+    #   the time to finalize them and the datasets written under their
+    #   path. when objects are written by the background writer thread,
+    #   an object's time is the time to submit it, and the writer's
+    #   time is included in the phase that waits for it
+
+    # internal function to start recording a phase
+    def begin_phase(self, name):
+        if not self.profile:
+            return
+        phase = {}
+        phase["name"] = name
+        phase["objects"] = []
+        self.profile_phase = (phase, time.time())
+        self.profile_entries = []
+
+    # internal function to call a function for an object and record
+    #   its run time in the present phase
+    def profile_call(self, path, func):
+        if self.profile_phase is None:
+            func()
+            return
+        t0 = time.time()
+        func()
+        obj = {}
+        obj["path"] = path
+        obj["seconds"] = time.time() - t0
+        self.profile_phase[0]["objects"].append(obj)
+
+    # internal function to complete the record of the present phase
+    def end_phase(self):
+        if self.profile_phase is None:
+            return
+        phase, t0 = self.profile_phase
+        self.profile_phase = None
+        phase["seconds"] = time.time() - t0
+        entries = self.profile_entries
+        self.profile_entries = []
+        phase["datasets"] = len(entries)
+        phase["bytes"] = sum(e["bytes"] for e in entries)
+        phase["stored_bytes"] = sum(e["stored_bytes"] for e in entries)
+        # assign datasets to objects by path. sort dataset paths so
+        #   each object's datasets are a contiguous block
+        entries = sorted(entries, key=lambda e: e["path"])
+        paths = [e["path"] for e in entries]
+        for obj in phase["objects"]:
+            prefix = obj["path"].rstrip("/") + "/"
+            lo = bisect.bisect_left(paths, prefix)
+            hi = bisect.bisect_left(paths, prefix[:-1] + "0")   # '0' follows '/'
+            obj["datasets"] = hi - lo
+            obj["bytes"] = sum(e["bytes"] for e in entries[lo:hi])
+            obj["stored_bytes"] = sum(e["stored_bytes"] for e in entries[lo:hi])
+        self.profile_report.append(phase)
+        if callable(self.profile):
+            self.profile(phase)
+
+    def get_profile(self):
+        """ Returns the timing report recorded by close(), when the
+            file was created with 'profile' set
+
+            Arguments:
+                *none*
+
+            Returns:
+                Dictionary with keys 'phases', 'seconds', 'datasets',
+                'bytes' and 'stored_bytes'. 'phases' is a list of
+                dictionaries, one per phase of close(), with keys 'name',
+                'seconds', 'datasets' (number of datasets written),
+                'bytes' (uncompressed size of datasets), 'stored_bytes'
+                (size on disk) and 'objects'. 'objects' lists the
+                TimeSeries and Epochs finalized in that phase, each with
+                keys 'path', 'seconds', 'datasets', 'bytes' and
+                'stored_bytes'. The other keys are totals for all phases
+        """
+        report = {}
+        report["phases"] = self.profile_report
+        for k in ["seconds", "datasets", "bytes", "stored_bytes"]:
+            report[k] = sum(p[k] for p in self.profile_report)
+        return report
 
     ####################################################################
     ####################################################################
@@ -636,6 +1700,158 @@ class NWB(object):
         epo.serial_num = register_creation("Epoch -- " + name)
         return epo
 
+    def create_epochs(self, names, starts, stops, timeseries=None):
+        """ Creates many Epoch objects at once, for example one per
+            trial, and optionally associates time series with each of
+            them. This is much faster than calling create_epoch() and
+            Epoch.add_timeseries() for each epoch, as the overlaps
+            with each time series are found together
+
+            Arguments:
+                *names* (text array) The names of the epochs, as they
+                will appear in the file
+
+                *starts* (float array) The starting time of each epoch
+
+                *stops* (float array) The ending time of each epoch
+
+                *timeseries* (list or dict -- optional) Time series to
+                associate with each epoch that it overlaps. This can be
+                a list of TimeSeries objects or paths, in which case
+                each time series uses its own name in the epochs, or
+                a dict mapping the name to use in the epochs to the
+                TimeSeries or path (see Epoch.add_timeseries())
+
+            Returns:
+                List of Epoch objects
+        """
+        if len(names) != len(starts) or len(names) != len(stops):
+            self.fatal_error("create_epochs: names, starts and stops must have the same length")
+        epochs = []
+        for i in range(len(names)):
+            epochs.append(self.create_epoch(names[i], starts[i], stops[i]))
+        if timeseries is None:
+            return epochs
+        series = []
+        if isinstance(timeseries, dict):
+            for in_epoch_name, ts in sorted(timeseries.items()):
+                series.append((in_epoch_name, self.get_timeseries_path(ts)))
+        else:
+            for ts in timeseries:
+                path = self.get_timeseries_path(ts)
+                series.append((path.split('/')[-1], path))
+        for in_epoch_name, path in series:
+            grp = self.file_pointer[path]
+            if "timestamps" in grp:
+                i0, i1 = self.find_timestamp_overlaps(path, starts, stops)
+            else:
+                n = grp["num_samples"][()]
+                t0 = grp["starting_time"][()]
+                rate = grp["starting_time"].attrs["rate"]
+                i0 = np.zeros(len(epochs), dtype=np.int64) - 1
+                i1 = np.zeros(len(epochs), dtype=np.int64) - 1
+                for k in range(len(epochs)):
+                    a, b = nwbep.find_rate_overlap(t0, rate, n, starts[k], stops[k])
+                    if a is not None:
+                        i0[k] = a
+                        i1[k] = b
+            for k in np.flatnonzero(i0 >= 0):
+                epochs[k].add_timeseries_overlap(in_epoch_name, path, i0[k], i1[k])
+        for epo in epochs:
+            epo.spec["_attributes"]["links"]["_value"].sort()  # VALIDATOR
+        return epochs
+
+    # internal API function to get the path of a time series in the
+    #   file, from a TimeSeries object or path. the time series must
+    #   have been written
+    def get_timeseries_path(self, timeseries):
+        if isinstance(timeseries, nwbts.TimeSeries):
+            timeseries_path = timeseries.full_path()
+        elif isinstance(timeseries, str):
+            timeseries_path = timeseries
+        else:
+            self.fatal_error("Don't recognize timeseries parameter as time series or path")
+        if not timeseries_path.startswith('/'):
+            timeseries_path = '/' + timeseries_path
+        # time series may still be waiting to be written
+        self.sync_writer()
+        if timeseries_path not in self.file_pointer:
+            self.fatal_error("Time series '%s' not found" % timeseries_path)
+        return timeseries_path
+
+    # internal API function to find the overlap of a time series with
+    #   one or more intervals (see nwbep.find_overlaps()). a time series'
+    #   first queries search its timestamps by bisection. once it has
+    #   had more than TIMESTAMP_INDEX_QUERIES, an index is built and
+    #   cached for later queries
+    def find_timestamp_overlaps(self, timeseries_path, starts, stops):
+        if timeseries_path not in self.timestamp_indexes:
+            queries = self.timestamp_queries.get(timeseries_path, 0) + len(starts)
+            if queries <= TIMESTAMP_INDEX_QUERIES:
+                self.timestamp_queries[timeseries_path] = queries
+                self.timestamp_searches += 1
+                timestamps = self.file_pointer[timeseries_path]["timestamps"]
+                return nwbep.find_overlaps(timestamps, starts, stops)
+        index = self.get_timestamp_index(timeseries_path)
+        return index.find_overlaps(starts, stops)
+
+    # internal API function to get the index of a time series' timestamps
+    #   (see nwbep.TimestampIndex), from the cache if it's there. the
+    #   time series must have been written
+    def get_timestamp_index(self, timeseries_path):
+        timestamps = self.file_pointer[timeseries_path]["timestamps"]
+        index = self.timestamp_indexes.get(timeseries_path)
+        if index is not None and index.num_samples == len(timestamps):
+            self.timestamp_indexes.move_to_end(timeseries_path)
+            self.timestamp_cache_hits += 1
+            return index
+        self.timestamp_cache_misses += 1
+        if index is not None:
+            # dataset has changed
+            del self.timestamp_indexes[timeseries_path]
+            self.timestamp_cache_bytes -= index.nbytes
+        index = nwbep.TimestampIndex(timestamps, self.timestamp_cache_max)
+        if index.kind == "search":
+            return index    # nothing to keep
+        while self.timestamp_cache_bytes + index.nbytes > self.timestamp_cache_max:
+            path, old = self.timestamp_indexes.popitem(last=False)
+            self.timestamp_cache_bytes -= old.nbytes
+            self.timestamp_cache_evictions += 1
+        self.timestamp_indexes[timeseries_path] = index
+        self.timestamp_cache_bytes += index.nbytes
+        return index
+
+    # internal function to discard all timestamp indexes
+    def clear_timestamp_cache(self):
+        self.timestamp_indexes.clear()
+        self.timestamp_cache_bytes = 0
+        self.timestamp_queries.clear()
+
+    def get_timestamp_cache_info(self):
+        """ Returns usage statistics for the cache of timestamp indexes
+            used to find the overlap of epochs and time series (see
+            the 'timestamp_cache' constructor argument)
+
+            Arguments:
+                *none*
+
+            Returns:
+                Dictionary with keys 'searches' (queries answered by
+                searching timestamps without an index), 'hits',
+                'misses', 'evictions', 'entries' (number of indexes in
+                the cache), 'bytes' (memory used by them) and
+                'max_bytes'
+        """
+        info = {}
+        info["searches"] = self.timestamp_searches
+        info["hits"] = self.timestamp_cache_hits
+        info["misses"] = self.timestamp_cache_misses
+        info["evictions"] = self.timestamp_cache_evictions
+        info["entries"] = len(self.timestamp_indexes)
+        info["bytes"] = self.timestamp_cache_bytes
+        info["max_bytes"] = self.timestamp_cache_max
+        return info
+
     def create_timeseries(self, ts_type, name, modality="other"):
         """ Creates a new TimeSeries object. Timeseries are used to
             store and associate data or events with the time the
@@ -729,10 +1945,7 @@ class NWB(object):
         """
         # find time series by name
         # recursively examine spec and create dict of required fields
-        ts_defn, ancestry = self.create_timeseries_definition(ts_type, [], None)
-        if "_value" not in ts_defn["_attributes"]["ancestry"]:
-            ts_defn["_attributes"]["ancestry"]["_value"] = []
-        ts_defn["_attributes"]["ancestry"]["_value"] = ancestry
+        ts_defn = self.get_timeseries_definition(ts_type)
         if ts_type == "AnnotationSeries":
             ts = nwbts.AnnotationSeries(name, modality, ts_defn, self)
         elif ts_type == "AbstractFeatureSeries":
@@ -743,30 +1956,11 @@ class NWB(object):
         ts.serial_num = register_creation(ts_type + " -- " + name)
         return ts
 
-    # internal API call to get specification of time series from config file
-    # read spec to create time series definition. do it recursively 
-    #   if time series are subclassed
-    def create_timeseries_definition(self, ts_type, ancestry, defn):
-        ts_dict = self.spec["TimeSeries"]
-        if ts_type not in ts_dict:
-            self.fatal_error("'%s' is not a recognized time series" % ts_type)
-        if defn is None:
-            defn = ts_dict[ts_type]
-        defn = copy.deepcopy(ts_dict[ts_type])
-        # pull in data from superclass
-        if "_superclass" in defn:
-            # avoid infinite loops in specification
-            if ts_type == defn["_superclass"]:
-                self.fatal_error("Infinite loop in spec for TS " + ts_type)
-            parent = defn["_superclass"]
-            del defn["_superclass"]
-            # add parent definition to this
-            par, ancestry = self.create_timeseries_definition(parent, ancestry, defn)
-            defn = recursive_dictionary_merge(par, defn)
-        # make ancestry record
-        # string cast is necessary because sometimes string is unicode (why??)
-        ancestry.append(str(ts_type))
-        return defn, ancestry
+    # internal API call to get the compiled definition of a time series
+    #   type. definitions are compiled once and shared, so they must
+    #   not be modified (TimeSeries objects make a copy-on-write copy)
+    def get_timeseries_definition(self, ts_type):
+        return get_definition(self.spec, self.definitions, "TimeSeries", ts_type, self.fatal_error)
 
     def create_module(self, name):
         """ Creates a Module object of the specified name. Interfaces can
@@ -891,6 +2085,7 @@ class NWB(object):
         img_grp = fp["acquisition/images"]
         if name in img_grp:
             self.fatal_error("Reference image %s alreayd exists" % name)
+        self.journal_create(img_grp.name + "/" + name)
         if dtype is None:
             img = img_grp.create_dataset(name, data=stream)
         else:
@@ -1011,6 +2206,11 @@ class NWB(object):
         else:
             self.check_type(key, value, field["_datatype"])
         field["_value"] = value
+        self.set_attributes_internal(key, field, **attrs)
+
+    # internal API function to store attribute values in a field's
+    #   specification. attributes must already be defined in the spec
+    def set_attributes_internal(self, key, field, **attrs):
         for k in list(attrs.keys()):
             if k not in field["_attributes"]:
                 self.fatal_error("Custom attributes not supported -- '%s' is not part of field '%s'" %(k, key))
@@ -1022,16 +2222,45 @@ class NWB(object):
             else:
                 field["_attributes"][k]["_value"] = attrs[k]
 
+    # internal API function to append a block of values to a resizable
+    #   dataset, creating the dataset on the first call. the dataset
+    #   grows along its first dimension, so only the block being
+    #   appended needs to be held in memory
+    def append_to_dataset(self, grp, field, block, dtype=None, spec=None):
+        block = np.asarray(block)
+        if block.ndim == 0:
+            block = block.reshape(1)
+        if field not in grp:
+            varg = {}
+            varg["name"] = field
+            varg["shape"] = (0,) + block.shape[1:]
+            varg["maxshape"] = (None,) + block.shape[1:]
+            varg["chunks"] = True
+            if dtype is None:
+                varg["dtype"] = block.dtype
+            else:
+                varg["dtype"] = dtype
+            opts = self.get_storage_options(spec)
+            varg.update(opts)
+            # resizable datasets must be chunked
+            if varg["chunks"] is None or varg["chunks"] is False:
+                varg["chunks"] = True
+            dset = grp.create_dataset(**varg)
+        else:
+            dset = grp[field]
+            if dset.shape[1:] != block.shape[1:]:
+                self.fatal_error("Appended block has shape %s, expected %s for field '%s'" % (block.shape[1:], dset.shape[1:], field))
+        n = dset.shape[0]
+        dset.resize(n + block.shape[0], axis=0)
+        dset[n:] = block
+        return dset
+
     # internal function to add attributes, identified in the supplied spec,
     #   to an existing HDF5 group
     def write_attributes(self, grp, spec):
         attr = spec["_attributes"]
-        for k in attr:
-            if k.startswith('_'):
-                continue    # internal field -- nothing to write out
-            if k == "<>" or k == "[]":
-                continue    # template
-            if "_value" in attr[k]:
+        for k in spec_fields(attr):
+            if "_value" in peek_spec(attr, k):
                 try:
                     # python 3 has different string handling
                     # attribute writing restructured in attempt to
@@ -1082,27 +2311,28 @@ class NWB(object):
     #     where things are at a particular recursion round)
     def write_datasets(self, grp, path, spec):
         # write out all fields that have a _value
-        for k in spec:
-            if k.startswith('_'):
-                continue    # internal field -- nothing to write out
-            if k == "<>" or k == "[]":
-            #if k == "<>" or k == "[]" or k == "{}":
-                continue    # template
+        # control fields and templates are skipped
+        fields = spec_fields(spec)
+        for k in fields:
             # create dataset for fields in spec where _value* is specified
-            local_spec = spec[k]
+            # fields without a value aren't changed, so don't need
+            #   to be copied from the template
+            local_spec = peek_spec(spec, k)
             if local_spec["_datatype"] == "group":
+                local_spec = spec[k]
                 nest = path + k + "/"
                 self.write_datasets(grp, nest, local_spec)
                 if "_attributes" in local_spec:
                     self.write_attributes(grp[nest], local_spec)
             elif "_value" in local_spec:
-                self.write_dataset_to_file(grp, path, k, local_spec)
+                self.write_dataset_to_file(grp, path, k, spec[k])
             elif "_value_softlink" in local_spec:
-                self.write_dataset_as_softlink(grp, path, k, local_spec)
+                self.write_dataset_as_softlink(grp, path, k, spec[k])
             elif "_value_hardlink" in local_spec:
-                self.write_dataset_as_hardlink(grp, path, k, local_spec)
-            if "_attributes" in spec:
-                self.write_attributes(grp, spec)
+                self.write_dataset_as_hardlink(grp, path, k, spec[k])
+        # attributes are only written for groups that have fields
+        if len(fields) > 0 and "_attributes" in spec:
+            self.write_attributes(grp, spec)
 
     # make sure specified path exists in group. if not, create it
     def ensure_path(self, grp, path):
@@ -1150,6 +2380,13 @@ class NWB(object):
         # advance group to specified location in path
         if len(path) > 0:
             grp = grp[path]
+        # data that was streamed to disk (eg, TimeSeries.append_data())
+        #   is already in place -- only its attributes need to be written
+        if isinstance(spec["_value"], h5py.Dataset):
+            if field in grp and grp[field] == spec["_value"]:
+                self.log_dataset(spec["_value"], None)
+                self.write_dataset_attributes(spec["_value"], field, spec)
+                return
         # make sure dataset (or group) w/ this name doesn't exist already
         if field in grp:
             self.fatal_error("Field %s already exists" % field)
@@ -1190,52 +2427,52 @@ class NWB(object):
                 # assume 1D array
                 if isinstance(value[0], list):
                     self.fatal_error("Error -- writing multidimensional text arrays not yet supported (field %s)" % field)
-                sz = -1 
-                stype = ""
-                for i in range(len(value)):
-                    if sz < len(value[i]):
-                        sz = len(value[i])
-                        stype = "S%d" % (sz + 1)
-                varg["shape"] = (len(value),)
-                varg["dtype"] = stype
+                # convert the list in one pass and write it in one call
                 # ignore compression/chunking for strings
-                dset = grp.create_dataset(**varg)
-                # space reserved for strings -- copy into place
-                for i in range(len(value)):
-                    dset[i] = np.string_(value[i])
+                text = np.array(value, dtype=np.bytes_)
+                if self.text_storage == "vlen":
+                    # variable-length strings, so one long entry doesn't
+                    #   set the storage size of every entry
+                    varg["data"] = text.astype(object)
+                    varg["dtype"] = h5py.special_dtype(vlen=bytes)
+                else:
+                    varg["data"] = text.astype("S%d" % (text.itemsize + 1))
+                    del varg["dtype"]
+                dset = self.create_dataset_logged(grp, varg)
             else:
                 varg["data"] = np.string_(value)
                 # don't specify dtype='str' -- h5py doesn't like that
                 del varg["dtype"]
-                ## ignore compression/chunking request for strings
-                #dset = grp.create_dataset(**varg)
-                if self.auto_compress:
-                    varg["compression"] = 4
-                    varg["chunks"] = True
-                    try:
-                        # try to use compression -- if we get a type error,
-                        #   disable and try again
-                        dset = grp.create_dataset(**varg)
-                    except TypeError:
-                        del varg["compression"]
-                        del varg["chunks"]
-                        dset = grp.create_dataset(**varg)
-                else:
-                    dset = grp.create_dataset(**varg)
+                # scalars can't be chunked or compressed
+                dset = self.create_dataset_logged(grp, varg)
         else:
             # try to use compression -- if we get a type error, disable
             #   and try again
             varg["data"] = spec["_value"]
-            if self.auto_compress:
-                varg["compression"] = 4
-                varg["chunks"] = True
+            contiguous = False
+            if np.isscalar(varg["data"]) or getattr(varg["data"], "ndim", None) == 0:
+                opts = {}   # scalars can't be chunked or compressed
+            else:
+                opts = self.get_storage_options(spec)
+                shape = getattr(varg["data"], "shape", None)
+                dtype = getattr(varg["data"], "dtype", None)
+                if "_storage" not in spec and self.use_contiguous_layout(shape, dtype):
+                    opts = {}
+                    contiguous = True
+            if self.is_external_array(varg["data"]):
+                dset = self.write_dataset_from_source(grp, varg, opts, contiguous)
+            elif self.use_parallel_compression(varg["data"], opts):
+                varg.update(opts)
+                dset = self.write_dataset_parallel(grp, varg)
+            elif len(opts) > 0:
+                varg.update(opts)
                 try:
-                    dset = grp.create_dataset(**varg)
-                except TypeError:
-                    del varg["compression"]
-                    del varg["chunks"]
+                    dset = self.create_dataset_logged(grp, varg)
+                except (TypeError, ValueError):
+                    for k in opts:
+                        del varg[k]
                     try:
-                        dset = grp.create_dataset(**varg)
+                        dset = self.create_dataset_logged(grp, varg)
                     except Exception as e:
                         print("Exception text: %s" % str(e))
                         print("** Internal error **")
@@ -1244,7 +2481,272 @@ class NWB(object):
                         print(varg["data"])
                         raise
             else:
-                dset = grp.create_dataset(**varg)
+                dset = self.create_dataset_logged(grp, varg)
+        self.write_dataset_attributes(dset, field, spec)
+
+    # internal function to determine the chunking and compression
+    #   settings for a dataset. the file-level policy is used unless
+    #   the field's spec has storage settings of its own (eg, from
+    #   set_data())
+    def get_storage_options(self, spec):
+        opts = dict(self.storage_policy)
+        if spec is not None and "_storage" in spec:
+            custom = dict(spec["_storage"])
+            if custom.get("compression") in ("none", False):
+                # compression explicitly disabled for this field. chunking
+                #   is dropped too, unless the field requests it
+                for k in ["compression", "compression_opts", "shuffle", "chunks"]:
+                    if k in opts:
+                        del opts[k]
+                del custom["compression"]
+            elif "compression" in custom:
+                # the policy's filter options (eg, the gzip level) don't
+                #   apply to a different filter
+                for k in FILTER_OPTIONS:
+                    if k in opts and k not in custom:
+                        del opts[k]
+            opts.update(custom)
+        return opts
+
+    # internal function to determine if an array should be stored
+    #   contiguously, without chunking or compression (see the
+    #   'contiguous_bytes' constructor argument). values that aren't
+    #   arrays (eg, lists) have no shape, and are stored according to
+    #   the storage policy
+    def use_contiguous_layout(self, shape, dtype):
+        if self.contiguous_bytes is None:
+            return False
+        if shape is None or len(shape) == 0 or dtype is None:
+            return False
+        try:
+            dtype = np.dtype(dtype)
+        except TypeError:
+            return False
+        if dtype.kind not in ('b', 'i', 'u', 'f', 'c'):
+            return False
+        return int(np.prod(shape)) * dtype.itemsize >= self.contiguous_bytes
+
+    # internal function to determine if a value is an array whose
+    #   contents may not be in memory (eg, np.memmap, h5py.Dataset, or
+    #   another object providing shape, dtype and slicing). these are
+    #   copied to the file in pieces rather than materialized
+    def is_external_array(self, value):
+        if isinstance(value, (np.memmap, h5py.Dataset)):
+            return True
+        if isinstance(value, (np.ndarray, np.generic, list, tuple, str, bytes)):
+            return False
+        for k in ["shape", "dtype", "__getitem__"]:
+            if not hasattr(value, k):
+                return False
+        return True
+
+    # internal function to determine if an HDF5 dataset is already
+    #   stored with the chunking and filters that the field is to be
+    #   stored with, so it can be copied as an HDF5 object. with no
+    #   storage options, the source's layout is kept
+    def source_layout_matches(self, src, opts, contiguous):
+        if contiguous:
+            return src.chunks is None
+        if len(opts) == 0:
+            return True
+        for k in opts:
+            if k not in ("chunks", "compression", "compression_opts", "shuffle"):
+                return False
+        if src.fletcher32 or src.scaleoffset is not None:
+            return False
+        compression = opts.get("compression")
+        level = opts.get("compression_opts")
+        if isinstance(compression, int) and not isinstance(compression, bool):
+            compression, level = "gzip", compression  # h5py shorthand
+        if compression != src.compression:
+            return False
+        if level is not None and level != src.compression_opts:
+            return False
+        shuffle = bool(opts.get("shuffle", False))
+        if shuffle != bool(src.shuffle):
+            return False
+        chunks = opts.get("chunks")
+        if chunks is True or (chunks is None and (compression is not None or shuffle)):
+            return src.chunks is not None
+        if chunks is None or chunks is False:
+            return src.chunks is None
+        return src.chunks is not None and tuple(src.chunks) == tuple(chunks)
+
+    # internal function to write a dataset from an external array in
+    #   constant memory. HDF5 datasets are copied as HDF5 objects when
+    #   no type conversion is needed and the source's layout matches
+    #   the storage options (see source_layout_matches()). otherwise
+    #   the source is copied in slabs along its first dimension
+    def write_dataset_from_source(self, grp, varg, opts, contiguous=False):
+        t0 = time.time()
+        src = varg["data"]
+        if "dtype" in varg:
+            dtype = np.dtype(varg["dtype"])
+        else:
+            dtype = np.dtype(src.dtype)
+        shape = tuple(src.shape)
+        copy = isinstance(src, h5py.Dataset) and dtype == src.dtype
+        if copy and not self.source_layout_matches(src, opts, contiguous):
+            copy = False
+        if copy:
+            # object copy, within or between files. the source's
+            #   attributes aren't copied -- the field's are written
+            #   from its specification
+            grp.copy(src, grp, name=varg["name"], without_attrs=True)
+            dset = grp[varg["name"]]
+        elif len(shape) == 0 or shape[0] == 0:
+            dset = grp.create_dataset(varg["name"], data=np.asarray(src[()]), dtype=dtype)
+        else:
+            cvarg = {}
+            cvarg["name"] = varg["name"]
+            cvarg["shape"] = shape
+            cvarg["dtype"] = dtype
+            cvarg.update(opts)
+            dset = grp.create_dataset(**cvarg)
+            # copy slabs of whole chunks, where possible
+            row_bytes = dtype.itemsize * int(np.prod(shape[1:]))
+            rows = max(1, SLAB_BYTES // max(row_bytes, 1))
+            if dset.chunks is not None:
+                rows = max(dset.chunks[0], rows - rows % dset.chunks[0])
+            for i in range(0, shape[0], rows):
+                dset[i:i+rows] = np.asarray(src[i:i+rows], dtype=dtype)
+        self.log_dataset(dset, time.time() - t0)
+        return dset
+
+    # internal function to decide if a dataset should be compressed
+    #   using multiple threads. this is only worthwhile for large arrays,
+    #   and is only possible for gzip (w/ optional shuffle) compression
+    def use_parallel_compression(self, value, opts):
+        if self.compression_threads <= 1:
+            return False
+        if opts.get("compression") != "gzip":
+            return False
+        for k in opts:
+            if k not in ["compression", "compression_opts", "shuffle", "chunks"]:
+                return False
+        if not isinstance(value, np.ndarray) or value.ndim == 0:
+            return False
+        if value.dtype.kind not in ('b', 'i', 'u', 'f'):
+            return False
+        if not hasattr(h5py.h5d.DatasetID, "write_direct_chunk"):
+            return False
+        return value.nbytes >= PARALLEL_COMPRESSION_BYTES
+
+    # internal function to write a gzip-compressed dataset, using a pool
+    #   of threads to compress the chunks. each chunk is compressed with
+    #   zlib, which is the encoding used by the HDF5 deflate (gzip)
+    #   filter, and is then stored directly. the file can be read with
+    #   the standard filter
+    def write_dataset_parallel(self, grp, varg):
+        t0 = time.time()
+        data = varg["data"]
+        if "dtype" in varg:
+            data = np.asarray(data, dtype=np.dtype(varg["dtype"]))
+        data = np.ascontiguousarray(data)
+        cvarg = {}
+        cvarg["name"] = varg["name"]
+        cvarg["shape"] = data.shape
+        cvarg["dtype"] = data.dtype
+        for k in ["compression", "compression_opts", "shuffle", "chunks"]:
+            if k in varg:
+                cvarg[k] = varg[k]
+        if cvarg.get("chunks") is None:
+            cvarg["chunks"] = True
+        dset = grp.create_dataset(**cvarg)
+        chunks = dset.chunks
+        level = dset.compression_opts
+        shuffle = dset.shuffle
+        itemsize = data.dtype.itemsize
+        def compress(offset):
+            # edge chunks are stored padded to the full chunk size
+            block = np.zeros(chunks, dtype=data.dtype)
+            src = tuple(slice(o, min(o + c, n)) for o, c, n in zip(offset, chunks, data.shape))
+            dst = tuple(slice(0, s.stop - s.start) for s in src)
+            block[dst] = data[src]
+            raw = block.tobytes()
+            if shuffle and itemsize > 1:
+                raw = np.frombuffer(raw, dtype=np.uint8).reshape(-1, itemsize).T.tobytes()
+            return offset, zlib.compress(raw, level)
+        grid = [range(0, n, c) for n, c in zip(data.shape, chunks)]
+        offsets = [tuple(int(x) for x in o) for o in itertools.product(*grid)]
+        pool = ThreadPool(self.compression_threads)
+        try:
+            # compress a limited number of chunks at a time to bound
+            #   the memory held by compressed output
+            batch = self.compression_threads * 4
+            for i in range(0, len(offsets), batch):
+                for offset, buf in pool.map(compress, offsets[i:i+batch]):
+                    dset.id.write_direct_chunk(offset, buf)
+        finally:
+            pool.close()
+            pool.join()
+        self.log_dataset(dset, time.time() - t0)
+        return dset
+
+    # internal function to create a dataset and keep a record of the
+    #   storage settings used and how long the write took
+    def create_dataset_logged(self, grp, varg):
+        t0 = time.time()
+        dset = grp.create_dataset(**varg)
+        self.log_dataset(dset, time.time() - t0)
+        return dset
+
+    # internal function to write a scalar dataset using HDF5's low-level
+    #   API, which is several times faster than create_dataset(). this
+    #   is for small datasets that are written in large numbers (eg,
+    #   epoch indices). these are only added to the storage log while
+    #   profiling, as logging them costs more than writing them
+    def write_scalar(self, grp, name, value, dtype):
+        t0 = time.time()
+        dtype = np.dtype(dtype)
+        if dtype not in self.scalar_types:
+            self.scalar_types[dtype] = h5py.h5t.py_create(dtype)
+        if self.scalar_space is None:
+            self.scalar_space = h5py.h5s.create(h5py.h5s.SCALAR)
+        tid = self.scalar_types[dtype]
+        dset = h5py.h5d.create(grp.id, name.encode(), tid, self.scalar_space)
+        dset.write(h5py.h5s.ALL, h5py.h5s.ALL, np.array(value, dtype=dtype))
+        if self.profile_phase is not None:
+            self.log_dataset(h5py.Dataset(dset), time.time() - t0)
+
+    # internal function to add an entry to the storage log
+    def log_dataset(self, dset, seconds):
+        entry = {}
+        entry["path"] = dset.name
+        entry["dtype"] = str(dset.dtype)
+        entry["shape"] = dset.shape
+        entry["bytes"] = dset.size * dset.dtype.itemsize
+        entry["stored_bytes"] = dset.id.get_storage_size()
+        entry["chunks"] = dset.chunks
+        entry["compression"] = dset.compression
+        entry["compression_opts"] = dset.compression_opts
+        entry["shuffle"] = dset.shuffle
+        entry["seconds"] = seconds
+        self.storage_log.append(entry)
+        if self.profile_phase is not None:
+            self.profile_entries.append(entry)
+
+    def get_storage_log(self):
+        """ Returns a record of the storage settings used for each
+            dataset written so far. This is useful for comparing write
+            throughput between different compression and chunk settings
+
+            Arguments:
+                *none*
+
+            Returns:
+                List of dictionaries, one per dataset, for the most
+                recent STORAGE_LOG_ENTRIES datasets, with the keys
+                'path', 'dtype', 'shape', 'bytes' (uncompressed size),
+                'stored_bytes' (size in file), 'chunks', 'compression', 'compression_opts', 'shuffle'
+                and 'seconds' (time to create and write the dataset, or
+                None if the dataset was written incrementally)
+        """
+        return list(self.storage_log)
+
+    # internal function to write attributes, identified in the supplied
+    #   spec, to an existing HDF5 dataset
+    def write_dataset_attributes(self, dset, field, spec):
         if "_attributes" in spec:
             for k in spec["_attributes"]:
                 if k.startswith('_'):
@@ -0,0 +1,317 @@
+"""
+Catalog of NWB files
+
+Scans a directory tree for NWB files and records their metadata in an
+SQLite database, so collections of files can be searched without
+opening each one. Files are read in parallel by a pool of processes.
+When the catalog is updated, only files that are new or whose
+modification time or size has changed are read again, and files that
+no longer exist are removed
+
+Usage:
+    python -m nwb.nwbcat <directory> <catalog.db> [--processes N]
+
+The catalog has these tables:
+
+    files -- one row per file: path, mtime, size, identifier,
+    session_start_time, session_description, nwb_version,
+    file_create_date and error (the reason the file couldn't be read,
+    or NULL)
+
+    metadata -- fields under /general, as (path, key, value), where
+    key is the field's path relative to /general (eg, 'subject/species').
+    Text fields defined in the format specification are recorded, as
+    are custom text fields (see NWB.set_metadata()). Arrays of text are
+    stored as JSON lists
+
+    timeseries -- one row per time series: path (of the file), ts_path,
+    ts_type, ancestry (comma-separated), num_samples, start_time and
+    stop_time
+
+For example, to find the files that have an ImageSeries:
+    SELECT DISTINCT path FROM timeseries WHERE ancestry LIKE '%ImageSeries%'
+
+Copyright (c) 2015 Allen Institute, California Institute of Technology,
+New York University School of Medicine, the Howard Hughes Medical
+Institute, University of California, Berkeley, GE, the Kavli Foundation
+and the International Neuroinformatics Coordinating Facility.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following
+conditions are met:
+
+1.  Redistributions of source code must retain the above copyright
+    notice, this list of conditions and the following disclaimer.
+
+2.  Redistributions in binary form must reproduce the above copyright
+    notice, this list of conditions and the following disclaimer in
+    the documentation and/or other materials provided with the distribution.
+
+3.  Neither the name of the copyright holder nor the names of its
+    contributors may be used to endorse or promote products derived
+    from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+import os
+import json
+import sqlite3
+import argparse
+import multiprocessing
+import h5py
+import numpy as np
+from . import nwb as nwblib
+
+# file name suffixes of files that are cataloged
+NWB_SUFFIXES = (".nwb", ".h5", ".hdf5")
+
+# number of scanned files written to the catalog in each transaction
+COMMIT_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime REAL,
+    size INTEGER,
+    identifier TEXT,
+    session_start_time TEXT,
+    session_description TEXT,
+    nwb_version TEXT,
+    file_create_date TEXT,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS metadata (
+    path TEXT,
+    key TEXT,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS timeseries (
+    path TEXT,
+    ts_path TEXT,
+    ts_type TEXT,
+    ancestry TEXT,
+    num_samples INTEGER,
+    start_time REAL,
+    stop_time REAL
+);
+CREATE INDEX IF NOT EXISTS metadata_path ON metadata (path);
+CREATE INDEX IF NOT EXISTS metadata_key ON metadata (key, value);
+CREATE INDEX IF NOT EXISTS timeseries_path ON timeseries (path);
+CREATE INDEX IF NOT EXISTS timeseries_type ON timeseries (ts_type);
+"""
+
+# converts a value read from the file to text for the catalog. returns
+#   None for values that aren't text (eg, numeric arrays)
+def catalog_text(val):
+    val = nwblib.decode_value(val)
+    if isinstance(val, str):
+        return val
+    if isinstance(val, np.ndarray) and val.dtype == object:
+        return json.dumps([str(x) for x in val.flat])
+    return None
+
+# reads the text fields under a group of /general, using the
+#   specification to identify fields. groups with names that aren't in
+#   the specification are described by its '<>' entry, and custom
+#   datasets by its '[]' entry
+def read_general(grp, spec, prefix, out):
+    for name in grp:
+        obj = grp.get(name)
+        if obj is None:
+            continue    # eg, broken external link
+        if name in spec and isinstance(spec[name], dict):
+            field = spec[name]
+        elif isinstance(obj, h5py.Group):
+            field = spec.get("<>")
+        else:
+            field = spec.get("[]")
+        if isinstance(obj, h5py.Group):
+            read_general(obj, field if field is not None else {}, prefix + name + "/", out)
+            continue
+        if field is not None and field.get("_datatype") not in ("str", "text", "unrestricted"):
+            continue    # numeric field
+        if len(obj.shape) > 1:
+            continue
+        text = catalog_text(obj[()])
+        if text is not None:
+            out.append((prefix + name, text))
+
+# returns the object index of a file, or the equivalent rows found by
+#   walking the file if it doesn't have one
+def read_timeseries(fp):
+    rows = []
+    if "object_index" in fp:
+        for row in fp["object_index"][()]:
+            rows.append(tuple(nwblib.decode_value(x) for x in row))
+    else:
+        for path, kind in sorted(nwblib.find_objects(fp).items()):
+            rows.append(nwblib.object_index_row(fp[path], kind))
+    series = []
+    for path, kind, ancestry, n, t0, t1, dtype, shape in rows:
+        if kind != "TimeSeries":
+            continue
+        ts_type = ancestry.split(",")[-1]
+        t0 = None if np.isnan(t0) else float(t0)
+        t1 = None if np.isnan(t1) else float(t1)
+        series.append((path, ts_type, ancestry, int(n), t0, t1))
+    return series
+
+# specification of /general, loaded once in each worker process
+general_spec = [None]
+
+# reads the catalog entries of one file. this is run in the worker
+#   processes. errors are returned rather than raised, so that one
+#   bad file doesn't stop the scan
+def scan_file(args):
+    path, mtime, size = args
+    entry = {}
+    entry["path"] = path
+    entry["mtime"] = mtime
+    entry["size"] = size
+    entry["error"] = None
+    entry["metadata"] = []
+    entry["timeseries"] = []
+    try:
+        if general_spec[0] is None:
+            general_spec[0] = nwblib.load_spec([])["General"]
+        with h5py.File(path, 'r') as fp:
+            for k in ["identifier", "session_start_time", "session_description", "nwb_version"]:
+                entry[k] = catalog_text(fp[k][()]) if k in fp else None
+            entry["file_create_date"] = None
+            if "file_create_date" in fp and len(fp["file_create_date"]) > 0:
+                entry["file_create_date"] = catalog_text(fp["file_create_date"][0])
+            if "general" in fp:
+                read_general(fp["general"], general_spec[0], "", entry["metadata"])
+            entry["timeseries"] = read_timeseries(fp)
+    except Exception as e:
+        entry["error"] = "%s: %s" % (type(e).__name__, str(e))
+        # nothing read before the error is stored
+        entry["metadata"] = []
+        entry["timeseries"] = []
+    return entry
+
+# returns (path, mtime, size) for each NWB file in a directory tree
+def find_files(directory):
+    files = []
+    for root, dirs, names in os.walk(directory):
+        dirs.sort()
+        for name in sorted(names):
+            if not name.endswith(NWB_SUFFIXES):
+                continue
+            path = os.path.abspath(os.path.join(root, name))
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files.append((path, st.st_mtime, st.st_size))
+    return files
+
+# replaces the catalog entries of a file
+def store_entry(db, entry):
+    path = entry["path"]
+    remove_entry(db, path)
+    row = [path, entry["mtime"], entry["size"]]
+    for k in ["identifier", "session_start_time", "session_description", "nwb_version", "file_create_date"]:
+        row.append(entry.get(k))
+    row.append(entry["error"])
+    db.execute("INSERT INTO files VALUES (?,?,?,?,?,?,?,?,?)", row)
+    db.executemany("INSERT INTO metadata VALUES (?,?,?)", [(path, k, v) for k, v in entry["metadata"]])
+    db.executemany("INSERT INTO timeseries VALUES (?,?,?,?,?,?,?)", [(path,) + ts for ts in entry["timeseries"]])
+
+def remove_entry(db, path):
+    for table in ["files", "metadata", "timeseries"]:
+        db.execute("DELETE FROM %s WHERE path=?" % table, (path,))
+
+def build_catalog(directory, catalog, processes=None):
+    """ Creates or updates a catalog of the NWB files in a directory
+        tree. Files are read by a pool of processes. Files already in
+        the catalog are only read again if their modification time or
+        size has changed, and files that have been removed are dropped
+        from the catalog
+
+        Arguments:
+            *directory* (text) Directory to search for NWB files (files
+            ending in .nwb, .h5 or .hdf5)
+
+            *catalog* (text) Name of the SQLite database file. This is
+            created if it doesn't exist
+
+            *processes* (int -- optional) Number of processes used to
+            read files. Default is the number of CPUs
+
+        Returns:
+            Dictionary with the number of files 'scanned', 'unchanged',
+            'removed' and 'errors' (files that couldn't be read)
+    """
+    db = sqlite3.connect(catalog)
+    db.executescript(SCHEMA)
+    known = {}
+    for path, mtime, size in db.execute("SELECT path, mtime, size FROM files"):
+        known[path] = (mtime, size)
+    files = find_files(directory)
+    todo = []
+    present = set()
+    for path, mtime, size in files:
+        present.add(path)
+        if known.get(path) != (mtime, size):
+            todo.append((path, mtime, size))
+    # files under the directory that no longer exist
+    base = os.path.join(os.path.abspath(directory), "")
+    removed = [p for p in known if p.startswith(base) and p not in present]
+    for path in removed:
+        remove_entry(db, path)
+    db.commit()
+    summary = {}
+    summary["scanned"] = len(todo)
+    summary["unchanged"] = len(files) - len(todo)
+    summary["removed"] = len(removed)
+    summary["errors"] = 0
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if processes <= 1 or len(todo) <= 1:
+        results = map(scan_file, todo)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes)
+        chunk = max(1, min(64, len(todo) // (4 * processes)))
+        results = pool.imap_unordered(scan_file, todo, chunk)
+    try:
+        count = 0
+        for entry in results:
+            store_entry(db, entry)
+            if entry["error"] is not None:
+                summary["errors"] += 1
+            count += 1
+            if count % COMMIT_BATCH == 0:
+                db.commit()
+        db.commit()
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        db.close()
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or update a catalog of NWB files")
+    parser.add_argument("directory", help="directory to search for NWB files")
+    parser.add_argument("catalog", help="SQLite catalog file to create or update")
+    parser.add_argument("--processes", type=int, default=None, help="number of processes used to read files (default: number of CPUs)")
+    args = parser.parse_args()
+    summary = build_catalog(args.directory, args.catalog, args.processes)
+    print("%d files scanned, %d unchanged, %d removed, %d errors" % (summary["scanned"], summary["unchanged"], summary["removed"], summary["errors"]))
+
+if __name__ == "__main__":
+    main()
@@ -37,6 +37,397 @@ import copy
 import numpy as np
 from . import nwbts
 
+# number of timestamps read at a time when searching for the overlap
+#   between an epoch and a time series. for chunked datasets, one
+#   chunk is read at a time instead
+SEARCH_BLOCK = 4096
+
+# timestamps are searched by bisection, reading only the blocks that
+#   are needed. this works for timestamps in the file (h5py datasets)
+#   as well as numpy arrays. timestamps are assumed to be increasing,
+#   apart from NaNs, which mark gaps in the data and are skipped
+
+def search_block_size(timestamps):
+    chunks = getattr(timestamps, "chunks", None)
+    if chunks is not None:
+        return chunks[0]
+    return SEARCH_BLOCK
+
+# returns block k of the timestamps, reading it if it isn't in cache
+def read_search_block(timestamps, k, block, cache):
+    if k not in cache:
+        cache[k] = np.asarray(timestamps[k*block:(k+1)*block], dtype=np.float64)
+    return cache[k]
+
+# returns the index and value of the first non-NaN timestamp in [i,hi),
+#   or None, None if there isn't one
+def next_valid_time(timestamps, i, hi, block, cache):
+    while i < hi:
+        k = i // block
+        vals = read_search_block(timestamps, k, block, cache)
+        seg = vals[i-k*block:hi-k*block]
+        ok = np.flatnonzero(~np.isnan(seg))
+        if len(ok) > 0:
+            return i + ok[0], seg[ok[0]]
+        i = (k+1) * block
+    return None, None
+
+# returns the index and value of the last non-NaN timestamp in [lo,i],
+#   or None, None if there isn't one
+def prev_valid_time(timestamps, i, lo, block, cache):
+    while i >= lo:
+        k = i // block
+        vals = read_search_block(timestamps, k, block, cache)
+        a = max(lo - k*block, 0)
+        seg = vals[a:i-k*block+1]
+        ok = np.flatnonzero(~np.isnan(seg))
+        if len(ok) > 0:
+            return k*block + a + ok[-1], seg[ok[-1]]
+        i = k*block - 1
+    return None, None
+
+# returns index of the first non-NaN timestamp that's >= value, or None
+def find_first_at_or_after(timestamps, n, value, block, cache):
+    lo = 0
+    hi = n
+    best = None
+    while lo < hi:
+        mid = (lo + hi) // 2
+        j, t = next_valid_time(timestamps, mid, hi, block, cache)
+        if j is None:
+            hi = mid    # only NaNs in [mid,hi)
+        elif t >= value:
+            best = j
+            hi = mid
+        else:
+            lo = j + 1
+    return best
+
+# returns index of the last non-NaN timestamp that's <= value, or None
+def find_last_at_or_before(timestamps, n, value, block, cache):
+    lo = 0
+    hi = n
+    best = None
+    while lo < hi:
+        mid = (lo + hi) // 2
+        j, t = prev_valid_time(timestamps, mid, lo, block, cache)
+        if j is None:
+            lo = mid + 1    # only NaNs in [lo,mid]
+        elif t <= value:
+            best = j
+            lo = mid + 1
+        else:
+            hi = j
+    return best
+
+# returns time of sample i of a series with a constant sampling rate.
+#   this must match the value from t0 + np.arange(n) / rate. the rate
+#   is stored as float32, so it's converted here -- with NumPy 2,
+#   dividing by a float32 scalar is done in single precision
+def rate_sample_time(t0, rate, i):
+    return float(t0) + float(i) / float(rate)
+
+def find_rate_overlap(t0, rate, n, start, stop):
+    """ Finds the first and last samples of a time series with a
+        constant sampling rate that are within an interval. This is
+        calculated directly, without creating an array of timestamps
+
+        Arguments:
+            *t0* (float) Time of first sample
+
+            *rate* (float) Sampling rate, in Hz
+
+            *n* (int) Number of samples
+
+            *start* (float) Start of interval
+
+            *stop* (float) End of interval
+
+        Returns:
+            *idx_0*, *idx_1* (ints) Index of first and last samples
+            that fall within specified interval, or None, None if
+            there is no overlap
+    """
+    n = int(n)
+    t0 = float(t0)
+    rate = float(rate)
+    if n <= 0 or rate <= 0:
+        return None, None
+    # estimate indices, then correct for rounding so the result is the
+    #   same as searching the calculated timestamps
+    i0 = int(np.clip(np.ceil((start - t0) * rate), 0, n))
+    while i0 > 0 and rate_sample_time(t0, rate, i0-1) >= start:
+        i0 -= 1
+    while i0 < n and rate_sample_time(t0, rate, i0) < start:
+        i0 += 1
+    i1 = int(np.clip(np.floor((stop - t0) * rate), -1, n-1))
+    while i1 < n-1 and rate_sample_time(t0, rate, i1+1) <= stop:
+        i1 += 1
+    while i1 >= 0 and rate_sample_time(t0, rate, i1) > stop:
+        i1 -= 1
+    if i0 >= n or i1 < 0 or i0 > i1:
+        return None, None
+    return i0, i1
+
+def find_overlaps(timestamps, starts, stops, block=None):
+    """ Finds the first and last timestamps that are within each of
+        several intervals. Each interval is searched by bisection, as
+        in find_overlap(), and blocks read for one interval are reused
+        for the others. To search many intervals, a TimestampIndex is
+        faster
+
+        Arguments:
+            *timestamps* (double array or h5py dataset) Timestamps, in
+            increasing order. NaN values are ignored
+
+            *starts* (float array) Start of each interval
+
+            *stops* (float array) End of each interval
+
+            *block* (int -- optional) Number of timestamps read at a
+            time. Default is the dataset's chunk size, or SEARCH_BLOCK
+
+        Returns:
+            *idx_0*, *idx_1* (int arrays) Index of first and last
+            elements in *timestamps* that fall within each interval.
+            Both are -1 for intervals that have no overlap
+    """
+    starts = np.asarray(starts, dtype=np.float64)
+    stops = np.asarray(stops, dtype=np.float64)
+    i0 = np.zeros(len(starts), dtype=np.int64) - 1
+    i1 = np.zeros(len(starts), dtype=np.int64) - 1
+    n = len(timestamps)
+    if block is None:
+        block = search_block_size(timestamps)
+    cache = {}
+    for k in range(len(starts)):
+        a, b = search_overlap(timestamps, n, starts[k], stops[k], block, cache)
+        if a is not None:
+            i0[k] = a
+            i1[k] = b
+    return i0, i1
+
+def find_overlap(timestamps, start, stop, block=None):
+    """ Finds the first and last timestamps that are within an interval.
+        Timestamps can be an array or a dataset in an HDF5 file. For
+        datasets, only the chunks needed for the search are read
+
+        Arguments:
+            *timestamps* (double array or h5py dataset) Timestamps, in
+            increasing order. NaN values are ignored
+
+            *start* (float) Start of interval
+
+            *stop* (float) End of interval
+
+            *block* (int -- optional) Number of timestamps read at a
+            time. Default is the dataset's chunk size, or SEARCH_BLOCK
+
+        Returns:
+            *idx_0*, *idx_1* (ints) Index of first and last elements
+            in *timestamps* that fall within specified interval, or
+            None, None if there is no overlap
+    """
+    if block is None:
+        block = search_block_size(timestamps)
+    return search_overlap(timestamps, len(timestamps), start, stop, block, {})
+
+# searches for the overlap of an interval by bisection, using blocks
+#   that are in cache and adding those that are read
+def search_overlap(timestamps, n, start, stop, block, cache):
+    i0 = find_first_at_or_after(timestamps, n, start, block, cache)
+    if i0 is None:
+        return None, None   # no timestamps at or after start
+    if read_search_block(timestamps, i0 // block, block, cache)[i0 % block] > stop:
+        return None, None   # timestamps only before start and after stop
+    i1 = find_last_at_or_before(timestamps, n, stop, block, cache)
+    return int(i0), int(i1)
+
+# maximum number of blocks kept by a block index between queries
+INDEX_BLOCK_CACHE = 4
+
+class TimestampIndex(object):
+    """ Index of a time series' timestamps, used to find the overlap
+        with many epochs without searching the timestamps each time.
+        Building an index reads the timestamps, so it's only worthwhile
+        for repeated queries. The NWB object keeps these in a cache
+        (see NWB.find_timestamp_overlaps())
+
+        Depending on the memory allowed, the index is one of:
+
+            'sorted' -- the non-NaN timestamps are held in memory, with
+            their positions in the dataset if there are NaN gaps
+
+            'block' -- the first and last non-NaN timestamp of each
+            block (chunk) of the dataset are held in memory. a query
+            reads at most two blocks
+
+            'search' -- nothing is held in memory, and each query
+            searches the dataset by bisection (see find_overlap())
+    """
+    def __init__(self, timestamps, max_bytes, block=None):
+        #**Constructor arguments:**
+        #    **timestamps** (h5py dataset or double array) Timestamps,
+        #        in increasing order apart from NaNs
+        #    **max_bytes** (int) Maximum memory the index can use
+        #    **block** (int) Number of timestamps in each block. Default
+        #        is the dataset's chunk size, or SEARCH_BLOCK
+        self.timestamps = timestamps
+        self.num_samples = n = len(timestamps)
+        if block is None:
+            block = search_block_size(timestamps)
+        self.block = block
+        self.blocks = {}
+        self.times = None
+        self.valid = None
+        self.first = None
+        self.last = None
+        self.nbytes = 0
+        if 8 * n <= max_bytes:
+            t = np.asarray(timestamps[()], dtype=np.float64)
+            gaps = np.isnan(t)
+            if not gaps.any():
+                self.kind = "sorted"
+                self.times = t
+                self.nbytes = t.nbytes
+                return
+            valid = np.flatnonzero(~gaps)
+            if 16 * len(valid) <= max_bytes:
+                self.kind = "sorted"
+                self.times = t[valid]
+                self.valid = valid
+                self.nbytes = self.times.nbytes + valid.nbytes
+                return
+            self.build_block_index(t, max_bytes)
+        else:
+            self.build_block_index(None, max_bytes)
+
+    # internal function
+    # stores the first and last non-NaN timestamp of each block, or
+    #   uses search if even this doesn't fit in the allowed memory.
+    #   *t* is the full timestamp array, if it's already been read
+    def build_block_index(self, t, max_bytes):
+        block = self.block
+        num_blocks = (self.num_samples + block - 1) // block
+        if 16 * num_blocks + 8 * block * INDEX_BLOCK_CACHE > max_bytes:
+            self.kind = "search"
+            return
+        self.kind = "block"
+        self.first = np.zeros(num_blocks) + np.nan
+        self.last = np.zeros(num_blocks) + np.nan
+        for k in range(num_blocks):
+            if t is None:
+                vals = np.asarray(self.timestamps[k*block:(k+1)*block], dtype=np.float64)
+            else:
+                vals = t[k*block:(k+1)*block]
+            ok = np.flatnonzero(~np.isnan(vals))
+            if len(ok) > 0:
+                self.first[k] = vals[ok[0]]
+                self.last[k] = vals[ok[-1]]
+        # to find the first block with a time >= start, search the
+        #   running maximum of each block's last time. likewise, the
+        #   last block with a time <= stop is found from the running
+        #   minimum of first times, taken from the end. blocks that
+        #   are entirely NaN are never selected
+        self.last_max = np.fmax.accumulate(self.last)
+        self.last_max[np.isnan(self.last_max)] = -np.inf
+        self.first_min = np.fmin.accumulate(self.first[::-1])[::-1]
+        self.first_min[np.isnan(self.first_min)] = np.inf
+        self.nbytes = 4 * 8 * num_blocks + 8 * block * INDEX_BLOCK_CACHE
+
+    # internal function
+    # returns block k of the timestamps, keeping the most recently
+    #   used blocks
+    def read_block(self, k):
+        if k in self.blocks:
+            return self.blocks[k]
+        if len(self.blocks) >= INDEX_BLOCK_CACHE:
+            del self.blocks[next(iter(self.blocks))]
+        block = self.block
+        vals = np.asarray(self.timestamps[k*block:(k+1)*block], dtype=np.float64)
+        self.blocks[k] = vals
+        return vals
+
+    def find_overlap(self, start, stop):
+        """ Finds the first and last timestamps that are within an
+            interval (see nwbep.find_overlap())
+
+            Arguments:
+                *start* (float) Start of interval
+
+                *stop* (float) End of interval
+
+            Returns:
+                *idx_0*, *idx_1* (ints) Index of first and last
+                timestamps that fall within the interval, or None, None
+                if there is no overlap
+        """
+        if self.kind == "search":
+            return find_overlap(self.timestamps, start, stop, self.block)
+        if self.kind == "sorted":
+            t = self.times
+            a = np.searchsorted(t, start, side="left")
+            b = np.searchsorted(t, stop, side="right") - 1
+            if a >= len(t) or a > b:
+                return None, None
+            if self.valid is not None:
+                return int(self.valid[a]), int(self.valid[b])
+            return int(a), int(b)
+        # block index
+        block = self.block
+        k = np.searchsorted(self.last_max, start, side="left")
+        if k >= len(self.last_max):
+            return None, None
+        vals = self.read_block(k)
+        ok = np.flatnonzero(vals >= start)  # NaN compares false
+        a = k * block + ok[0]
+        if vals[ok[0]] > stop:
+            return None, None
+        k = np.searchsorted(self.first_min, stop, side="right") - 1
+        vals = self.read_block(k)
+        ok = np.flatnonzero(vals <= stop)
+        b = k * block + ok[-1]
+        return int(a), int(b)
+
+    def find_overlaps(self, starts, stops):
+        """ Finds the first and last timestamps that are within each of
+            several intervals
+
+            Arguments:
+                *starts* (float array) Start of each interval
+
+                *stops* (float array) End of each interval
+
+            Returns:
+                *idx_0*, *idx_1* (int arrays) Index of first and last
+                timestamps that fall within each interval. Both are -1
+                for intervals that have no overlap
+        """
+        if self.kind == "search":
+            return find_overlaps(self.timestamps, starts, stops, self.block)
+        starts = np.asarray(starts, dtype=np.float64)
+        stops = np.asarray(stops, dtype=np.float64)
+        i0 = np.zeros(len(starts), dtype=np.int64) - 1
+        i1 = np.zeros(len(starts), dtype=np.int64) - 1
+        if self.kind == "sorted":
+            t = self.times
+            a = np.searchsorted(t, starts, side="left")
+            b = np.searchsorted(t, stops, side="right") - 1
+            ok = (a < len(t)) & (a <= b)
+            if self.valid is not None:
+                i0[ok] = self.valid[a[ok]]
+                i1[ok] = self.valid[b[ok]]
+            else:
+                i0[ok] = a[ok]
+                i1[ok] = b[ok]
+            return i0, i1
+        for k in range(len(starts)):
+            a, b = self.find_overlap(starts[k], stops[k])
+            if a is not None:
+                i0[k] = a
+                i1[k] = b
+        return i0, i1
+
 class Epoch(object):
     """ Epoch object
         Epochs represent specific experimental intervals and store
@@ -62,7 +453,8 @@ class Epoch(object):
         # name of epoch
         self.name = name
         # make a copy of the epoch specification
-        self.spec = copy.deepcopy(spec)
+        from . import nwb as nwblib
+        self.spec = nwblib.copy_spec(spec)
         # reference to nwb 'kernel'
         self.nwb = nwb
         # intervals that are for ignoring data (eg, due noise)
@@ -73,6 +465,7 @@ class Epoch(object):
         # go ahead and create epoch folder now
         if self.name in nwb.file_pointer["epochs"]:
             nwb.fatal_error("Epoch %s already exists" % self.name)
+        nwb.journal_create("/epochs/" + self.name)
         nwb.file_pointer["epochs"].create_group(self.name)
         self.serial_num = -1
         self.finalized = False
@@ -166,103 +559,35 @@ class Epoch(object):
                 *nothing*
         """
         # store path to timeseries, so can create hard link
-        epoch_ts = {}
-        if isinstance(timeseries, nwbts.TimeSeries):
-            timeseries_path = timeseries.full_path()
-        elif isinstance(timeseries, str):
-            timeseries_path = timeseries
-        else:
-            self.nwb.fatal_error("Don't recognize timeseries parameter as time series or path")
-        if not timeseries_path.startswith('/'):
-            timeseries_path = '/' + timeseries_path
-        epoch_ts["timeseries"] = timeseries_path
-        #print timeseries_path
-        if timeseries_path not in self.nwb.file_pointer:
-            self.nwb.fatal_error("Time series '%s' not found" % timeseries_path)
+        timeseries_path = self.nwb.get_timeseries_path(timeseries)
         ts = self.nwb.file_pointer[timeseries_path]
+        # if no overlap, don't add to timeseries
+        # look for overlap between epoch and time series
         if "timestamps" in ts:
-            t = ts["timestamps"].value
+            i0, i1 = self.nwb.find_timestamp_overlaps(timeseries_path, [self.start_time], [self.stop_time])
+            i0 = None if i0[0] < 0 else i0[0]
+            i1 = i1[0]
         else:
-            n = ts["num_samples"].value
-            t0 = ts["starting_time"].value
+            n = ts["num_samples"][()]
+            t0 = ts["starting_time"][()]
             rate = ts["starting_time"].attrs["rate"]
-            t = t0 + np.arange(n) / rate
-        # if no overlap, don't add to timeseries
-        # look for overlap between epoch and time series
-        i0, i1 = self.find_ts_overlap(t)
+            i0, i1 = find_rate_overlap(t0, rate, n, self.start_time, self.stop_time)
         if i0 is None:
             return
-        epoch_ts["start_idx"] = i0
-        epoch_ts["count"] = i1 - i0 + 1
-        self.timeseries_dict[in_epoch_name] = epoch_ts
-        label = "'" + in_epoch_name + "' is '" + timeseries_path + "'"
-        self.spec["_attributes"]["links"]["_value"].append(label)
+        self.add_timeseries_overlap(in_epoch_name, timeseries_path, i0, i1)
         self.spec["_attributes"]["links"]["_value"].sort()  # VALIDATOR
 
     # internal function
-    # Finds the first element in *timestamps* that is >= *epoch_start*
-    # and last element that is <= "epoch_stop"
-
-    # Arguments:
-    #     *timestamps* (double array) Timestamp array
-
-    # Returns:
-    #     *idx_0*, "idx_1" (ints) Index of first and last elements 
-    #     in *timestamps* that fall within specified
-    #     interval, or None, None if there is no overlap
-    #
-    def find_ts_overlap(self, timestamps):
-        start = self.start_time
-        stop = self.stop_time
-        # ensure there are non-nan times
-        isnan = np.isnan(timestamps)
-        if isnan.all(): 
-            return None, None   # all values are NaN -- no overlap
-        # convert all nans to a numerical value 
-        # when searching for start, use -1
-        # when searching for end, use stop+1
-        timestamps = np.nan_to_num(timestamps)
-        t_test = timestamps + isnan * -1 # make nan<0
-        # array now nan-friendly. find first index where timestamps >= start
-        i0 = np.argmax(t_test >= start)
-        # if argmax returns zero then the first timestamp is >= start or 
-        #   no timestamps are. find out which is which
-        if i0 == 0:
-            if t_test[0] < start:
-                return None, None # no timestamps > start
-        if t_test[i0] > stop:
-            return None, None # timestamps only before start and after stop
-        # if we reached here then some or all timestamps are after start
-        # search for first after end, adjusting compare array so nan>stop
-        t_test = timestamps + isnan * (stop+1)
-        # start looking after i0 -- no point looking before, plus if we
-        #   do look before and NaNs are present, it screws up the search
-        i1 = np.argmin((t_test <= stop)[i0:])
-        # if i1 is 0, either all timestamps are <= stop, or all > stop
-        if i1 == 0:
-            if t_test[0] > stop:
-                return None, None # no timestamps < stop
-            i1 = len(timestamps) - 1
-        else:
-            i1 = i0 + i1 - 1 # i1 is the first value > stop. fix that
-        # make sure adjusted i1 value is non-nan
-        while isnan[i1]:
-            i1 = i1 - 1
-            assert i1 >= 0
-        try:    # error checking 
-            assert i0 <= i1
-            assert not np.isnan(timestamps[i0])
-            assert not np.isnan(timestamps[i1])
-            assert timestamps[i0] >= start and timestamps[i0] <= stop
-            assert timestamps[i1] >= start and timestamps[i1] <= stop
-            return i0, i1
-        except AssertionError:
-            print("-------------------" + self.name)
-            print("epoch: %f, %f" % (start, stop))
-            print("time: %f, %f" % (timestamps[0], timestamps[-1]))
-            print("idx 0: %d\tt:%f" % (i0, timestamps[i0]))
-            print("idx 1: %d\tt:%f" % (i1, timestamps[i1]))
-            assert False, "Internal error"
+    # records the overlap of a time series with the epoch. the 'links'
+    #   attribute must be sorted after calling this
+    def add_timeseries_overlap(self, in_epoch_name, timeseries_path, i0, i1):
+        epoch_ts = {}
+        epoch_ts["timeseries"] = timeseries_path
+        epoch_ts["start_idx"] = int(i0)
+        epoch_ts["count"] = int(i1 - i0 + 1)
+        self.timeseries_dict[in_epoch_name] = epoch_ts
+        label = "'" + in_epoch_name + "' is '" + timeseries_path + "'"
+        self.spec["_attributes"]["links"]["_value"].append(label)
 
     def finalize(self):
         """ Finish epoch entry and write data to the file
@@ -279,6 +604,20 @@ class Epoch(object):
         # put them in for writing
         self.spec["start_time"]["_value"] = self.start_time
         self.spec["stop_time"]["_value"] = self.stop_time
+        # report all tags to kernel so it can keep track of what was used
+        self.nwb.add_epoch_tags(self.spec["_attributes"]["tags"]["_value"])
+        #
+        from . import nwb as nwblib
+        nwblib.register_finalization(self.name, self.serial_num);
+        # flag ourself as done
+        self.finalized = True
+        # write content to file. this is done by the background writer
+        #   thread if the file has one
+        self.nwb.submit_write(self.write_to_file)
+
+    # internal function
+    # writes the finalized epoch to the file
+    def write_to_file(self):
         # write epoch entry
         fp = self.nwb.file_pointer
         epoch = fp["epochs"][self.name]
@@ -289,17 +628,11 @@ class Epoch(object):
                 self.nwb.fatal_error("HDF5 object %s exists in epoch %s" % (k, self.name))
             ets = epoch.create_group(k)
             src = self.timeseries_dict[k]["timeseries"]
-            ets["timeseries"] = fp[src]
-            ets.create_dataset("idx_start", data=ts["start_idx"], dtype='i4')
-            ets.create_dataset("count", data=ts["count"], dtype='i4')
-        # report all tags to kernel so it can keep track of what was used
-        self.nwb.add_epoch_tags(self.spec["_attributes"]["tags"]["_value"])
+            # hard link created by path, without opening the target
+            ets.id.links.create_hard(b"timeseries", fp.id, src.encode())
+            self.nwb.write_scalar(ets, "idx_start", ts["start_idx"], 'i4')
+            self.nwb.write_scalar(ets, "count", ts["count"], 'i4')
         # write content to file
         grp = self.nwb.file_pointer["epochs/" + self.name]
         self.nwb.write_datasets(grp, "", self.spec)
-        #
-        from . import nwb as nwblib
-        nwblib.register_finalization(self.name, self.serial_num);
-        # flag ourself as done
-        self.finalized = True
 
@@ -47,13 +47,15 @@ class Module(object):
     def __init__(self, name, nwb, spec):
         self.name = name
         self.nwb = nwb
-        self.spec = copy.deepcopy(spec)
+        from . import nwb as nwblib
+        self.spec = nwblib.copy_spec(spec)
         # a place to store interfaces belonging to this module
         self.ifaces = {}
         # create module folder immediately, so it's available 
         folder = self.nwb.file_pointer["processing"]
         if name in folder:
             nwb.fatal_error("Module '%s' already exists" % name)
+        nwb.journal_create(folder.name + "/" + self.name)
         self.mod_folder = folder.create_group(self.name)
         self.serial_num = -1
         # 
@@ -151,13 +153,11 @@ class Module(object):
         return iface
 
     # internal function
-    # read spec to create time series definition. do it recursively 
-    #   if time series are subclassed
+    # read spec to create interface definition. definitions are compiled
+    #   once and shared, so they must not be modified
     def create_interface_definition(self, if_type):
-        super_spec = copy.deepcopy(self.nwb.spec["Interface"]["SuperInterface"])
-        if_spec = self.nwb.spec["Interface"][if_type]
         from . import nwb as nwblib
-        return nwblib.recursive_dictionary_merge(super_spec, if_spec)
+        return nwblib.get_definition(self.nwb.spec, self.nwb.definitions, "Interface", if_type, self.nwb.fatal_error)
 
     def set_description(self, desc):
         """ Set description field in module
@@ -236,7 +236,8 @@ class Interface(object):
         self.module = module
         self.name = name
         self.nwb = module.nwb
-        self.spec = copy.deepcopy(spec)
+        from . import nwb as nwblib
+        self.spec = nwblib.copy_spec(spec)
         # timeseries that are added to interface directly
         self.defined_timeseries = {}
         # timeseries that exist elsewhere and are HDF5-linked
@@ -406,6 +407,8 @@ class Interface(object):
                         break
                 # look for linked items
                 if not match:
+                    # linked time series may still be waiting to be written
+                    self.nwb.sync_writer()
                     for name, path in self.linked_timeseries.items():
                         tgt = self.nwb.file_pointer[path]
                         ancestry = tgt.attrs["ancestry"]
@@ -418,11 +421,9 @@ class Interface(object):
                 if not match:
                     err_str += "Missing %s in interface %s\n" % (tstype, self.name)
         # check for mandatory fields
-        for k, v in self.spec.items():
-            if k.startswith("_"):
-                continue
-            if k == "[]" or k == "<>":
-                continue
+        from . import nwb as nwblib
+        for k in nwblib.spec_fields(self.spec):
+            v = nwblib.peek_spec(self.spec, k)
             if v["_datatype"] == "group":
                 continue
             if v["_include"] == "mandatory" and "_value" not in v:
@@ -437,6 +438,15 @@ class Interface(object):
             if "_attributes" not in self.spec:
                 self.spec["_attributes"] = {}
             self.spec["_attributes"]["help"] = helpdict
+        from . import nwb as nwblib
+        nwblib.register_finalization(self.module.name + "::" + self.name, self.serial_num)
+        # write content to file. this is done by the background writer
+        #   thread if the file has one
+        self.nwb.submit_write(self.write_to_file, self.spec)
+
+    # internal function
+    # writes the finalized interface to the file
+    def write_to_file(self):
         # write own data
         folder = "processing/" + self.module.name + "/" + self.name
         grp = self.nwb.file_pointer[folder]
@@ -453,8 +463,6 @@ class Interface(object):
                 links = grp.attrs["timeseries_links"] + links
                 del grp.attrs["timeseries_links"]
             grp.attrs["timeseries_links"] = links
-        from . import nwb as nwblib
-        nwblib.register_finalization(self.module.name + "::" + self.name, self.serial_num)
 
 ########################################################################
 
@@ -616,6 +624,7 @@ class ImageSegmentation(Interface):
 
     def add_reference_image_as_link(self, plane, name, path):
         # make sure path is valid
+        self.nwb.sync_writer()
         if path not in self.nwb.file_pointer:
             self.nwb.fatal_error("Path '%s' not found in file" % path)
         # make sure target is actually a time series
@@ -0,0 +1,1061 @@
+"""
+Copyright (c) 2015 Allen Institute, California Institute of Technology,
+New York University School of Medicine, the Howard Hughes Medical
+Institute, University of California, Berkeley, GE, the Kavli Foundation
+and the International Neuroinformatics Coordinating Facility.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following
+conditions are met:
+
+1.  Redistributions of source code must retain the above copyright
+    notice, this list of conditions and the following disclaimer.
+
+2.  Redistributions in binary form must reproduce the above copyright
+    notice, this list of conditions and the following disclaimer in
+    the documentation and/or other materials provided with the distribution.
+
+3.  Neither the name of the copyright holder nor the names of its
+    contributors may be used to endorse or promote products derived
+    from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+import os
+import sys
+import traceback
+import h5py
+import numpy as np
+from . import nwb as nwblib
+from . import nwbep
+
+# read-only access to existing NWB files. objects are created only when
+#   they're requested, and nothing is read from the file until it's
+#   needed -- opening a file reads only the HDF5 superblock and root
+#   group, and data is read by slicing the arrays returned by the
+#   objects (see LazyArray)
+
+# when reading several parts of a dataset, parts are merged into one
+#   read if the gap between them is smaller than this, or than one
+#   chunk. merged reads are limited to about READ_BYTES
+COALESCE_GAP_BYTES = 1024 * 1024
+READ_BYTES = 64 * 1024 * 1024
+
+# location of time series in the file for each modality (see
+#   NWB.create_timeseries()). time series in processing modules are
+#   stored in interfaces
+MODALITY_PATHS = {
+    "acquisition": "/acquisition/timeseries",
+    "stimulus": "/stimulus/presentation",
+    "template": "/stimulus/templates"
+}
+
+def is_text(dtype):
+    if dtype.kind == "S":
+        return True
+    return h5py.check_dtype(vlen=dtype) in (str, bytes)
+
+class LazyArray(object):
+    """ Array stored in an NWB file. Elements are read from the file
+        when the array is sliced (eg, data[100:200]). Text is returned
+        as str
+
+        If the file was opened with 'mmap' set (see NWBReader) and the
+        dataset is stored contiguously and uncompressed, slices are
+        views of a read-only memory map of the file, rather than copies
+
+        Instances are returned by reader objects (eg,
+        TimeSeriesReader.data). They should not be created directly
+    """
+    def __init__(self, dataset, use_mmap=False):
+        #**Constructor arguments:**
+        #    **dataset** h5py dataset
+        #    **use_mmap** (boolean) Read through a memory map, if possible
+        self.dataset = dataset
+        self.text = is_text(dataset.dtype)
+        self.use_mmap = use_mmap
+        self.mapped = None
+
+    @property
+    def shape(self):
+        return self.dataset.shape
+
+    @property
+    def dtype(self):
+        return self.dataset.dtype
+
+    @property
+    def ndim(self):
+        return len(self.dataset.shape)
+
+    def __len__(self):
+        return self.dataset.shape[0]
+
+    def __getitem__(self, key):
+        if self.use_mmap:
+            mapped = self.memmap()
+            if mapped is not None:
+                return mapped[key]
+        if self.text:
+            # decoded by h5py as it's read
+            return self.dataset.asstr()[key]
+        return self.dataset[key]
+
+    def __array__(self, dtype=None):
+        val = self.read()
+        if dtype is not None:
+            return np.asarray(val, dtype=dtype)
+        return np.asarray(val)
+
+    def read(self):
+        """ Reads the full array from the file
+
+            Arguments:
+                *none*
+
+            Returns:
+                numpy array (or scalar, for scalar datasets)
+        """
+        return self[()]
+
+    def attrs(self):
+        """ Returns the HDF5 attributes of the array
+
+            Arguments:
+                *none*
+
+            Returns:
+                Dictionary of attribute values, with text as str
+        """
+        return read_attributes(self.dataset)
+
+    def memmap(self):
+        """ Returns a read-only memory map of the array. This is only
+            possible for numeric arrays that are stored contiguously,
+            without compression (eg, in files written with
+            auto_compress=False or 'contiguous_bytes')
+
+            Arguments:
+                *none*
+
+            Returns:
+                np.memmap, or None if the array can't be mapped
+        """
+        if self.mapped is None:
+            self.mapped = memmap_dataset(self.dataset)
+            if self.mapped is None:
+                self.use_mmap = False
+                return None
+        return self.mapped
+
+# returns a read-only np.memmap of a dataset, or None if the dataset is
+#   chunked, compressed, stored in another file, or not yet allocated
+def memmap_dataset(dataset):
+    if dataset.chunks is not None or dataset.dtype.kind not in "biufc":
+        return None
+    if getattr(dataset, "external", None):
+        return None
+    if dataset.file.driver not in ("sec2", "stdio"):
+        return None
+    if len(dataset.shape) == 0 or dataset.size == 0:
+        return None
+    offset = dataset.id.get_offset()
+    if offset is None:
+        return None
+    return np.memmap(dataset.file.filename, dtype=dataset.dtype, mode='r', offset=offset, shape=dataset.shape)
+
+class RateTimestamps(object):
+    """ Timestamps of a time series that's stored with a starting time
+        and sampling rate. Timestamps are calculated when the array is
+        sliced, in the same way as nwbep.find_rate_overlap(), so they
+        match the overlaps stored for epochs
+    """
+    def __init__(self, t0, rate, num_samples):
+        #**Constructor arguments:**
+        #    **t0** (float) Time of first sample
+        #    **rate** (float) Sampling rate, in Hz
+        #    **num_samples** (int) Number of samples
+        self.t0 = float(t0)
+        self.rate = float(rate)
+        self.num_samples = int(num_samples)
+        self.shape = (self.num_samples,)
+        self.dtype = np.dtype(np.float64)
+        self.ndim = 1
+
+    def __len__(self):
+        return self.num_samples
+
+    def __getitem__(self, key):
+        n = self.num_samples
+        if isinstance(key, slice):
+            idx = np.arange(*key.indices(n))
+        elif isinstance(key, tuple) and key == ():
+            idx = np.arange(n)
+        elif np.isscalar(key):
+            i = int(key)
+            if i < 0:
+                i += n
+            if i < 0 or i >= n:
+                raise IndexError("Index %d is out of range" % int(key))
+            return nwbep.rate_sample_time(self.t0, self.rate, i)
+        else:
+            idx = np.asarray(key)
+            if idx.dtype == bool:
+                idx = np.flatnonzero(idx)
+            idx = np.where(idx < 0, idx + n, idx)
+            if np.any((idx < 0) | (idx >= n)):
+                raise IndexError("Index is out of range")
+        return self.t0 + idx / self.rate
+
+    def __array__(self, dtype=None):
+        return np.asarray(self.read(), dtype=dtype)
+
+    def read(self):
+        return self[()]
+
+    def attrs(self):
+        return {"rate": self.rate}
+
+# groups sample ranges, given as (first, last) pairs, into reads of
+#   contiguous rows. ranges are sorted by position in the file, so reads
+#   proceed through the dataset's chunks in order. returns a list of
+#   (first, last, members), where members are the indices of the ranges
+#   that the read covers
+def coalesce_ranges(ranges, row_bytes, chunk_rows):
+    order = sorted(range(len(ranges)), key=lambda k: ranges[k])
+    max_gap = max(chunk_rows, COALESCE_GAP_BYTES // max(row_bytes, 1))
+    max_rows = max(READ_BYTES // max(row_bytes, 1), 1)
+    reads = []
+    for k in order:
+        a, b = ranges[k]
+        if len(reads) > 0:
+            first, last, members = reads[-1]
+            if a <= last + 1 + max_gap and max(b, last) - first < max_rows:
+                reads[-1] = (first, max(b, last), members)
+                members.append(k)
+                continue
+        reads.append((a, b, [k]))
+    return reads
+
+# reads several ranges of rows from an array (dataset or LazyArray)
+#   with coalesced reads. returns one array per range
+def read_ranges(array, ranges):
+    out = [None] * len(ranges)
+    if len(ranges) == 0:
+        return out
+    shape = array.shape
+    row_bytes = array.dtype.itemsize * int(np.prod(shape[1:]))
+    chunks = getattr(array, "chunks", None)
+    if chunks is None and isinstance(array, LazyArray):
+        chunks = array.dataset.chunks
+    chunk_rows = 1 if chunks is None else chunks[0]
+    for first, last, members in coalesce_ranges(ranges, row_bytes, chunk_rows):
+        buf = array[first:last+1]
+        for k in members:
+            a, b = ranges[k]
+            out[k] = buf[a-first:b-first+1]
+    return out
+
+def read_attributes(obj):
+    attrs = {}
+    for k, v in obj.attrs.items():
+        attrs[k] = nwblib.decode_value(v)
+    return attrs
+
+# base class for objects in the file. holds the path and provides access
+#   to fields and attributes
+class ObjectReader(object):
+    def __init__(self, reader, path):
+        self.reader = reader
+        self.path = path
+        self.name = path.split('/')[-1]
+        self.group_ref = None
+
+    def __repr__(self):
+        return "%s('%s')" % (type(self).__name__, self.path)
+
+    # internal function to get the h5py group of the object
+    def group(self):
+        if self.group_ref is None:
+            fp = self.reader.file_pointer
+            if self.path not in fp:
+                self.reader.fatal_error("'%s' not found in file" % self.path)
+            self.group_ref = fp[self.path]
+        return self.group_ref
+
+    def fields(self):
+        """ Returns the names of the datasets and groups stored in
+            the object. Fields that are defined in the specification
+            are listed first, in specification order
+
+            Arguments:
+                *none*
+
+            Returns:
+                List of field names
+        """
+        present = list(self.group().keys())
+        spec = self.spec
+        if spec is None:
+            return present
+        names = [k for k in nwblib.spec_fields(spec) if k in present]
+        defined = set(names)
+        names.extend([k for k in present if k not in defined])
+        return names
+
+    def has_value(self, key):
+        """ Returns True if the object has the specified field
+
+            Arguments:
+                *key* (text) Name of field (this can be a path
+                relative to the object, eg 'unit_1/times')
+
+            Returns:
+                Boolean
+        """
+        return key in self.group()
+
+    def get_value(self, key):
+        """ Reads the value of a field
+
+            Arguments:
+                *key* (text) Name of field (this can be a path
+                relative to the object, eg 'unit_1/times')
+
+            Returns:
+                Value of the field, with text as str
+        """
+        return self.get_array(key).read()
+
+    def get_array(self, key):
+        """ Returns a field as an array that's read when it's sliced.
+            Use this instead of get_value() to read part of a large
+            field
+
+            Arguments:
+                *key* (text) Name of field
+
+            Returns:
+                LazyArray
+        """
+        grp = self.group()
+        if key not in grp or not isinstance(grp[key], h5py.Dataset):
+            self.reader.fatal_error("'%s' has no dataset '%s'" % (self.path, key))
+        return LazyArray(grp[key], self.reader.use_mmap)
+
+    def get_attribute(self, name, default=None):
+        """ Reads an HDF5 attribute of the object
+
+            Arguments:
+                *name* (text) Name of attribute
+
+                *default* (any -- optional) Value returned if the
+                attribute isn't present
+
+            Returns:
+                Attribute value, with text as str
+        """
+        attrs = self.group().attrs
+        if name not in attrs:
+            return default
+        return nwblib.decode_value(attrs[name])
+
+    def attributes(self):
+        """ Returns all HDF5 attributes of the object
+
+            Arguments:
+                *none*
+
+            Returns:
+                Dictionary of attribute values, with text as str
+        """
+        return read_attributes(self.group())
+
+    @property
+    def spec(self):
+        return None
+
+class TimeSeriesReader(ObjectReader):
+    """ TimeSeries in an existing file
+
+        *data* and *timestamps* are arrays that are read from the file
+        when they're sliced. For series stored with a sampling rate,
+        timestamps are calculated
+
+        Instances are returned by NWBReader, InterfaceReader and
+        EpochReader. They should not be created directly
+    """
+    @property
+    def ancestry(self):
+        ancestry = self.get_attribute("ancestry")
+        if ancestry is None:
+            return ["TimeSeries"]
+        return list(np.atleast_1d(ancestry))
+
+    @property
+    def ts_type(self):
+        return self.ancestry[-1]
+
+    @property
+    def spec(self):
+        return self.reader.get_definition("TimeSeries", self.ts_type)
+
+    @property
+    def description(self):
+        return self.get_attribute("description", "")
+
+    @property
+    def source(self):
+        return self.get_attribute("source", "")
+
+    @property
+    def data(self):
+        return self.get_array("data")
+
+    @property
+    def num_samples(self):
+        grp = self.group()
+        if "num_samples" in grp:
+            return int(grp["num_samples"][()])
+        return len(self.data)
+
+    @property
+    def timestamps(self):
+        grp = self.group()
+        if "timestamps" in grp:
+            return LazyArray(grp["timestamps"], self.reader.use_mmap)
+        if "starting_time" in grp:
+            st = grp["starting_time"]
+            return RateTimestamps(st[()], st.attrs["rate"], self.num_samples)
+        return None
+
+    def window_indices(self, t0, t1):
+        """ Finds the samples that are within a time window, with the
+            same rules used for epochs (see Epoch.add_timeseries()).
+            Timestamps are searched by bisection, reading only the
+            blocks needed, or the samples are calculated for series
+            stored with a sampling rate
+
+            Arguments:
+                *t0* (float) Start of window, in seconds
+
+                *t1* (float) End of window, in seconds
+
+            Returns:
+                *idx_0*, *idx_1* (ints) Index of first and last samples
+                in the window, or None, None if there are none
+        """
+        grp = self.group()
+        if "timestamps" in grp:
+            return nwbep.find_overlap(grp["timestamps"], t0, t1)
+        if "starting_time" in grp:
+            st = grp["starting_time"]
+            n = self.num_samples
+            if "data" in grp:
+                n = min(n, len(grp["data"]))
+            return nwbep.find_rate_overlap(st[()], st.attrs["rate"], n, t0, t1)
+        self.reader.fatal_error("Time series '%s' has no timestamps or starting time" % self.path)
+
+    def window(self, t0, t1):
+        """ Reads the data and timestamps of the samples that are
+            within a time window (see window_indices()). Only the part
+            of the data in the window is read from the file
+
+            Arguments:
+                *t0* (float) Start of window, in seconds
+
+                *t1* (float) End of window, in seconds
+
+            Returns:
+                *data*, *timestamps* (arrays) The samples in the window.
+                Both are empty if no samples are in the window. *data*
+                is None if the series has no data (see
+                TimeSeries.ignore_data())
+        """
+        i0, i1 = self.window_indices(t0, t1)
+        data = None
+        if i0 is None:
+            if "data" in self.group():
+                # same type as a non-empty window
+                arr = self.data
+                dtype = object if arr.text else arr.dtype
+                data = np.zeros((0,) + tuple(arr.shape[1:]), dtype=dtype)
+            return data, np.zeros(0)
+        if "data" in self.group():
+            data = self.data[i0:i1+1]
+        return data, self.timestamps[i0:i1+1]
+
+    def read_samples(self, ranges):
+        """ Reads several ranges of samples. Ranges that are close to
+            each other in the file are read together, and reads are made
+            in file order, so reading many small ranges (eg, the trials
+            of an experiment) doesn't require a separate read for each
+
+            Arguments:
+                *ranges* (list) (idx_start, count) pairs giving the
+                first sample of each range and its number of samples
+
+            Returns:
+                List of (*data*, *timestamps*) pairs, one per range
+        """
+        spans = []
+        for i0, count in ranges:
+            if count <= 0:
+                self.reader.fatal_error("Sample range of '%s' has no samples" % self.path)
+            spans.append((int(i0), int(i0) + int(count) - 1))
+        data = read_ranges(self.data, spans)
+        times = self.timestamps
+        if isinstance(times, LazyArray):
+            times = read_ranges(times, spans)
+        else:
+            times = [times[a:b+1] for a, b in spans]
+        return list(zip(data, times))
+
+class InterfaceReader(ObjectReader):
+    """ Interface in a processing module of an existing file
+
+        Instances are returned by ModuleReader. They should not be
+        created directly
+    """
+    @property
+    def if_type(self):
+        return self.name
+
+    @property
+    def module(self):
+        return ModuleReader(self.reader, self.path.rsplit('/', 1)[0])
+
+    @property
+    def spec(self):
+        return self.reader.get_definition("Interface", self.if_type)
+
+    @property
+    def source(self):
+        return self.get_attribute("source", "")
+
+    def timeseries_names(self):
+        """ Returns the names of the time series stored in the interface
+
+            Arguments:
+                *none*
+
+            Returns:
+                List of names
+        """
+        grp = self.group()
+        names = []
+        for k in grp:
+            if grp.get(k, getclass=True) is not h5py.Group:
+                continue
+            if nwb_type(grp[k]) == "TimeSeries":
+                names.append(k)
+        return names
+
+    def get_timeseries(self, name):
+        """ Returns a time series stored in the interface
+
+            Arguments:
+                *name* (text) Name of the time series
+
+            Returns:
+                TimeSeriesReader
+        """
+        return TimeSeriesReader(self.reader, self.path + "/" + name)
+
+    def timeseries(self):
+        return [self.get_timeseries(name) for name in self.timeseries_names()]
+
+class ModuleReader(ObjectReader):
+    """ Processing module of an existing file
+
+        Instances are returned by NWBReader. They should not be
+        created directly
+    """
+    @property
+    def spec(self):
+        return self.reader.get_spec()["Module"]
+
+    @property
+    def description(self):
+        if "description" in self.group():
+            return self.get_value("description")
+        return ""
+
+    def interface_names(self):
+        """ Returns the names (types) of the interfaces in the module
+
+            Arguments:
+                *none*
+
+            Returns:
+                List of names
+        """
+        grp = self.group()
+        return [k for k in grp if nwb_type(grp[k]) == "Interface"]
+
+    def get_interface(self, if_type):
+        """ Returns an interface of the module
+
+            Arguments:
+                *if_type* (text) Type (name) of the interface, eg 'LFP'
+
+            Returns:
+                InterfaceReader
+        """
+        return InterfaceReader(self.reader, self.path + "/" + if_type)
+
+    def interfaces(self):
+        return [self.get_interface(name) for name in self.interface_names()]
+
+class EpochReader(ObjectReader):
+    """ Epoch of an existing file. Time series are found through the
+        name they're given in the epoch
+
+        Instances are returned by NWBReader. They should not be
+        created directly
+    """
+    @property
+    def spec(self):
+        return self.reader.get_spec()["Epoch"]
+
+    @property
+    def start_time(self):
+        return float(self.get_value("start_time"))
+
+    @property
+    def stop_time(self):
+        return float(self.get_value("stop_time"))
+
+    @property
+    def description(self):
+        if "description" in self.group():
+            return self.get_value("description")
+        return ""
+
+    @property
+    def tags(self):
+        tags = self.get_attribute("tags")
+        if tags is None:
+            return []
+        return list(np.atleast_1d(tags))
+
+    # internal function to get the path of each time series in the
+    #   epoch, from the 'links' attribute. the link in the epoch is a
+    #   hard link, so its own path isn't the path of the time series
+    def linked_paths(self):
+        paths = {}
+        links = self.get_attribute("links")
+        if links is None:
+            return paths
+        for label in np.atleast_1d(links):
+            # format is "'<name>' is '<path>'"
+            parts = label.split("'")
+            if len(parts) == 5:
+                paths[parts[1]] = parts[3]
+        return paths
+
+    def timeseries_names(self):
+        """ Returns the names of the time series in the epoch
+
+            Arguments:
+                *none*
+
+            Returns:
+                List of names, as used in the epoch
+        """
+        grp = self.group()
+        return [k for k in grp if isinstance(grp[k], h5py.Group) and "idx_start" in grp[k]]
+
+    def get_timeseries(self, in_epoch_name):
+        """ Returns a time series that overlaps the epoch
+
+            Arguments:
+                *in_epoch_name* (text) Name of the time series in
+                the epoch
+
+            Returns:
+                TimeSeriesReader
+        """
+        path = self.linked_paths().get(in_epoch_name)
+        if path is None:
+            path = self.path + "/" + in_epoch_name + "/timeseries"
+        return TimeSeriesReader(self.reader, path)
+
+    def get_overlap(self, in_epoch_name):
+        """ Returns the samples of a time series that are in the epoch
+
+            Arguments:
+                *in_epoch_name* (text) Name of the time series in
+                the epoch
+
+            Returns:
+                *idx_start*, *count* (ints) Index of first sample in
+                the epoch, and number of samples
+        """
+        grp = self.group()
+        if in_epoch_name not in grp:
+            self.reader.fatal_error("Epoch '%s' has no time series '%s'" % (self.name, in_epoch_name))
+        ets = grp[in_epoch_name]
+        return int(ets["idx_start"][()]), int(ets["count"][()])
+
+# returns the 'neurodata_type' attribute of a group, or None
+def nwb_type(obj):
+    val = obj.attrs.get("neurodata_type")
+    if val is None:
+        return None
+    return nwblib.decode_value(val)
+
+class NWBReader(object):
+    """ Read-only access to an existing NWB file
+
+        Objects in the file (time series, modules, interfaces and
+        epochs) are returned as reader objects, which read from the
+        file only when their values are requested. Arrays are read
+        when they're sliced, so only the data that's used is read
+        from disk. Opening a file only reads its HDF5 metadata
+
+        The format specification is used for the type (ancestry) and
+        fields of each object. It's loaded the first time it's needed
+
+        Example:
+            f = nwb.NWBReader("experiment.nwb")
+            ts = f.get_timeseries("/acquisition/timeseries/lfp")
+            first_second = ts.data[:30000]
+            f.close()
+
+        Arguments:
+            *filename* (text) Name of the NWB file
+
+            *custom_spec* (text -- optional) A custom specification
+            file, as passed to NWB(). This is only needed for files
+            that use types defined in it
+
+            *mmap* (boolean -- optional) Arrays that are stored
+            contiguously and uncompressed are read through a memory
+            map, so slices don't copy data and pages are shared with
+            other processes reading the file. Other arrays are read
+            normally
+
+        A warning is printed if the file has a journal left by an
+        in-place modification that didn't complete (see NWB()), as
+        its incomplete changes can't be undone when reading
+
+        NWBReader can be used as a context manager, in which case the
+        file is closed on leaving the 'with' block
+    """
+    def __init__(self, filename, custom_spec=[], mmap=False):
+        self.file_name = filename
+        self.custom_spec = custom_spec
+        self.use_mmap = mmap
+        try:
+            self.file_pointer = h5py.File(filename, 'r')
+        except IOError:
+            self.fatal_error("Unable to open file '%s'" % filename)
+        # a file can't be rolled back when it's opened read-only
+        if os.path.isfile(filename + ".journal"):
+            print("Warning -- '%s' was not closed after last modification" % filename)
+            print("It may contain incomplete changes, which are rolled back when it's opened with NWB(modify=True)")
+        self.spec = None
+        self.definitions = None
+        # contents of /object_index, when it's first read
+        self.object_index = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def fatal_error(self, msg):
+        print("Error: " + msg)
+        print("File: " + self.file_name)
+        print("Stack trace follows")
+        print("-------------------")
+        traceback.print_stack()
+        sys.exit(1)
+
+    def close(self):
+        """ Closes the file. Arrays returned by reader objects can't
+            be read after this
+
+            Arguments:
+                *none*
+
+            Returns:
+                *nothing*
+        """
+        if self.file_pointer is not None:
+            self.file_pointer.close()
+            self.file_pointer = None
+
+    # internal function to load the specification on first use
+    def get_spec(self):
+        if self.spec is None:
+            self.spec, self.definitions = nwblib.load_spec_and_definitions(self.custom_spec)
+        return self.spec
+
+    # internal function to get the compiled definition of a time series
+    #   or interface, as used by NWB when creating them. returns None
+    #   if the type isn't in the specification
+    def get_definition(self, kind, def_type):
+        spec = self.get_spec()
+        if def_type not in spec[kind]:
+            return None
+        return nwblib.get_definition(spec, self.definitions, kind, def_type, self.fatal_error)
+
+    # internal function to read a scalar dataset at the root of the file
+    def root_value(self, name):
+        if name not in self.file_pointer:
+            return None
+        return nwblib.decode_value(self.file_pointer[name][()])
+
+    @property
+    def identifier(self):
+        return self.root_value("identifier")
+
+    @property
+    def session_description(self):
+        return self.root_value("session_description")
+
+    @property
+    def session_start_time(self):
+        return self.root_value("session_start_time")
+
+    @property
+    def nwb_version(self):
+        return self.root_value("nwb_version")
+
+    def get_metadata(self, key):
+        """ Reads a metadata field (ie, a dataset under /general)
+
+            Arguments:
+                *key* (text) Path of the field, relative to /general
+                (eg, the constants in nwbco)
+
+            Returns:
+                Value of the field, with text as str, or None if
+                it isn't in the file
+        """
+        path = "/general/" + key
+        if path not in self.file_pointer:
+            return None
+        return nwblib.decode_value(self.file_pointer[path][()])
+
+    def timeseries_paths(self, modality=None):
+        """ Returns the paths of the time series in the file
+
+            Arguments:
+                *modality* (text -- optional) One of 'acquisition',
+                'stimulus', 'template' or 'processing'. By default,
+                time series of all modalities are listed
+
+            Returns:
+                List of paths
+        """
+        if modality is None:
+            modalities = ["acquisition", "stimulus", "template", "processing"]
+        elif modality in MODALITY_PATHS or modality == "processing":
+            modalities = [modality]
+        else:
+            self.fatal_error("Modality must be acquisition, stimulus, template or processing")
+        fp = self.file_pointer
+        paths = []
+        index = self.get_object_index()
+        if index is not None:
+            # index is sorted by path
+            series = [r["path"] for r in index if r["neurodata_type"] == "TimeSeries"]
+            for mod in modalities:
+                base = MODALITY_PATHS.get(mod, "/processing")
+                paths.extend([p for p in series if p.startswith(base + "/")])
+            return paths
+        for mod in modalities:
+            if mod == "processing":
+                for module in self.modules():
+                    for iface in module.interfaces():
+                        for name in iface.timeseries_names():
+                            paths.append(iface.path + "/" + name)
+                continue
+            base = MODALITY_PATHS[mod]
+            if base not in fp:
+                continue
+            grp = fp[base]
+            for name in grp:
+                paths.append(base + "/" + name)
+        return paths
+
+    def get_object_index(self):
+        """ Returns the index of objects in the file, which is written
+            by the API when a file is closed. This lists the file's
+            time series, modules, interfaces and epochs, and is read
+            from the file in a single read
+
+            Arguments:
+                *none*
+
+            Returns:
+                List of dictionaries, one per object, sorted by path,
+                with keys 'path', 'neurodata_type', 'ancestry' (list
+                of types for time series, or the interface type),
+                'num_samples', 'start_time', 'stop_time', 'dtype' and
+                'shape' (tuple). Values that don't apply to an object
+                are -1, NaN or empty. Returns None if the file doesn't
+                have an index (eg, files written by earlier versions)
+        """
+        if self.object_index is None:
+            if "object_index" not in self.file_pointer:
+                return None
+            index = []
+            for row in self.file_pointer["object_index"][()]:
+                entry = {}
+                for k in row.dtype.names:
+                    entry[k] = nwblib.decode_value(row[k])
+                if entry["neurodata_type"] == "TimeSeries":
+                    entry["ancestry"] = entry["ancestry"].split(",")
+                if len(entry["shape"]) > 0:
+                    entry["shape"] = tuple(int(n) for n in entry["shape"].split(","))
+                else:
+                    entry["shape"] = ()
+                entry["num_samples"] = int(entry["num_samples"])
+                entry["start_time"] = float(entry["start_time"])
+                entry["stop_time"] = float(entry["stop_time"])
+                index.append(entry)
+            self.object_index = index
+        return self.object_index
+
+    def get_timeseries(self, path):
+        """ Returns a time series in the file
+
+            Arguments:
+                *path* (text) Full HDF5 path to the time series
+
+            Returns:
+                TimeSeriesReader
+        """
+        if not path.startswith('/'):
+            path = '/' + path
+        return TimeSeriesReader(self, path)
+
+    def timeseries(self, modality=None):
+        return [self.get_timeseries(p) for p in self.timeseries_paths(modality)]
+
+    def module_names(self):
+        """ Returns the names of the processing modules in the file
+
+            Arguments:
+                *none*
+
+            Returns:
+                List of names
+        """
+        if "processing" not in self.file_pointer:
+            return []
+        return list(self.file_pointer["processing"].keys())
+
+    def get_module(self, name):
+        """ Returns a processing module
+
+            Arguments:
+                *name* (text) Name of the module
+
+            Returns:
+                ModuleReader
+        """
+        return ModuleReader(self, "/processing/" + name)
+
+    def modules(self):
+        return [self.get_module(name) for name in self.module_names()]
+
+    def epoch_names(self, tag=None):
+        """ Returns the names of the epochs in the file
+
+            Arguments:
+                *tag* (text -- optional) Only list epochs that have
+                this tag
+
+            Returns:
+                List of names
+        """
+        if "epochs" not in self.file_pointer:
+            return []
+        names = list(self.file_pointer["epochs"].keys())
+        if tag is not None:
+            names = [k for k in names if tag in self.get_epoch(k).tags]
+        return names
+
+    def get_epoch(self, name):
+        """ Returns an epoch
+
+            Arguments:
+                *name* (text) Name of the epoch
+
+            Returns:
+                EpochReader
+        """
+        return EpochReader(self, "/epochs/" + name)
+
+    def epochs(self, tag=None):
+        return [self.get_epoch(name) for name in self.epoch_names(tag)]
+
+    def get_epoch_data(self, epochs, timeseries):
+        """ Reads the samples of a time series that are in each of
+            several epochs, using the overlaps stored in the epochs.
+            Samples are read with as few reads as possible (see
+            TimeSeriesReader.read_samples())
+
+            Arguments:
+                *epochs* (list) Epoch names or EpochReader objects
+                (eg, from epochs(tag))
+
+                *timeseries* (text or TimeSeriesReader) The name
+                the time series has in the epochs, its path, or the
+                time series itself
+
+            Returns:
+                List of (*data*, *timestamps*) pairs, one per epoch,
+                or None for epochs that don't include the time series
+        """
+        if isinstance(timeseries, TimeSeriesReader):
+            timeseries = timeseries.path
+        by_path = True
+        if '/' not in timeseries:
+            by_path = False
+        elif not timeseries.startswith('/'):
+            timeseries = '/' + timeseries
+        # find the overlap in each epoch, grouped by time series
+        ranges = {}
+        for k in range(len(epochs)):
+            epoch = epochs[k]
+            if not isinstance(epoch, EpochReader):
+                epoch = self.get_epoch(epoch)
+            links = epoch.linked_paths()
+            if by_path:
+                names = [n for n in links if links[n] == timeseries]
+                if len(names) == 0:
+                    continue
+                name = names[0]
+                path = timeseries
+            else:
+                name = timeseries
+                if name not in epoch.group():
+                    continue
+                path = epoch.get_timeseries(name).path
+            i0, count = epoch.get_overlap(name)
+            ranges.setdefault(path, []).append((k, (i0, count)))
+        results = [None] * len(epochs)
+        for path, lst in ranges.items():
+            samples = self.get_timeseries(path).read_samples([r for k, r in lst])
+            for j in range(len(lst)):
+                results[lst[j][0]] = samples[j]
+        return results
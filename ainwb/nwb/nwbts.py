@@ -33,9 +33,7 @@ LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
 ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
 POSSIBILITY OF SUCH DAMAGE.
 """
-import sys
-import traceback
-import copy
+import numpy as np
 from . import nwbmo
 
 class TimeSeries(object):
@@ -47,7 +45,8 @@ class TimeSeries(object):
     def __init__(self, name, modality, spec, nwb):
         self.name = name
         # make a local copy of the specification, one that can be modified
-        self.spec = copy.deepcopy(spec)
+        from . import nwb as nwblib
+        self.spec = nwblib.copy_spec(spec)
         # file handling
         self.nwb = nwb
         self.finalized = False
@@ -71,20 +70,39 @@ class TimeSeries(object):
         self.data_tgt_path = None
         self.data_tgt_path_soft = None
         self.serial_num = -1
+        # datasets that are written incrementally (eg, through
+        #   append_data()), indexed by field name
+        self.streams = {}
+        # fields to be written through to disk once the path is known
+        self.pending_flush = []
 
     # internal function
+    # errors are reported by the file, which undoes the changes to a
+    #   file that's modified in place (see NWB.fatal_error())
     def fatal_error(self, msg):
-        print("Error: " + msg)
-        print("TimeSeries: " + self.name)
-        print("Stack trace follows")
-        print("-------------------")
-        traceback.print_stack()
-        sys.exit(1)
+        self.nwb.fatal_error(msg + "\nTimeSeries: " + self.name)
 
     # internal function for changing the name of a time series
     # don't publish this as a user shouldn't be doing it
     def reset_name(self, name):
+        old_path = self.full_path()
         self.name = name
+        self.move_streams(old_path)
+
+    # internal function
+    # if data has already been streamed to disk, the group holding it
+    #   must follow the time series when its path or name changes
+    def move_streams(self, old_path):
+        if len(self.streams) == 0 or old_path == self.full_path():
+            return
+        fp = self.nwb.file_pointer
+        if self.full_path() in fp:
+            self.fatal_error("Group '%s' already exists" % self.full_path())
+        parent = self.full_path().rsplit('/', 1)[0]
+        if len(parent) > 0:
+            self.nwb.require_group_internal(parent)
+        self.nwb.journal_create("/" + self.full_path().lstrip("/"))
+        fp.move(old_path, self.full_path())
 
     ####################################################################
     # set field values
@@ -205,17 +223,21 @@ class TimeSeries(object):
             self.fatal_error("Added value after finalization")
         self.spec["_attributes"]["source"]["_value"] = str(value)
 
-    def set_time(self, timearray):
+    def set_time(self, timearray, flush=None):
         ''' Store timestamps for the time series. 
    
            Arguments:
                *timearray* (double array) Timestamps for each element in *data*
+
+               *flush* (boolean) Write timestamps to disk immediately rather than on finalize(). Defaults to the file's 'write_through' setting
    
            Returns:
                *nothing*
         '''
         # t_interval should have default value set to 1 in spec file
         self.set_value("timestamps", timearray)
+        if flush or (flush is None and self.nwb.write_through):
+            self.flush_value("timestamps")
 
     def set_time_by_rate(self, time_zero, rate):
         '''Store time by start time and sampling rate only
@@ -250,18 +272,28 @@ class TimeSeries(object):
         self.spec["num_samples"]["_include"] = "standard"
 
     # if default value used, value taken from specification file
-    def set_data(self, data, unit=None, conversion=None, resolution=None, dtype=None):
+    def set_data(self, data, unit=None, conversion=None, resolution=None, dtype=None, flush=None, chunks=None, compression=None, compression_opts=None, shuffle=None):
         '''Defines the data stored in the TimeSeries. Type of data 
            depends on which class of TimeSeries is being used
 
            Arguments:
-               *data* (user-defined) Array of data samples stored in time series
+               *data* (user-defined) Array of data samples stored in time series. This can be a np.memmap, an h5py.Dataset (in this or another file) or another array-like object providing shape, dtype and slicing, in which case it's copied to the file in pieces without being loaded into memory
 
                *unit* (text) Base SI unit for data[] (eg, Amps, Volts)
 
                *conversion* (float) Multiplier necessary to convert elements in data[] to specified unit
 
                *resolution* (float) Minimum meaningful distance between elements in data[] (e.g., the +/- range, quantal step size between values, etc). If unknown, store NaN
+
+               *flush* (boolean) Write data to disk immediately rather than on finalize(), releasing the reference to the array. Defaults to the file's 'write_through' setting
+
+               *chunks* (tuple or boolean) HDF5 chunk shape for data[]. True lets h5py choose one
+
+               *compression* (text) Compression filter for data[] ('gzip', 'lzf' or 'none'). Defaults to the file's compression policy
+
+               *compression_opts* (int) Compression level, for gzip (0-9)
+
+               *shuffle* (boolean) Enable the HDF5 byte-shuffle filter, which often improves compression of integer data
    
            Returns:
                *nothing*
@@ -274,6 +306,169 @@ class TimeSeries(object):
         if resolution is not None:
             attrs["resolution"] = float(resolution)
         self.set_value_with_attributes_internal("data", data, dtype, **attrs)
+        self.set_storage_internal("data", chunks, compression, compression_opts, shuffle)
+        if flush or (flush is None and self.nwb.write_through):
+            self.flush_value("data")
+
+    # internal function
+    # writes a field's value to disk as soon as the time series path is
+    #   known and drops the reference to it, so the array can be freed
+    #   before the file is closed. if the path isn't known yet, the
+    #   write is deferred until set_path() is called
+    def flush_value(self, key):
+        if len(self.path) == 0:
+            if key not in self.pending_flush:
+                self.pending_flush.append(key)
+            return
+        field = self.spec[key]
+        if "_value" not in field:
+            return
+        self.apply_chunk_policy_to_value(key)
+        grp = self.nwb.require_group_internal(self.full_path())
+        self.nwb.write_dataset_to_file(grp, "", key, field)
+        if key in grp:
+            self.streams[key] = grp[key]
+        del field["_value"]
+
+    def append_data(self, block, unit=None, conversion=None, resolution=None, dtype=None, chunks=None, compression=None, compression_opts=None, shuffle=None):
+        '''Appends a block of samples to the data stored in the
+           TimeSeries. Blocks are written to disk as they arrive, so
+           only one block needs to be held in memory at a time. All
+           blocks must have the same shape beyond the first (time)
+           dimension. This cannot be combined with set_data()
+
+           Arguments:
+               *block* (array) Block of data samples to append
+
+               *unit* (text) Base SI unit for data[] (eg, Amps, Volts)
+
+               *conversion* (float) Multiplier necessary to convert elements in data[] to specified unit
+
+               *resolution* (float) Minimum meaningful distance between elements in data[]
+
+               *dtype* (text) h5py datatype used to store the data. This is only used on the first call
+
+               *chunks*, *compression*, *compression_opts*, *shuffle* Storage settings, as for set_data(). These are only used on the first call
+
+           Returns:
+               *nothing*
+        '''
+        attrs = {}
+        if unit is not None:
+            attrs["unit"] = str(unit)
+        if conversion is not None:
+            attrs["conversion"] = float(conversion)
+        if resolution is not None:
+            attrs["resolution"] = float(resolution)
+        if "data" not in self.streams:
+            self.set_storage_internal("data", chunks, compression, compression_opts, shuffle)
+        self.append_value_internal("data", block, dtype, **attrs)
+
+    # internal function
+    # replaces automatic (h5py-guessed) chunking of a field with a
+    #   chunk shape chosen for this time series type. explicit chunk
+    #   settings, or a storage policy without chunking, are left alone
+    def apply_chunk_policy(self, key, shape, dtype, resizable=False):
+        field = self.spec[key]
+        if "_storage" in field and "chunks" in field["_storage"]:
+            return
+        if self.nwb.get_storage_options(field).get("chunks") is not True:
+            return
+        if dtype.kind in ('S', 'U', 'O'):
+            return  # text is stored without chunking
+        ancestry = self.spec["_attributes"]["ancestry"]["_value"]
+        from . import nwb as nwblib
+        chunks = nwblib.chunk_shape(ancestry, shape, dtype.itemsize, self.nwb.chunk_bytes, resizable)
+        if chunks is None:
+            return
+        if "_storage" not in field:
+            field["_storage"] = {}
+        field["_storage"]["chunks"] = chunks
+
+    # internal function
+    # applies the chunk policy to a field whose value is held in memory
+    def apply_chunk_policy_to_value(self, key):
+        field = self.spec[key]
+        if "_value" not in field or key in self.streams:
+            return  # no value, or value is already on disk
+        value = field["_value"]
+        # decided from the value's own type, as when it's written (see
+        #   NWB.write_datasets())
+        shape = getattr(value, "shape", None)
+        if self.nwb.use_contiguous_layout(shape, getattr(value, "dtype", None)):
+            return  # stored without chunking
+        try:
+            dtype = np.dtype(field["_datatype"])
+        except TypeError:
+            if hasattr(value, "dtype"):
+                dtype = np.dtype(value.dtype)   # don't read external arrays
+            else:
+                dtype = np.asarray(value).dtype
+        self.apply_chunk_policy(key, np.shape(value), dtype)
+
+    # internal function
+    # stores chunking and compression settings for a field. these
+    #   override the file-level storage policy when the field is written
+    def set_storage_internal(self, key, chunks, compression, compression_opts, shuffle):
+        storage = {}
+        if chunks is not None:
+            storage["chunks"] = chunks
+        if compression is not None:
+            storage["compression"] = compression
+        if compression_opts is not None:
+            storage["compression_opts"] = compression_opts
+        if shuffle is not None:
+            storage["shuffle"] = shuffle
+        if len(storage) > 0:
+            self.spec[key]["_storage"] = storage
+        elif "_storage" in self.spec[key]:
+            del self.spec[key]["_storage"]
+
+    def append_time(self, block):
+        '''Appends a block of timestamps to the TimeSeries. Blocks are
+           written to disk as they arrive. This cannot be combined with
+           set_time()
+
+           Arguments:
+               *block* (double array) Timestamps for the appended elements in *data*
+
+           Returns:
+               *nothing*
+        '''
+        self.append_value_internal("timestamps", block, None)
+
+    # internal function used for append_data() and append_time()
+    # the dataset is created under the time series group on the first
+    #   call and is extended by each subsequent block
+    def append_value_internal(self, key, block, dtype, **attrs):
+        if self.finalized:
+            self.fatal_error("Added value after finalization")
+        field = self.spec[key]
+        if "_value" in field:
+            self.fatal_error("cannot append to '%s' after its value was set" % key)
+        if "_value_hardlink" in field or "_value_softlink" in field:
+            self.fatal_error("cannot append to '%s' when it is a link" % key)
+        if key in self.streams and self.streams[key].maxshape[0] is not None:
+            self.fatal_error("cannot append to '%s' after its value was set" % key)
+        if key not in self.streams:
+            if len(self.path) == 0:
+                self.fatal_error("TimeSeries path must be known before appending data -- specify a modality or call set_path()")
+            # determine storage type from the spec if not supplied
+            if dtype is not None and dtype in self.nwb.dtype_glossary:
+                dtype = self.nwb.dtype_glossary[dtype]
+            if dtype is None and field["_datatype"] != "unrestricted":
+                dtype = field["_datatype"]
+            elif dtype is None and np.asarray(block).dtype.kind == 'f':
+                # set non-dtyped float as float32, as set_value() does
+                dtype = 'f4'
+            if dtype is None:
+                block_dtype = np.asarray(block).dtype
+            else:
+                block_dtype = np.dtype(dtype)
+            self.apply_chunk_policy(key, np.shape(block), block_dtype, True)
+        grp = self.nwb.require_group_internal(self.full_path())
+        self.streams[key] = self.nwb.append_to_dataset(grp, key, block, dtype, field)
+        self.nwb.set_attributes_internal(key, field, **attrs)
 
     def ignore_data(self):
         """ In some cases (eg, externally stored image files) there is no 
@@ -384,7 +579,7 @@ class TimeSeries(object):
         else:
             self.fatal_error("Unrecognized link-to object. Expected str or TimeSeries, found %s" % type(target))
         # define link. throw error if value was already set
-        if "_value" in self.spec[field]:
+        if "_value" in self.spec[field] or field in self.streams:
             self.fatal_error("cannot specify a link after setting value")
         elif "_value_softlink" in self.spec[field]:
             self.fatal_error("cannot specify both hard and soft links")
@@ -398,7 +593,7 @@ class TimeSeries(object):
     def create_softlink(self, field, file_path, dataset_path):
         if self.finalized:
             self.fatal_error("Added value after finalization")
-        if "_value" in self.spec[field]:
+        if "_value" in self.spec[field] or field in self.streams:
             self.fatal_error("cannot specify a data link after set_data()")
         elif "_value_hardlink" in self.spec[field]:
             self.fatal_error("cannot specify both hard and soft links")
@@ -418,13 +613,21 @@ class TimeSeries(object):
         """
         if self.finalized:
             self.fatal_error("Added value after finalization")
+        old_path = self.full_path()
         if path.endswith('/'):
             self.path = path
         else:
             self.path = path + "/"
         full_path = self.path + self.name
-        if full_path in self.nwb.file_pointer:
+        if len(self.streams) > 0:
+            self.move_streams(old_path)
+        elif full_path in self.nwb.file_pointer:
             self.fatal_error("group '%s' already exists" % full_path)
+        # now that the path is known, write any deferred values
+        pending = self.pending_flush
+        self.pending_flush = []
+        for key in pending:
+            self.flush_value(key)
 
     def full_path(self):
         """ Returns the HDF5 path to this *TimeSeries*
@@ -502,39 +705,48 @@ class TimeSeries(object):
             spec["starting_time"]["_include"] = "optional"
         # num_samples can sometimes be calculated automatically. do so
         #   here if that's possible
+        # streamed datasets are already on disk. reference them from
+        #   the spec so they're treated the same as other values
+        for k, dset in self.streams.items():
+            spec[k]["_value"] = dset
         if "_value" not in spec["num_samples"]:
             if "_value" in spec["timestamps"]:
                 # make tmp short name to avoid passing 80-col limit in editor
                 tdat = spec["timestamps"] 
                 spec["num_samples"]["_value"] = len(tdat["_value"])
+            elif "data" in self.streams:
+                spec["num_samples"]["_value"] = len(self.streams["data"])
         # document missing standard fields
         err_str = []
         missing_fields = []
-        for k in list(spec.keys()):
-            if k.startswith('_'):   # check for leading underscore
-                continue    # control field -- ignore
-            if "_value" in spec[k]:
+        # fields are only read here, so aren't copied from the template
+        from . import nwb as nwblib
+        peek = nwblib.peek_spec
+        for k in nwblib.spec_fields(spec):
+            field = peek(spec, k)
+            if "_value" in field:
                 continue    # field exists
-            if spec[k]["_include"] == "required":
+            if field["_include"] == "required":
                 # value is missing -- see if alternate or link exists
-                if "_value_softlink" in spec[k]:
+                if "_value_softlink" in field:
                     continue
-                if "_value_hardlink" in spec[k]:
+                if "_value_hardlink" in field:
                     continue
                 # valid alternative fields include links -- check possibilities
-                if "_alternative" in spec[k]:
-                    if "_value" in spec[spec[k]["_alternative"]]:
+                if "_alternative" in field:
+                    alt = peek(spec, field["_alternative"])
+                    if "_value" in alt:
                         continue    # alternative field exists
-                    if "_value_hardlink" in spec[spec[k]["_alternative"]]:
+                    if "_value_hardlink" in alt:
                         continue    # alternative field exists
-                    if "_value_softlink" in spec[spec[k]["_alternative"]]:
+                    if "_value_softlink" in alt:
                         continue    # alternative field exists
                 miss_str = "Missing field '%s'" % k
-                if "_alternative" in spec[k]:
-                    miss_str += " (or '%s')" % spec[k]["_alternative"]
+                if "_alternative" in field:
+                    miss_str += " (or '%s')" % field["_alternative"]
                 err_str.append(str(miss_str))
             # make a record of missing required fields
-            if spec[k]["_include"] == "standard":
+            if field["_include"] == "standard":
                 if "_value" not in spec["_attributes"]["missing_fields"]:
                     spec["_attributes"]["missing_fields"]["_value"] = []
                 spec["_attributes"]["missing_fields"]["_value"].append(str(k))
@@ -554,9 +766,11 @@ class TimeSeries(object):
         if "_value" in spec["starting_time"]:
             lspec.append(spec["starting_time"])
         for i in range(len(lspec)):
-            for k in lspec[i]["_attributes"]:
-                if lspec[i]["_attributes"][k]["_include"] == "required":
-                    if "_value" not in lspec[i]["_attributes"][k]:
+            attrs = peek(lspec[i], "_attributes")
+            for k in nwblib.spec_fields(attrs):
+                attr = peek(attrs, k)
+                if attr["_include"] == "required":
+                    if "_value" not in attr:
                         err_str.append("Missing attribute: " + k)
         # report missing standard data
         if len(missing_fields) > 0:
@@ -574,20 +788,33 @@ class TimeSeries(object):
                 print("Missing mandatory field(s):")
             for i in range(len(err_str)):
                 print("\t" + err_str[i])
-            sys.exit(1)
+            self.fatal_error("Missing mandatory field(s)")
         # TODO check _linkto
 
+        # choose chunk shapes for the bulk data, based on time series type
+        self.apply_chunk_policy_to_value("data")
+        self.apply_chunk_policy_to_value("timestamps")
+        # set done flag
+        self.finalized = True
+        # write content to file. this is done by the background writer
+        #   thread if the file has one
+        self.nwb.submit_write(self.write_to_file, self.spec)
+
+    # internal function
+    # writes the finalized time series to the file
+    def write_to_file(self):
         # make sure dataset or group doesn't already exist w/ this name
-        if self.full_path() in self.nwb.file_pointer:
+        # if data was streamed, the group was created by this time series
+        if len(self.streams) > 0:
+            grp = self.nwb.file_pointer[self.full_path()]
+        elif self.full_path() in self.nwb.file_pointer:
             self.fatal_error("HDF5 element %s already exists"%self.full_path())
-        # write content to file
-        grp = self.nwb.file_pointer.create_group(self.full_path())
-        self.nwb.write_datasets(grp, "", spec)
-
+        else:
+            grp = self.nwb.require_group_internal(self.full_path())
+        self.nwb.write_datasets(grp, "", self.spec)
         # allow freeing of memory
         self.spec = None
-        # set done flag
-        self.finalized = True
+        self.streams = {}
 
 
 class AnnotationSeries(TimeSeries):
@@ -632,14 +859,10 @@ class AnnotationSeries(TimeSeries):
         if self.finalized:
             return
         if len(self.annot_str) > 0:
-            if "_value" in self.spec["data"]:
-                print("AnnotationSeries error -- can only call set_data() or add_annotation(), not both")
-                print("AnnotationSeries name: " + self.name)
-                sys.exit(1)
-            if "_value" in self.spec["timestamps"]:
-                print("AnnotationSeries error -- can only call set_time() or add_annotation(), not both")
-                print("AnnotationSeries name: " + self.name)
-                sys.exit(1)
+            if "_value" in self.spec["data"] or "data" in self.streams:
+                self.fatal_error("AnnotationSeries error -- can only call set_data() or add_annotation(), not both")
+            if "_value" in self.spec["timestamps"] or "timestamps" in self.streams:
+                self.fatal_error("AnnotationSeries error -- can only call set_time() or add_annotation(), not both")
             self.spec["data"]["_value"] = self.annot_str
             self.spec["timestamps"]["_value"] = self.annot_time
         super(AnnotationSeries, self).finalize()
@@ -0,0 +1,61 @@
+#!/usr/bin/python
+import h5py
+import numpy as np
+import test_utils as ut
+import nwb
+
+# test writing finalized objects on a background thread
+# TESTS background_writer file setting
+# TESTS epochs and interfaces referencing objects written in background
+# TESTS acquisition buffer reused after finalize()
+
+def test_background_writer():
+    if __file__.startswith("./"):
+        fname = "x" + __file__[3:-3] + ".nwb"
+    else:
+        fname = "x" + __file__[1:-3] + ".nwb"
+    create_file(fname)
+    for i in range(10):
+        ut.verify_timeseries(fname, "sweep_%d" % i, "acquisition/timeseries", "TimeSeries")
+    ut.verify_timeseries(fname, "isi", "processing/mod/BehavioralTimeSeries", "TimeSeries")
+    ut.verify_present(fname, "epochs/trial_5/sweep_5", "idx_start")
+    f = h5py.File(fname, 'r')
+    for i in range(10):
+        data = f["acquisition/timeseries/sweep_%d/data" % i][()]
+        if not np.allclose(data, np.arange(1000) + i):
+            ut.error("Checking background write", "Data values incorrect")
+    if f["epochs/trial_5/sweep_5/count"][()] != 1000:
+        ut.error("Checking epoch", "Incorrect overlap count")
+    f.close()
+
+def create_file(fname):
+    settings = {}
+    settings["filename"] = fname
+    settings["identifier"] = nwb.create_identifier("background writer test")
+    settings["overwrite"] = True
+    settings["description"] = "Test file written in background"
+    settings["background_writer"] = True
+    neurodata = nwb.NWB(**settings)
+    # simulated acquisition loop -- each sweep is handed off when done
+    buf = np.zeros(1000)
+    for i in range(10):
+        ts = neurodata.create_timeseries("TimeSeries", "sweep_%d" % i, "acquisition")
+        buf[:] = np.arange(1000) + i
+        ts.set_data(buf, "Volts", 1.0, 0.001)
+        ts.set_time(i * 10.0 + np.arange(1000) * 0.001)
+        ts.finalize()
+    for i in range(10):
+        epoch = neurodata.create_epoch("trial_%d" % i, i * 10.0, i * 10.0 + 5.0)
+        epoch.add_timeseries("sweep_%d" % i, "/acquisition/timeseries/sweep_%d" % i)
+    mod = neurodata.create_module("mod")
+    iface = mod.create_interface("BehavioralTimeSeries")
+    ts = neurodata.create_timeseries("TimeSeries", "isi")
+    ts.set_data(np.zeros(10), "n/a", 1.0, 1.0)
+    ts.set_time(np.arange(10) * 1.0)
+    iface.add_timeseries(ts)
+    iface.finalize()
+    mod.finalize()
+    neurodata.close()
+
+test_background_writer()
+print("%s PASSED" % __file__)
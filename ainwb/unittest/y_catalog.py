@@ -0,0 +1,115 @@
+#!/usr/bin/python
+import os
+import shutil
+import sqlite3
+import h5py
+import numpy as np
+import test_utils as ut
+import nwb
+from nwb.nwbco import *
+from nwb import nwbcat
+
+# test catalog of a directory of NWB files
+# TESTS metadata, /general fields and time series in catalog
+# TESTS files that can't be read are recorded with an error, and nothing else
+# TESTS update reads only new and changed files and drops removed ones
+
+def test_catalog():
+    if __file__.startswith("./"):
+        name = "x" + __file__[3:-3]
+    else:
+        name = "x" + __file__[1:-3]
+    directory = name + "_files"
+    catalog = name + ".db"
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.makedirs(os.path.join(directory, "sub"))
+    if os.path.exists(catalog):
+        os.remove(catalog)
+    create_file(os.path.join(directory, "a.nwb"), "mouse", 1)
+    create_file(os.path.join(directory, "sub", "b.nwb"), "rat", 2)
+    with open(os.path.join(directory, "bad.nwb"), "w") as f:
+        f.write("not an NWB file")
+    summary = nwb.build_catalog(directory, catalog, processes=2)
+    check_summary(summary, 3, 0, 0, 1)
+    db = sqlite3.connect(catalog)
+    rows = db.execute("SELECT path FROM metadata WHERE key='subject/species' AND value='rat'").fetchall()
+    if len(rows) != 1 or not rows[0][0].endswith(os.path.join("sub", "b.nwb")):
+        ut.error("Checking metadata", "Species not found in catalog")
+    vals = db.execute("SELECT value FROM metadata WHERE key='experimenter'").fetchall()
+    if sorted(v[0] for v in vals) != ["experimenter 1", "experimenter 2"]:
+        ut.error("Checking metadata", "Unexpected experimenters %s" % str(vals))
+    vals = db.execute("SELECT value FROM metadata WHERE key='devices/probe'").fetchall()
+    if len(vals) != 2 or vals[0][0] != "test probe":
+        ut.error("Checking metadata", "Device description not found")
+    rows = db.execute("SELECT identifier, session_start_time FROM files WHERE error IS NULL ORDER BY path").fetchall()
+    if len(rows) != 2 or not rows[0][0].startswith("catalog test 1") or rows[0][1] != "Sat Jul 04 2015 3:14:16":
+        ut.error("Checking files", "Unexpected file entries %s" % str(rows))
+    err = db.execute("SELECT error FROM files WHERE path LIKE '%bad.nwb'").fetchone()
+    if err is None or err[0] is None:
+        ut.error("Checking files", "Unreadable file not recorded")
+    rows = db.execute("SELECT ts_path, ts_type, num_samples, start_time, stop_time FROM timeseries WHERE path LIKE '%b.nwb' ORDER BY ts_path").fetchall()
+    if len(rows) != 2:
+        ut.error("Checking time series", "Expected 2 time series, found %d" % len(rows))
+    if rows[0][0] != "/acquisition/timeseries/ts0" or rows[0][1] != "TimeSeries" or rows[0][2] != 100 or rows[0][3] != 0.0 or abs(rows[0][4] - 9.9) > 1e-9:
+        ut.error("Checking time series", "Unexpected entry %s" % str(rows[0]))
+    db.close()
+    # update after adding, changing and removing files
+    summary = nwb.build_catalog(directory, catalog, processes=2)
+    check_summary(summary, 0, 3, 0, 0)
+    create_file(os.path.join(directory, "a.nwb"), "gerbil", 3)
+    create_file(os.path.join(directory, "c.nwb"), "mouse", 1)
+    os.remove(os.path.join(directory, "sub", "b.nwb"))
+    summary = nwb.build_catalog(directory, catalog, processes=1)
+    check_summary(summary, 2, 1, 1, 0)
+    db = sqlite3.connect(catalog)
+    vals = db.execute("SELECT value FROM metadata WHERE key='subject/species' ORDER BY value").fetchall()
+    if [v[0] for v in vals] != ["gerbil", "mouse"]:
+        ut.error("Checking update", "Unexpected species %s" % str(vals))
+    n = db.execute("SELECT COUNT(*) FROM timeseries").fetchone()[0]
+    if n != 4:
+        ut.error("Checking update", "Expected 4 time series, found %d" % n)
+    n = db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+    if n != 3:
+        ut.error("Checking update", "Expected 3 files, found %d" % n)
+    db.close()
+    check_partial(os.path.join(directory, "partial.nwb"))
+    shutil.rmtree(directory)
+    os.remove(catalog)
+
+# a file whose metadata can be read, but not its object index
+def check_partial(fname):
+    with h5py.File(fname, "w") as f:
+        f["identifier"] = np.string_("partial")
+        f["general/experimenter"] = np.string_("experimenter 1")
+        f["object_index"] = np.zeros(3)
+    entry = nwbcat.scan_file((os.path.abspath(fname), 0.0, 0))
+    if entry["error"] is None:
+        ut.error("Checking partial file", "Error not recorded")
+    if len(entry["metadata"]) != 0 or len(entry["timeseries"]) != 0:
+        ut.error("Checking partial file", "Partial results recorded with error")
+
+def check_summary(summary, scanned, unchanged, removed, errors):
+    expected = {"scanned": scanned, "unchanged": unchanged, "removed": removed, "errors": errors}
+    if summary != expected:
+        ut.error("Checking catalog summary", "Expected %s, found %s" % (str(expected), str(summary)))
+
+def create_file(fname, species, num):
+    settings = {}
+    settings["filename"] = fname
+    settings["identifier"] = nwb.create_identifier("catalog test %d" % num)
+    settings["overwrite"] = True
+    settings["start_time"] = "Sat Jul 04 2015 3:14:16"
+    settings["description"] = "Test file for catalog"
+    neurodata = nwb.NWB(**settings)
+    neurodata.set_metadata(EXPERIMENTER, "experimenter %d" % num)
+    neurodata.set_metadata(SPECIES, species)
+    neurodata.set_metadata(DEVICE("probe"), "test probe")
+    for i in range(num):
+        ts = neurodata.create_timeseries("TimeSeries", "ts%d" % i, "acquisition")
+        ts.set_data(np.zeros(100), "Volts", 1.0, 0.001)
+        ts.set_time(np.arange(100) * 0.1)
+    neurodata.close()
+
+test_catalog()
+print("%s PASSED" % __file__)
@@ -0,0 +1,70 @@
+#!/usr/bin/python
+import h5py
+import numpy as np
+import test_utils as ut
+import nwb
+
+# test automatic selection of chunk shapes
+# TESTS chunk_shape() layouts for image and electrical series
+# TESTS chunk_bytes file setting
+# TESTS explicit chunk settings override the policy
+
+def test_chunk_policy():
+    if __file__.startswith("./"):
+        fname = "x" + __file__[3:-3] + ".nwb"
+    else:
+        fname = "x" + __file__[1:-3] + ".nwb"
+    # whole frames are never split
+    anc = ["TimeSeries", "ImageSeries", "TwoPhotonSeries"]
+    chunks = nwb.chunk_shape(anc, (100, 1024, 1024), 2)
+    if chunks != (1, 1024, 1024):
+        ut.error("Checking frame layout", "Found %s" % str(chunks))
+    # time-major chunks hold all channels
+    anc = ["TimeSeries", "ElectricalSeries"]
+    chunks = nwb.chunk_shape(anc, (10**8, 64), 2, 1024*1024)
+    if chunks != (8192, 64):
+        ut.error("Checking time layout", "Found %s" % str(chunks))
+    if nwb.chunk_shape(anc, (), 8) is not None:
+        ut.error("Checking scalar", "Scalar should not be chunked")
+    create_series(fname)
+    f = h5py.File(fname, 'r')
+    dset = f["acquisition/timeseries/img/data"]
+    if dset.chunks != (2, 128, 128):
+        ut.error("Checking image chunks", "Found %s" % str(dset.chunks))
+    dset = f["acquisition/timeseries/ephys/data"]
+    if dset.chunks != (4096, 4):
+        ut.error("Checking ephys chunks", "Found %s" % str(dset.chunks))
+    dset = f["acquisition/timeseries/fixed/data"]
+    if dset.chunks != (10, 4):
+        ut.error("Checking explicit chunks", "Found %s" % str(dset.chunks))
+    f.close()
+
+def create_series(fname):
+    settings = {}
+    settings["filename"] = fname
+    settings["identifier"] = nwb.create_identifier("chunk test")
+    settings["overwrite"] = True
+    settings["description"] = "Test file with chunk policy"
+    settings["chunk_bytes"] = 64 * 1024
+    neurodata = nwb.NWB(**settings)
+    #
+    img = neurodata.create_timeseries("TwoPhotonSeries", "img", "acquisition")
+    img.set_value("imaging_plane", "plane")
+    img.set_data(np.zeros((10, 128, 128), dtype=np.uint16), "grayscale", 1.0, 1.0)
+    img.set_time(np.arange(10) * 0.1)
+    #
+    ephys = neurodata.create_timeseries("ElectricalSeries", "ephys", "acquisition")
+    ephys.set_value("electrode_idx", [0, 1, 2, 3])
+    ephys.set_data(np.zeros((20000, 4), dtype=np.float32), "Volts", 1.0, 0.001)
+    ephys.set_time_by_rate(0.0, 1000.0)
+    ephys.set_value("num_samples", 20000)
+    #
+    fixed = neurodata.create_timeseries("ElectricalSeries", "fixed", "acquisition")
+    fixed.set_value("electrode_idx", [0, 1, 2, 3])
+    fixed.set_data(np.zeros((20000, 4), dtype=np.float32), "Volts", 1.0, 0.001, chunks=(10, 4))
+    fixed.set_time_by_rate(0.0, 1000.0)
+    fixed.set_value("num_samples", 20000)
+    neurodata.close()
+
+test_chunk_policy()
+print("%s PASSED" % __file__)
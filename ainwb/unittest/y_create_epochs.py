@@ -0,0 +1,90 @@
+#!/usr/bin/python
+import h5py
+import numpy as np
+import test_utils as ut
+import nwb
+
+# test creating many epochs at once
+# TESTS create_epochs() gives the same epochs as create_epoch()
+# TESTS series with timestamps, NaN gaps and sampling rate
+# TESTS names for series given in a dict
+
+def test_create_epochs():
+    if __file__.startswith("./"):
+        fname = "x" + __file__[3:-3] + ".nwb"
+    else:
+        fname = "x" + __file__[1:-3] + ".nwb"
+    starts = np.arange(50) * 0.2 - 0.5
+    stops = starts + 0.15
+    names = ["trial_%d" % i for i in range(len(starts))]
+    # one file with epochs added one at a time, one with them in bulk
+    single = create_file(fname[:-4] + "_single.nwb")
+    stamped, rated = add_series(single)
+    for i in range(len(names)):
+        ep = single.create_epoch(names[i], starts[i], stops[i])
+        ep.add_timeseries("stamped", stamped)
+        ep.add_timeseries("rated", rated)
+        ep.add_timeseries("other_name", stamped)
+    single.close()
+    bulk = create_file(fname)
+    stamped, rated = add_series(bulk)
+    bulk.create_epochs(names, starts, stops, [stamped, "acquisition/timeseries/rated"])
+    bulk.close()
+    bulk = create_file(fname[:-4] + "_dict.nwb")
+    stamped, rated = add_series(bulk)
+    series = {"stamped": stamped, "rated": rated, "other_name": stamped}
+    epochs = bulk.create_epochs(names, starts, stops, series)
+    if len(epochs) != len(names):
+        ut.error("Creating epochs", "Wrong number of epochs returned")
+    bulk.close()
+    compare_epochs(fname[:-4] + "_single.nwb", fname, names, ["stamped", "rated"])
+    compare_epochs(fname[:-4] + "_single.nwb", fname[:-4] + "_dict.nwb", names, ["stamped", "rated", "other_name"])
+
+def compare_epochs(expected, found, names, series):
+    fe = h5py.File(expected, 'r')
+    ff = h5py.File(found, 'r')
+    for name in names:
+        ge = fe["epochs/" + name]
+        gf = ff["epochs/" + name]
+        if ge["start_time"][()] != gf["start_time"][()] or ge["stop_time"][()] != gf["stop_time"][()]:
+            ut.error("Checking epoch " + name, "Times differ")
+        links = [x for x in ge.attrs["links"] if x.decode().split("'")[1] in series]
+        if list(links) != list(gf.attrs["links"]):
+            ut.error("Checking epoch " + name, "Links differ: %s and %s" % (str(links), str(gf.attrs["links"])))
+        for ts in series:
+            if (ts in ge) != (ts in gf):
+                ut.error("Checking epoch " + name, "Overlap with %s differs" % ts)
+            if ts not in ge:
+                continue
+            for field in ["idx_start", "count"]:
+                if ge[ts][field][()] != gf[ts][field][()]:
+                    ut.error("Checking epoch " + name, "Different %s for %s" % (field, ts))
+            if ge[ts]["timeseries"].name != gf[ts]["timeseries"].name:
+                ut.error("Checking epoch " + name, "Different time series for %s" % ts)
+    fe.close()
+    ff.close()
+
+def add_series(neurodata):
+    t = np.arange(1000) * 0.01
+    t[300:320] = np.nan
+    stamped = neurodata.create_timeseries("TimeSeries", "stamped", "acquisition")
+    stamped.set_data(np.zeros(len(t)), "Volts", 1.0, 0.001)
+    stamped.set_time(t)
+    stamped.finalize()
+    rated = neurodata.create_timeseries("TimeSeries", "rated", "acquisition")
+    rated.set_data(np.zeros(600), "Volts", 1.0, 0.001)
+    rated.set_time_by_rate(0.25, 75.0)
+    rated.set_value("num_samples", 600)
+    rated.finalize()
+    return stamped, rated
+
+def create_file(fname):
+    settings = {}
+    settings["filename"] = fname
+    settings["identifier"] = nwb.create_identifier("bulk epoch test")
+    settings["overwrite"] = True
+    settings["description"] = "Test file for bulk epoch creation"
+    return nwb.NWB(**settings)
+
+test_create_epochs()
+print("%s PASSED" % __file__)
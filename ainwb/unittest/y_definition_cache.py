@@ -0,0 +1,74 @@
+#!/usr/bin/python
+import numpy as np
+import test_utils as ut
+import nwb
+
+# test compiled TimeSeries and Interface definitions
+# TESTS definitions are compiled once and shared between files
+# TESTS changes to objects don't alter shared definitions
+# TESTS compiled definitions can't be modified
+# TESTS reader shares definitions
+
+def test_definition_cache():
+    if __file__.startswith("./"):
+        fname = "x" + __file__[3:-3] + ".nwb"
+    else:
+        fname = "x" + __file__[1:-3] + ".nwb"
+    first = create_file(fname)
+    ts = first.create_timeseries("ElectricalSeries", "first", "acquisition")
+    ancestry = ts.spec["_attributes"]["ancestry"]["_value"]
+    if ancestry != ["TimeSeries", "ElectricalSeries"]:
+        ut.error("Compiling definition", "Unexpected ancestry %s" % str(ancestry))
+    ancestry.append("changed")
+    ts.set_description("changed")
+    mod = first.create_module("mod")
+    iface = mod.create_interface("UnitTimes")
+    iface.set_source("changed")
+    defn = first.definitions[("TimeSeries", "ElectricalSeries")]
+    try:
+        defn["data"]["_value"] = 0
+        ut.error("Modifying definition", "Compiled definition changed")
+    except TypeError:
+        pass
+    if "[]" in defn.fields() or "_attributes" in defn.fields():
+        ut.error("Compiling definition", "Control keys listed as fields")
+    # a second file should reuse the definitions from the first
+    second = create_file(fname[:-4] + "2.nwb")
+    if second.definitions[("TimeSeries", "ElectricalSeries")] is not defn:
+        ut.error("Reusing definition", "Definition compiled again")
+    ts2 = second.create_timeseries("ElectricalSeries", "second", "acquisition")
+    if "changed" in ts2.spec["_attributes"]["ancestry"]["_value"]:
+        ut.error("Reusing definition", "Ancestry changed by other series")
+    if ts2.spec["_attributes"]["description"]["_value"] != "":
+        ut.error("Reusing definition", "Description changed by other series")
+    mod2 = second.create_module("mod")
+    iface2 = mod2.create_interface("UnitTimes")
+    if "_value" in iface2.spec["_attributes"]["source"]:
+        ut.error("Reusing definition", "Interface changed by other interface")
+    for f, t, m, i in [(first, ts, mod, iface), (second, ts2, mod2, iface2)]:
+        t.set_data(np.zeros((10, 2)), "Volts", 1.0, 0.001)
+        t.set_time(np.arange(10) * 0.001)
+        t.set_value("electrode_idx", [0, 1])
+        t.finalize()
+        i.add_unit("unit", [1.0, 2.0], "unit description", "spike sorting")
+        i.finalize()
+        m.finalize()
+    first.close()
+    second.close()
+    ut.verify_timeseries(fname, "first", "acquisition/timeseries", "ElectricalSeries")
+    # the reader uses the same definitions
+    reader = nwb.NWBReader(fname[:-4] + "2.nwb")
+    if reader.get_timeseries("/acquisition/timeseries/second").spec is not defn:
+        ut.error("Reading definition", "Definition compiled again by reader")
+    reader.close()
+
+def create_file(fname):
+    settings = {}
+    settings["filename"] = fname
+    settings["identifier"] = nwb.create_identifier("definition cache test")
+    settings["overwrite"] = True
+    settings["description"] = "Test file for definition cache"
+    return nwb.NWB(**settings)
+
+test_definition_cache()
+print("%s PASSED" % __file__)
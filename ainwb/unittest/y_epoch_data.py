@@ -0,0 +1,96 @@
+#!/usr/bin/python
+import numpy as np
+import test_utils as ut
+import nwb
+from nwb import nwbrd
+
+# test reading the samples of a time series in many epochs
+# TESTS epochs selected by tag
+# TESTS time series selected by name in epoch, path or object
+# TESTS reads are coalesced and made in file order
+
+def test_epoch_data():
+    if __file__.startswith("./"):
+        fname = "x" + __file__[3:-3] + ".nwb"
+    else:
+        fname = "x" + __file__[1:-3] + ".nwb"
+    t = np.arange(100000) * 0.001
+    data = np.arange(200000).reshape(100000, 2)
+    starts = np.arange(200) * 0.5
+    create_file(fname, t, data, starts)
+    f = nwb.NWBReader(fname)
+    names = f.epoch_names("odd")
+    if len(names) != 100 or "trial_1" not in names or "trial_0" in names:
+        ut.error("Selecting epochs", "Wrong epochs for tag")
+    ts = f.get_timeseries("/acquisition/timeseries/voltage")
+    for key in ["voltage", "/acquisition/timeseries/voltage", ts]:
+        results = f.get_epoch_data(f.epochs("odd"), key)
+        for k in range(len(names)):
+            epoch = f.get_epoch(names[k])
+            d, w = ts.window(epoch.start_time, epoch.stop_time)
+            if results[k] is None:
+                ut.error("Reading epoch data", "No data for %s" % names[k])
+            if not np.array_equal(results[k][0], d) or not np.array_equal(results[k][1], w):
+                ut.error("Reading epoch data", "Wrong data for %s" % names[k])
+    # epochs without the time series
+    results = f.get_epoch_data(["late", "trial_3"], "voltage")
+    if results[0] is not None or results[1] is None:
+        ut.error("Reading epoch data", "Epoch without time series not skipped")
+    # calculated timestamps
+    results = f.get_epoch_data(["trial_3"], "rated")
+    epoch = f.get_epoch("trial_3")
+    d, w = f.get_timeseries("/acquisition/timeseries/rated").window(epoch.start_time, epoch.stop_time)
+    if not np.array_equal(results[0][1], w):
+        ut.error("Reading epoch data", "Wrong timestamps for rate series")
+    f.close()
+
+def test_coalesce():
+    # 1000 short trials, given out of order, covering 1/10th of the data
+    ranges = [(k * 1000, k * 1000 + 99) for k in range(1000)]
+    np.random.shuffle(ranges)
+    reads = nwbrd.coalesce_ranges(ranges, 8, 4096)
+    if len(reads) > 30:
+        ut.error("Coalescing reads", "%d reads for 1000 ranges" % len(reads))
+    last = -1
+    covered = 0
+    for first, stop, members in reads:
+        if first <= last:
+            ut.error("Coalescing reads", "Reads not in order")
+        last = stop
+        for k in members:
+            if ranges[k][0] < first or ranges[k][1] > stop:
+                ut.error("Coalescing reads", "Range not in read")
+        covered += len(members)
+    if covered != len(ranges):
+        ut.error("Coalescing reads", "Ranges missing from reads")
+    # distant ranges are read separately
+    reads = nwbrd.coalesce_ranges([(0, 10), (10000000, 10000010)], 8, 4096)
+    if len(reads) != 2:
+        ut.error("Coalescing reads", "Distant ranges merged")
+
+def create_file(fname, t, data, starts):
+    settings = {}
+    settings["filename"] = fname
+    settings["identifier"] = nwb.create_identifier("epoch data test")
+    settings["overwrite"] = True
+    settings["description"] = "Test file for reading epoch data"
+    neurodata = nwb.NWB(**settings)
+    ts = neurodata.create_timeseries("TimeSeries", "voltage", "acquisition")
+    ts.set_data(data, "Volts", 1.0, 0.001)
+    ts.set_time(t)
+    ts.finalize()
+    rated = neurodata.create_timeseries("TimeSeries", "rated", "acquisition")
+    rated.set_data(data, "Volts", 1.0, 0.001)
+    rated.set_time_by_rate(0.0, 1000.0)
+    rated.set_value("num_samples", len(data))
+    rated.finalize()
+    names = ["trial_%d" % i for i in range(len(starts))]
+    epochs = neurodata.create_epochs(names, starts, starts + 0.2, [ts, rated])
+    for i in range(len(epochs)):
+        epochs[i].add_tag(["even", "odd"][i % 2])
+    neurodata.create_epoch("late", 500.0, 501.0)
+    neurodata.close()
+
+test_epoch_data()
+test_coalesce()
+print("%s PASSED" % __file__)
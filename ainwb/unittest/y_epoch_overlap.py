@@ -0,0 +1,89 @@
+#!/usr/bin/python
+import h5py
+import numpy as np
+import test_utils as ut
+import nwb
+from nwb import nwbep
+
+# test overlap search between epochs and time series
+# TESTS timestamps with NaN gaps
+# TESTS search of timestamps stored in file
+# TESTS calculated overlap for series with a sampling rate
+
+def test_epoch_overlap():
+    if __file__.startswith("./"):
+        fname = "x" + __file__[3:-3] + ".nwb"
+    else:
+        fname = "x" + __file__[1:-3] + ".nwb"
+    t = np.arange(100) * 0.1
+    t[20:30] = np.nan
+    t[95:] = np.nan
+    check_overlap(t, 0.0, 9.9, 0, 94)
+    check_overlap(t, 1.95, 3.05, 30, 30)    # starts in gap
+    check_overlap(t, 1.55, 2.55, 16, 19)    # ends in gap
+    check_overlap(t, 2.05, 2.95, None, None)    # within gap
+    check_overlap(t, 9.6, 20.0, None, None)     # after last valid time
+    check_overlap(t, -5.0, -1.0, None, None)
+    check_overlap(np.zeros(10) + np.nan, 0.0, 1.0, None, None)
+    # compare with simple search over many intervals
+    for i in range(200):
+        a, b = np.sort(np.random.random(2) * 11.0 - 0.5)
+        ok = np.flatnonzero(~np.isnan(t) & (t >= a) & (t <= b))
+        if len(ok) == 0:
+            check_overlap(t, a, b, None, None)
+        else:
+            check_overlap(t, a, b, ok[0], ok[-1])
+    # epochs use timestamps in the file
+    settings = {}
+    settings["filename"] = fname
+    settings["identifier"] = nwb.create_identifier("epoch overlap test")
+    settings["overwrite"] = True
+    settings["description"] = "Test file for epoch overlap search"
+    neurodata = nwb.NWB(**settings)
+    ts = neurodata.create_timeseries("TimeSeries", "gaps", "acquisition")
+    ts.set_data(np.zeros(len(t)), "Volts", 1.0, 0.001)
+    ts.set_time(t)
+    ts.finalize()
+    ep = neurodata.create_epoch("in_gap", 1.95, 3.05)
+    ep.add_timeseries("gaps", ts)
+    ep = neurodata.create_epoch("outside", 50.0, 60.0)
+    ep.add_timeseries("gaps", ts)
+    neurodata.close()
+    f = h5py.File(fname, 'r')
+    if f["epochs/in_gap/gaps/idx_start"][()] != 30 or f["epochs/in_gap/gaps/count"][()] != 1:
+        ut.error("Checking epoch", "Incorrect overlap in file")
+    if "gaps" in f["epochs/outside"]:
+        ut.error("Checking epoch", "Time series added without overlap")
+    f.close()
+
+def test_rate_overlap():
+    # compare with search of calculated timestamps, including intervals
+    #   that start and stop exactly on samples, and a float32 rate as
+    #   read from the file
+    for rate in [30000.0, 29.97, 1.0 / 3.0, np.float32(29.97)]:
+        for t0 in [0.0, 0.1, -2.5]:
+            n = 1000
+            t = t0 + np.arange(n) / float(rate)
+            intervals = [(t[10], t[20]), (t[0] - 1.0, t[0]), (t[-1], t[-1] + 1.0)]
+            intervals.append((t[-1] + 1.0, t[-1] + 2.0))
+            for i in range(100):
+                a, b = np.sort(t0 + (np.random.random(2) * 1.2 - 0.1) * n / rate)
+                intervals.append((a, b))
+            for a, b in intervals:
+                ok = np.flatnonzero((t >= a) & (t <= b))
+                expected = (None, None)
+                if len(ok) > 0:
+                    expected = (ok[0], ok[-1])
+                idx = nwbep.find_rate_overlap(t0, rate, n, a, b)
+                if idx != expected:
+                    ut.error("Checking rate overlap", "Interval %g-%g: expected %s, found %s" % (a, b, str(expected), str(idx)))
+
+def check_overlap(t, start, stop, i0, i1):
+    for block in [1, 3, 4096]:
+        idx = nwbep.find_overlap(t, start, stop, block)
+        if idx != (i0, i1):
+            ut.error("Checking overlap", "Interval %g-%g: expected %s, found %s" % (start, stop, str((i0, i1)), str(idx)))
+
+test_epoch_overlap()
+test_rate_overlap()
+print("%s PASSED" % __file__)
@@ -0,0 +1,94 @@
+#!/usr/bin/python
+import os
+import h5py
+import numpy as np
+import test_utils as ut
+import nwb
+
+# test storing data from arrays that aren't in memory
+# TESTS set_data() with np.memmap
+# TESTS set_data() with h5py.Dataset from another file (object copy)
+# TESTS h5py.Dataset sources follow the storage policy and settings of
+#   the field, and their attributes aren't copied
+# TESTS set_data() with h5py.Dataset requiring type conversion
+
+def test_external_data():
+    if __file__.startswith("./"):
+        fname = "x" + __file__[3:-3] + ".nwb"
+    else:
+        fname = "x" + __file__[1:-3] + ".nwb"
+    raw_name = fname + ".raw"
+    src_name = fname + ".src.h5"
+    data = np.arange(30000, dtype=np.int16).reshape(-1, 3)
+    mm = np.memmap(raw_name, dtype=np.int16, mode="w+", shape=data.shape)
+    mm[:] = data
+    mm.flush()
+    src = h5py.File(src_name, "w")
+    dset = src.create_dataset("data", data=data, chunks=(1000, 3), compression="gzip")
+    dset.attrs["unit"] = "mV"
+    dset.attrs["foreign"] = "source attribute"
+    dset = src.create_dataset("signal", data=np.random.random(5000).astype(np.float32))
+    dset.attrs["foreign"] = "source attribute"
+    src.close()
+    #
+    create_series(fname, raw_name, src_name, data.shape)
+    f = h5py.File(fname, 'r')
+    for name in ["memmap", "copied", "policy", "converted"]:
+        dset = f["acquisition/timeseries/" + name + "/data"]
+        if not np.array_equal(dset[()], data):
+            ut.error("Checking external data", "Data in '%s' does not match" % name)
+        if not ut.strcmp(dset.attrs["unit"], "Volts"):
+            ut.error("Checking external data", "Unit missing in '%s'" % name)
+        if "foreign" in dset.attrs:
+            ut.error("Checking external data", "Source attributes copied to '%s'" % name)
+    dset = f["acquisition/timeseries/copied/data"]
+    if dset.chunks != (1000, 3) or dset.compression != "gzip":
+        ut.error("Checking object copy", "Source layout not preserved")
+    dset = f["acquisition/timeseries/policy/data"]
+    if dset.chunks != (10000, 3) or dset.compression != "gzip" or dset.compression_opts != 4:
+        ut.error("Checking storage policy", "Policy not applied to source")
+    dset = f["acquisition/timeseries/custom/data"]
+    if dset.chunks != (1000,) or dset.compression != "gzip" or dset.compression_opts != 9:
+        ut.error("Checking storage settings", "Settings not applied to source")
+    if "foreign" in dset.attrs or not ut.strcmp(dset.attrs["unit"], "Volts"):
+        ut.error("Checking storage settings", "Wrong attributes")
+    if f["acquisition/timeseries/converted/data"].dtype != np.float64:
+        ut.error("Checking type conversion", "Data not converted")
+    f.close()
+    os.remove(raw_name)
+    os.remove(src_name)
+
+def create_series(fname, raw_name, src_name, shape):
+    settings = {}
+    settings["filename"] = fname
+    settings["identifier"] = nwb.create_identifier("external data test")
+    settings["overwrite"] = True
+    settings["description"] = "Test file with data from external arrays"
+    neurodata = nwb.NWB(**settings)
+    src = h5py.File(src_name, "r")
+    mm = np.memmap(raw_name, dtype=np.int16, mode="r", shape=shape)
+    #
+    ts = neurodata.create_timeseries("TimeSeries", "memmap", "acquisition")
+    ts.set_data(mm, "Volts", 1.0, 1.0)
+    ts.set_time(np.arange(shape[0]) * 0.001)
+    #
+    ts = neurodata.create_timeseries("TimeSeries", "copied", "acquisition")
+    ts.set_data(src["data"], "Volts", 1.0, 1.0, chunks=(1000, 3), compression="gzip")
+    ts.set_time(np.arange(shape[0]) * 0.001)
+    #
+    ts = neurodata.create_timeseries("TimeSeries", "policy", "acquisition")
+    ts.set_data(src["data"], "Volts", 1.0, 1.0)
+    ts.set_time(np.arange(shape[0]) * 0.001)
+    #
+    ts = neurodata.create_timeseries("TimeSeries", "custom", "acquisition")
+    ts.set_data(src["signal"], "Volts", 1.0, 1.0, compression="gzip", compression_opts=9, chunks=(1000,))
+    ts.set_time(np.arange(5000) * 0.001)
+    #
+    ts = neurodata.create_timeseries("TimeSeries", "converted", "acquisition")
+    ts.set_data(src["data"], "Volts", 1.0, 1.0, dtype='f8')
+    ts.set_time(np.arange(shape[0]) * 0.001)
+    neurodata.close()
+    src.close()
+
+test_external_data()
+print("%s PASSED" % __file__)
@@ -0,0 +1,100 @@
+#!/usr/bin/python
+import h5py
+import numpy as np
+import test_utils as ut
+import nwb
+
+# test memory-mapped reads of contiguous datasets
+# TESTS 'contiguous_bytes' stores large arrays without chunking
+# TESTS arrays with their own storage settings are unaffected
+# TESTS the size of arrays is that of the value, and chunked HDF5 sources
+#   are stored contiguously
+# TESTS NWBReader 'mmap' maps contiguous arrays and reads others normally
+
+def test_mmap():
+    if __file__.startswith("./"):
+        fname = "x" + __file__[3:-3] + ".nwb"
+    else:
+        fname = "x" + __file__[1:-3] + ".nwb"
+    data = np.random.random((5000, 4)).astype(np.float32)
+    t = np.arange(5000) * 0.001
+    settings = {}
+    settings["filename"] = fname
+    settings["identifier"] = nwb.create_identifier("mmap test")
+    settings["overwrite"] = True
+    settings["description"] = "Test file for memory-mapped reads"
+    settings["contiguous_bytes"] = 10000
+    neurodata = nwb.NWB(**settings)
+    ts = neurodata.create_timeseries("TimeSeries", "raw", "acquisition")
+    ts.set_data(data, "Volts", 1.0, 0.001)
+    ts.set_time(t)
+    ts = neurodata.create_timeseries("TimeSeries", "packed", "acquisition")
+    ts.set_data(data, "Volts", 1.0, 0.001, compression="gzip")
+    ts.set_time(t[:1000])
+    # 12000 bytes as float64 but 6000 as the specification's float32
+    ts = neurodata.create_timeseries("TimeSeries", "double", "acquisition")
+    ts.set_data(np.random.random(1500), "Volts", 1.0, 0.001)
+    ts.set_time(t[:1500])
+    neurodata.close()
+    f = h5py.File(fname, 'r')
+    if f["acquisition/timeseries/raw/data"].chunks is not None:
+        ut.error("Writing contiguous data", "Data is chunked")
+    if f["acquisition/timeseries/raw/timestamps"].chunks is not None:
+        ut.error("Writing contiguous data", "Timestamps are chunked")
+    if f["acquisition/timeseries/packed/data"].compression != "gzip":
+        ut.error("Writing contiguous data", "Storage settings of field ignored")
+    if f["acquisition/timeseries/packed/timestamps"].chunks is None:
+        ut.error("Writing contiguous data", "Small array not chunked")
+    if f["acquisition/timeseries/double/data"].chunks is not None:
+        ut.error("Writing contiguous data", "Size not taken from value")
+    f.close()
+    check_source_copy(fname)
+    reader = nwb.NWBReader(fname, mmap=True)
+    raw = reader.get_timeseries("/acquisition/timeseries/raw")
+    block = raw.data[100:200]
+    if not isinstance(block, np.memmap) or not np.array_equal(block, data[100:200]):
+        ut.error("Reading mapped data", "Data not read through memory map")
+    if not isinstance(raw.timestamps[:], np.memmap) or not np.array_equal(raw.timestamps[:], t):
+        ut.error("Reading mapped data", "Timestamps not read through memory map")
+    packed = reader.get_timeseries("/acquisition/timeseries/packed")
+    if packed.data.memmap() is not None:
+        ut.error("Reading compressed data", "Compressed data mapped")
+    if not np.array_equal(packed.data[100:200], data[100:200]):
+        ut.error("Reading compressed data", "Data incorrect")
+    d, w = raw.window(1.0, 1.5)
+    if not np.array_equal(d, data[1000:1501]):
+        ut.error("Reading mapped data", "Window incorrect")
+    reader.close()
+    # without 'mmap', arrays are read normally
+    reader = nwb.NWBReader(fname)
+    block = reader.get_timeseries("/acquisition/timeseries/raw").data[100:200]
+    if isinstance(block, np.memmap) or not np.array_equal(block, data[100:200]):
+        ut.error("Reading data", "Unexpected memory map")
+    reader.close()
+
+# copies the compressed data to another file. it's stored contiguously,
+#   not as a copy of the compressed dataset
+def check_source_copy(fname):
+    src = h5py.File(fname, 'r')
+    settings = {}
+    settings["filename"] = fname[:-4] + "2.nwb"
+    settings["identifier"] = nwb.create_identifier("mmap copy test")
+    settings["overwrite"] = True
+    settings["description"] = "Test file for copies of contiguous data"
+    settings["contiguous_bytes"] = 10000
+    neurodata = nwb.NWB(**settings)
+    ts = neurodata.create_timeseries("TimeSeries", "copy", "acquisition")
+    ts.set_data(src["acquisition/timeseries/packed/data"], "Volts", 1.0, 0.001)
+    ts.set_time(np.arange(5000) * 0.001)
+    neurodata.close()
+    f = h5py.File(settings["filename"], 'r')
+    dset = f["acquisition/timeseries/copy/data"]
+    if dset.chunks is not None or dset.compression is not None:
+        ut.error("Copying contiguous data", "Source layout kept")
+    if not np.array_equal(dset[()], src["acquisition/timeseries/packed/data"][()]):
+        ut.error("Copying contiguous data", "Data incorrect")
+    f.close()
+    src.close()
+
+test_mmap()
+print("%s PASSED" % __file__)
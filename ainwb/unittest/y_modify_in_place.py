@@ -0,0 +1,126 @@
+#!/usr/bin/python
+import os
+import h5py
+import numpy as np
+import test_utils as ut
+import nwb
+
+# test modifying an existing file in place, with journaled rollback
+# TESTS modify without copying file
+# TESTS rollback of changes from a session that didn't complete
+# TESTS rollback of intermediate groups
+# TESTS rollback when reopened with copy_on_modify
+# TESTS rollback on a TimeSeries error during the session
+
+def test_modify_in_place():
+    if __file__.startswith("./"):
+        fname = "x" + __file__[3:-3] + ".nwb"
+    else:
+        fname = "x" + __file__[1:-3] + ".nwb"
+    create_file(fname)
+    add_series(fname, "second")
+    ut.verify_timeseries(fname, "first", "acquisition/timeseries", "TimeSeries")
+    ut.verify_timeseries(fname, "second", "acquisition/timeseries", "TimeSeries")
+    if os.path.isfile(fname + ".tmp") or os.path.isfile(fname + ".journal"):
+        ut.error("Modifying in place", "Temporary file left behind")
+    f = h5py.File(fname, 'r')
+    num_dates = len(f["file_create_date"])
+    f.close()
+    if num_dates != 2:
+        ut.error("Modifying in place", "Expected 2 file dates, found %d" % num_dates)
+    # modify without closing, as if program had crashed
+    abandon_modification(fname, "third")
+    if not os.path.isfile(fname + ".journal"):
+        ut.error("Modifying in place", "Journal not written")
+    # reopening should roll back incomplete changes
+    neurodata = nwb.NWB(filename=fname, modify=True)
+    if "acquisition/timeseries/third" in neurodata.file_pointer:
+        ut.error("Rolling back changes", "Time series not removed")
+    neurodata.close()
+    ut.verify_absent(fname, "acquisition/timeseries", "third")
+    ut.verify_timeseries(fname, "second", "acquisition/timeseries", "TimeSeries")
+    f = h5py.File(fname, 'r')
+    num_dates = len(f["file_create_date"])
+    f.close()
+    # one date for the rolled-back session is removed and one is
+    #   added by the session that rolled it back
+    if num_dates != 3:
+        ut.error("Rolling back changes", "Expected 3 file dates, found %d" % num_dates)
+    if os.path.isfile(fname + ".journal"):
+        ut.error("Rolling back changes", "Journal not removed")
+    # each group created along a path is rolled back. reader leaves
+    #   the journal in place
+    abandon_modification(fname, "fourth", "/analysis/a/b")
+    nwb.NWBReader(fname).close()
+    if not os.path.isfile(fname + ".journal"):
+        ut.error("Reading modified file", "Journal removed by reader")
+    neurodata = nwb.NWB(filename=fname, modify=True, copy_on_modify=True)
+    neurodata.close()
+    ut.verify_absent(fname, "acquisition/timeseries", "fourth")
+    ut.verify_absent(fname, "analysis", "a")
+    if os.path.isfile(fname + ".journal"):
+        ut.error("Rolling back changes", "Journal not removed after copy")
+    check_error_rollback(fname)
+
+# a TimeSeries error in a session undoes the session's changes before
+#   exiting
+def check_error_rollback(fname):
+    before = file_contents(fname)
+    neurodata = nwb.NWB(filename=fname, modify=True)
+    neurodata.create_epoch("trial", 0.0, 0.05)
+    add_timeseries(neurodata, "fifth").finalize()
+    ts = neurodata.create_timeseries("TimeSeries", "bad", "acquisition")
+    ts.set_data(np.arange(100, dtype=np.float32), "Volts", 1.0, 0.001)
+    try:
+        ts.finalize()   # no timestamps
+        ut.error("Rolling back on error", "Missing timestamps not reported")
+    except SystemExit:
+        pass
+    if os.path.isfile(fname + ".journal"):
+        ut.error("Rolling back on error", "Journal not removed")
+    if file_contents(fname) != before:
+        ut.error("Rolling back on error", "File contents changed")
+
+# returns the objects in a file and its file dates
+def file_contents(fname):
+    f = h5py.File(fname, 'r')
+    names = []
+    f.visit(names.append)
+    dates = list(f["file_create_date"][()])
+    f.close()
+    return sorted(names), dates
+
+def create_file(fname):
+    settings = {}
+    settings["filename"] = fname
+    settings["identifier"] = nwb.create_identifier("modify in place test")
+    settings["overwrite"] = True
+    settings["description"] = "Test file modified in place"
+    neurodata = nwb.NWB(**settings)
+    add_timeseries(neurodata, "first")
+    neurodata.close()
+
+def add_series(fname, name):
+    neurodata = nwb.NWB(filename=fname, modify=True)
+    if os.path.isfile(fname + ".tmp"):
+        ut.error("Modifying in place", "File was copied")
+    add_timeseries(neurodata, name)
+    neurodata.close()
+
+def abandon_modification(fname, name, group=None):
+    neurodata = nwb.NWB(filename=fname, modify=True)
+    if group is not None:
+        neurodata.require_group_internal(group)
+    ts = add_timeseries(neurodata, name)
+    ts.finalize()
+    neurodata.file_pointer.close()
+    neurodata.journal.close()
+
+def add_timeseries(neurodata, name):
+    ts = neurodata.create_timeseries("TimeSeries", name, "acquisition")
+    ts.set_data(np.arange(100, dtype=np.float32), "Volts", 1.0, 0.001)
+    ts.set_time(np.arange(100) * 0.001)
+    return ts
+
+test_modify_in_place()
+print("%s PASSED" % __file__)
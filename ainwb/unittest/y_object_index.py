@@ -0,0 +1,101 @@
+#!/usr/bin/python
+import h5py
+import numpy as np
+import test_utils as ut
+import nwb
+
+# test the object index written when a file is closed
+# TESTS time series, modules, interfaces and epochs are listed
+# TESTS index is updated when a file is modified
+# TESTS index is rebuilt for modified files that don't have one
+# TESTS NWBReader lists time series from the index
+
+def test_object_index():
+    if __file__.startswith("./"):
+        fname = "x" + __file__[3:-3] + ".nwb"
+    else:
+        fname = "x" + __file__[1:-3] + ".nwb"
+    create_file(fname)
+    reader = nwb.NWBReader(fname)
+    index = reader.get_object_index()
+    rows = {}
+    for row in index:
+        rows[row["path"]] = row
+    expected = ["/acquisition/timeseries/stamped", "/epochs/trial", "/processing/mod", "/processing/mod/UnitTimes", "/stimulus/presentation/rated"]
+    if sorted(rows.keys()) != expected:
+        ut.error("Reading index", "Unexpected objects %s" % str(sorted(rows.keys())))
+    row = rows["/acquisition/timeseries/stamped"]
+    if row["neurodata_type"] != "TimeSeries" or row["ancestry"] != ["TimeSeries", "ElectricalSeries"]:
+        ut.error("Reading index", "Wrong type for time series")
+    if row["num_samples"] != 100 or row["shape"] != (100, 2) or row["dtype"] != "float32":
+        ut.error("Reading index", "Wrong size %s" % str(row))
+    if row["start_time"] != 0.1 or row["stop_time"] != 9.8:
+        ut.error("Reading index", "Wrong time range %s" % str(row))
+    row = rows["/stimulus/presentation/rated"]
+    if row["start_time"] != 1.0 or row["stop_time"] != 1.0 + 49 / 10.0:
+        ut.error("Reading index", "Wrong time range for rate series")
+    row = rows["/epochs/trial"]
+    if row["neurodata_type"] != "Epoch" or row["start_time"] != 2.0 or row["stop_time"] != 3.0:
+        ut.error("Reading index", "Wrong epoch entry")
+    if rows["/processing/mod/UnitTimes"]["ancestry"] != "UnitTimes":
+        ut.error("Reading index", "Wrong interface type")
+    paths = reader.timeseries_paths()
+    reader.close()
+    # listing from the index matches listing by walking the file
+    f = h5py.File(fname, 'a')
+    del f["object_index"]
+    f.close()
+    reader = nwb.NWBReader(fname)
+    if reader.get_object_index() is not None or reader.timeseries_paths() != paths:
+        ut.error("Listing time series", "Index and file contents differ")
+    reader.close()
+    # modifying a file without an index creates a complete one
+    add_series(fname, "added")
+    reader = nwb.NWBReader(fname)
+    found = [r["path"] for r in reader.get_object_index()]
+    if found != sorted(expected + ["/acquisition/timeseries/added"]):
+        ut.error("Modifying file", "Index not rebuilt %s" % str(found))
+    reader.close()
+    # modifying a file with an index adds to it
+    add_series(fname, "another")
+    reader = nwb.NWBReader(fname)
+    found = [r["path"] for r in reader.get_object_index()]
+    if found != sorted(expected + ["/acquisition/timeseries/added", "/acquisition/timeseries/another"]):
+        ut.error("Modifying file", "Index not updated %s" % str(found))
+    reader.close()
+
+def create_file(fname):
+    settings = {}
+    settings["filename"] = fname
+    settings["identifier"] = nwb.create_identifier("object index test")
+    settings["overwrite"] = True
+    settings["description"] = "Test file for the object index"
+    neurodata = nwb.NWB(**settings)
+    ts = neurodata.create_timeseries("ElectricalSeries", "stamped", "acquisition")
+    t = np.arange(100) * 0.1
+    t[0] = np.nan
+    t[-1] = np.nan
+    ts.set_data(np.zeros((100, 2), dtype=np.float32), "Volts", 1.0, 0.001)
+    ts.set_time(t)
+    ts.set_value("electrode_idx", [0, 1])
+    ts = neurodata.create_timeseries("TimeSeries", "rated", "stimulus")
+    ts.set_data(np.zeros(50), "Volts", 1.0, 0.001)
+    ts.set_time_by_rate(1.0, 10.0)
+    ts.set_value("num_samples", 50)
+    mod = neurodata.create_module("mod")
+    iface = mod.create_interface("UnitTimes")
+    iface.add_unit("unit", [1.0, 2.0], "a unit", "spike sorting")
+    iface.finalize()
+    mod.finalize()
+    neurodata.create_epoch("trial", 2.0, 3.0)
+    neurodata.close()
+
+def add_series(fname, name):
+    neurodata = nwb.NWB(filename=fname, modify=True)
+    ts = neurodata.create_timeseries("TimeSeries", name, "acquisition")
+    ts.set_data(np.zeros(10), "Volts", 1.0, 0.001)
+    ts.set_time(np.arange(10) * 0.1)
+    neurodata.close()
+
+test_object_index()
+print("%s PASSED" % __file__)
@@ -0,0 +1,78 @@
+#!/usr/bin/python
+import zlib
+import h5py
+import numpy as np
+import test_utils as ut
+import nwb
+from nwb import nwb as nwblib
+
+# test multi-threaded compression of large datasets
+# TESTS compression_threads file setting
+# TESTS data compressed in parallel is readable through the gzip filter
+# TESTS shuffle filter and partial edge chunks
+# TESTS each chunk is compressed by the threaded path, not the HDF5 filter
+
+# stands in for the zlib module used by the writer, counting the chunks
+#   it compresses
+class CountingZlib(object):
+    def __init__(self):
+        self.chunks = []
+
+    def compress(self, raw, level):
+        self.chunks.append(len(raw))
+        return zlib.compress(raw, level)
+
+def test_parallel_compression():
+    if __file__.startswith("./"):
+        fname = "x" + __file__[3:-3] + ".nwb"
+    else:
+        fname = "x" + __file__[1:-3] + ".nwb"
+    data = (np.arange(1500000, dtype=np.int32) % 1000).reshape(-1, 3)
+    counter = CountingZlib()
+    nwblib.zlib = counter
+    try:
+        create_series(fname, data)
+    finally:
+        nwblib.zlib = zlib
+    f = h5py.File(fname, 'r')
+    num_chunks = 0
+    for name in ["plain", "shuffled"]:
+        dset = f["acquisition/timeseries/" + name + "/data"]
+        grid = [(n + c - 1) // c for n, c in zip(dset.shape, dset.chunks)]
+        if dset.id.get_num_chunks() != int(np.prod(grid)):
+            ut.error("Checking compression", "Chunks missing in '%s'" % name)
+        num_chunks += dset.id.get_num_chunks()
+        if dset.compression != "gzip":
+            ut.error("Checking compression", "Expected gzip, found %s" % dset.compression)
+        if not np.array_equal(dset[()], data):
+            ut.error("Checking compressed data", "Data in '%s' does not match" % name)
+    if not f["acquisition/timeseries/shuffled/data"].shuffle:
+        ut.error("Checking shuffle", "Shuffle filter not enabled")
+    f.close()
+    if len(counter.chunks) != num_chunks:
+        ut.error("Checking parallel compression", "Expected %d chunks compressed in parallel, found %d" % (num_chunks, len(counter.chunks)))
+
+def create_series(fname, data):
+    settings = {}
+    settings["filename"] = fname
+    settings["identifier"] = nwb.create_identifier("parallel compression test")
+    settings["overwrite"] = True
+    settings["description"] = "Test file with parallel compression"
+    settings["compression_threads"] = 4
+    # use a chunk size that doesn't divide the data evenly
+    settings["chunk_bytes"] = 100000
+    neurodata = nwb.NWB(**settings)
+    #
+    ts = neurodata.create_timeseries("TimeSeries", "plain", "acquisition")
+    ts.set_data(data, "n/a", 1.0, 1.0)
+    ts.set_time_by_rate(0.0, 1000.0)
+    ts.set_value("num_samples", len(data))
+    #
+    ts = neurodata.create_timeseries("TimeSeries", "shuffled", "acquisition")
+    ts.set_data(data, "n/a", 1.0, 1.0, shuffle=True)
+    ts.set_time_by_rate(0.0, 1000.0)
+    ts.set_value("num_samples", len(data))
+    neurodata.close()
+
+test_parallel_compression()
+print("%s PASSED" % __file__)
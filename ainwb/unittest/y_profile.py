@@ -0,0 +1,76 @@
+#!/usr/bin/python
+import numpy as np
+import test_utils as ut
+import nwb
+from nwb.nwbco import *
+
+# test timing report produced by close()
+# TESTS profile=True and get_profile()
+# TESTS profile callback
+# TESTS datasets written by write_scalar()
+
+def test_profile():
+    if __file__.startswith("./"):
+        fname = "x" + __file__[3:-3] + ".nwb"
+    else:
+        fname = "x" + __file__[1:-3] + ".nwb"
+    phases = []
+    neurodata = create_file(fname, phases.append)
+    report = neurodata.get_profile()
+    names = [p["name"] for p in report["phases"]]
+    expected = ["finalize_timeseries", "timeseries_links", "finalize_epochs", "epoch_tags", "check_finalization", "write_metadata", "object_index", "close_file"]
+    if names != expected:
+        ut.error("Checking profile phases", "Unexpected phases %s" % str(names))
+    if [p["name"] for p in phases] != names:
+        ut.error("Checking profile callback", "Callback not called for each phase")
+    ts_phase = report["phases"][0]
+    paths = [obj["path"] for obj in ts_phase["objects"]]
+    if paths != ["/acquisition/timeseries/first", "/acquisition/timeseries/second"]:
+        ut.error("Checking profile objects", "Unexpected objects %s" % str(paths))
+    first = ts_phase["objects"][0]
+    if first["datasets"] < 3 or first["bytes"] < 4000 + 8000:
+        ut.error("Checking profile objects", "Data not counted for time series")
+    if ts_phase["datasets"] != sum(obj["datasets"] for obj in ts_phase["objects"]):
+        ut.error("Checking profile objects", "Object datasets don't match phase")
+    ep_phase = report["phases"][2]
+    if len(ep_phase["objects"]) != 1 or ep_phase["objects"][0]["path"] != "/epochs/trial":
+        ut.error("Checking profile objects", "Epoch not recorded")
+    # epoch indices are written with write_scalar()
+    if ep_phase["objects"][0]["datasets"] != 5 or ep_phase["objects"][0]["stored_bytes"] < 8:
+        ut.error("Checking profile objects", "Epoch datasets not counted")
+    if report["phases"][5]["datasets"] == 0:
+        ut.error("Checking profile phases", "Metadata not counted")
+    if report["datasets"] != sum(p["datasets"] for p in report["phases"]):
+        ut.error("Checking profile totals", "Total doesn't match phases")
+    # profiling is off by default
+    neurodata = create_file(fname, None)
+    if len(neurodata.get_profile()["phases"]) != 0:
+        ut.error("Checking profile", "Profile recorded when not requested")
+
+def create_file(fname, callback):
+    settings = {}
+    settings["filename"] = fname
+    settings["identifier"] = nwb.create_identifier("profile test")
+    settings["overwrite"] = True
+    settings["description"] = "Test file for close() profiling"
+    if callback is not None:
+        settings["profile"] = callback
+    neurodata = nwb.NWB(**settings)
+    neurodata.set_metadata(EXPERIMENTER, "test experimenter")
+    for name in ["first", "second"]:
+        ts = neurodata.create_timeseries("TimeSeries", name, "acquisition")
+        ts.set_data(np.zeros(1000, dtype=np.float32), "Volts", 1.0, 0.001)
+        ts.set_time(np.arange(1000) * 0.001)
+    epoch = neurodata.create_epoch("trial", 0.1, 0.2)
+    epoch.add_tag("test")
+    # finalized before close(), so it can be added to the epoch
+    ts = neurodata.create_timeseries("TimeSeries", "stim", "stimulus")
+    ts.set_data(np.zeros(100, dtype=np.float32), "Volts", 1.0, 0.001)
+    ts.set_time(np.arange(100) * 0.01)
+    ts.finalize()
+    epoch.add_timeseries("stim", ts)
+    neurodata.close()
+    return neurodata
+
+test_profile()
+print("%s PASSED" % __file__)
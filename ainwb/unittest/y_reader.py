@@ -0,0 +1,103 @@
+#!/usr/bin/python
+import numpy as np
+import test_utils as ut
+import nwb
+
+# test reading an existing file through NWBReader
+# TESTS time series, modules, interfaces and epochs
+# TESTS lazy arrays and calculated timestamps
+# TESTS specification is only loaded when needed
+
+def test_reader():
+    if __file__.startswith("./"):
+        fname = "x" + __file__[3:-3] + ".nwb"
+    else:
+        fname = "x" + __file__[1:-3] + ".nwb"
+    create_file(fname)
+    f = nwb.NWBReader(fname)
+    if f.spec is not None:
+        ut.error("Opening file", "Specification loaded on open")
+    if f.session_description != "Test file for NWBReader":
+        ut.error("Reading file", "Wrong description '%s'" % f.session_description)
+    paths = f.timeseries_paths()
+    expected = ["/acquisition/timeseries/voltage", "/stimulus/presentation/stim", "/processing/mod/LFP/lfp"]
+    if paths != expected:
+        ut.error("Listing time series", "Found %s" % str(paths))
+    if f.timeseries_paths("stimulus") != ["/stimulus/presentation/stim"]:
+        ut.error("Listing time series", "Wrong stimulus list")
+    ts = f.get_timeseries("acquisition/timeseries/voltage")
+    if ts.ancestry != ["TimeSeries", "ElectricalSeries"] or ts.ts_type != "ElectricalSeries":
+        ut.error("Reading time series", "Wrong ancestry %s" % str(ts.ancestry))
+    if ts.description != "voltage trace":
+        ut.error("Reading time series", "Wrong description")
+    if ts.data.shape != (1000, 2) or not np.array_equal(ts.data[10:20], np.arange(20, 40).reshape(10, 2)):
+        ut.error("Reading time series", "Data slice incorrect")
+    if not np.array_equal(ts.timestamps[-5:], np.arange(995, 1000) * 0.01):
+        ut.error("Reading time series", "Timestamps incorrect")
+    if ts.data.attrs()["unit"] != "Volts":
+        ut.error("Reading time series", "Data unit incorrect")
+    if ts.fields()[:3] != ["data", "num_samples", "timestamps"] or "electrode_idx" not in ts.fields():
+        ut.error("Reading time series", "Fields %s" % str(ts.fields()))
+    if f.spec is None or "electrode_idx" not in ts.spec:
+        ut.error("Reading time series", "Specification not used")
+    stim = f.get_timeseries("/stimulus/presentation/stim")
+    t = 2.5 + np.arange(500) / 30.0
+    if not np.array_equal(stim.timestamps[:], t) or stim.timestamps[-1] != t[-1]:
+        ut.error("Reading time series", "Calculated timestamps incorrect")
+    if not np.array_equal(stim.timestamps[100:200:7], t[100:200:7]):
+        ut.error("Reading time series", "Calculated timestamp slice incorrect")
+    mod = f.get_module("mod")
+    if f.module_names() != ["mod"] or mod.interface_names() != ["LFP", "UnitTimes"]:
+        ut.error("Reading module", "Wrong interfaces")
+    units = mod.get_interface("UnitTimes")
+    if list(units.get_value("unit_list")) != ["unit_1"]:
+        ut.error("Reading interface", "Wrong unit list")
+    if not np.array_equal(units.get_value("unit_1/times"), [0.5, 1.5]):
+        ut.error("Reading interface", "Wrong unit times")
+    if mod.get_interface("LFP").timeseries()[0].path != "/processing/mod/LFP/lfp":
+        ut.error("Reading interface", "Time series not found")
+    ep = f.get_epoch("trial")
+    if ep.start_time != 1.0 or ep.stop_time != 2.0 or ep.tags != ["good"]:
+        ut.error("Reading epoch", "Wrong times or tags")
+    if ep.timeseries_names() != ["voltage"] or ep.get_overlap("voltage") != (100, 101):
+        ut.error("Reading epoch", "Wrong overlap")
+    if ep.get_timeseries("voltage").path != "/acquisition/timeseries/voltage":
+        ut.error("Reading epoch", "Wrong time series path")
+    f.close()
+
+def create_file(fname):
+    settings = {}
+    settings["filename"] = fname
+    settings["identifier"] = nwb.create_identifier("reader test")
+    settings["overwrite"] = True
+    settings["description"] = "Test file for NWBReader"
+    neurodata = nwb.NWB(**settings)
+    ts = neurodata.create_timeseries("ElectricalSeries", "voltage", "acquisition")
+    ts.set_description("voltage trace")
+    ts.set_data(np.arange(2000).reshape(1000, 2), "Volts", 1.0, 0.001)
+    ts.set_time(np.arange(1000) * 0.01)
+    ts.set_value("electrode_idx", [0, 1])
+    ts.finalize()
+    stim = neurodata.create_timeseries("TimeSeries", "stim", "stimulus")
+    stim.set_data(np.zeros(500), "Volts", 1.0, 0.001)
+    stim.set_time_by_rate(2.5, 30.0)
+    stim.set_value("num_samples", 500)
+    mod = neurodata.create_module("mod")
+    iface = mod.create_interface("UnitTimes")
+    iface.add_unit("unit_1", [0.5, 1.5], "a unit", "spike sorting")
+    iface.finalize()
+    lfp_iface = mod.create_interface("LFP")
+    lfp = neurodata.create_timeseries("ElectricalSeries", "lfp", "other")
+    lfp.set_data(np.zeros((10, 2)), "Volts", 1.0, 0.001)
+    lfp.set_time(np.arange(10) * 0.1)
+    lfp.set_value("electrode_idx", [0, 1])
+    lfp_iface.add_timeseries(lfp)
+    lfp_iface.finalize()
+    mod.finalize()
+    ep = neurodata.create_epoch("trial", 1.0, 2.0)
+    ep.add_tag("good")
+    ep.add_timeseries("voltage", ts)
+    neurodata.close()
+
+test_reader()
+print("%s PASSED" % __file__)
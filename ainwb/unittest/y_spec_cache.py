@@ -0,0 +1,62 @@
+#!/usr/bin/python
+import os
+import json
+import time
+import test_utils as ut
+import nwb
+from nwb import nwb as nwb_kernel
+
+# test caching of the merged format specification
+# TESTS spec is shared between files and copied for each
+# TESTS spec is reloaded when a custom spec file changes
+
+def test_spec_cache():
+    if __file__.startswith("./"):
+        fname = "x" + __file__[3:-3] + ".nwb"
+    else:
+        fname = "x" + __file__[1:-3] + ".nwb"
+    nwb.preload_spec()
+    if "[]" not in nwb_kernel.spec_cache:
+        ut.error("Preloading spec", "Spec not cached")
+    first = create_file(fname)
+    second = create_file(fname)
+    if first.spec is second.spec or first.spec["General"] is second.spec["General"]:
+        ut.error("Loading cached spec", "Spec shared between files")
+    if first.spec != second.spec:
+        ut.error("Loading cached spec", "Cached spec differs")
+    # custom spec changes should be seen by new files
+    custom = os.path.abspath(fname + ".json")
+    write_custom_spec(custom, "first value")
+    f = create_file(fname, custom)
+    check_custom_value(f, "first value")
+    write_custom_spec(custom, "second value")
+    # make sure modification time changes
+    mtime = os.path.getmtime(custom) + 10
+    os.utime(custom, (mtime, mtime))
+    f = create_file(fname, custom)
+    check_custom_value(f, "second value")
+    os.remove(custom)
+
+def create_file(fname, custom_spec=None):
+    settings = {}
+    settings["filename"] = fname
+    settings["identifier"] = nwb.create_identifier("spec cache test")
+    settings["overwrite"] = True
+    settings["description"] = "Test file for spec cache"
+    if custom_spec is not None:
+        settings["custom_spec"] = custom_spec
+    neurodata = nwb.NWB(**settings)
+    neurodata.close()
+    return neurodata
+
+def write_custom_spec(fname, value):
+    spec = { "General": { "custom_field": { "_datatype": "str", "_description": value } } }
+    with open(fname, "w") as f:
+        json.dump(spec, f)
+
+def check_custom_value(neurodata, value):
+    if neurodata.spec["General"]["custom_field"]["_description"] != value:
+        ut.error("Loading custom spec", "Expected '%s'" % value)
+
+test_spec_cache()
+print("%s PASSED" % __file__)
@@ -0,0 +1,48 @@
+#!/usr/bin/python
+import copy
+import numpy as np
+import test_utils as ut
+import nwb
+
+# test that objects don't share specification data
+# TESTS changes to one time series don't affect another or the file spec
+# TESTS copy-on-write spec copies
+
+def test_spec_overlay():
+    if __file__.startswith("./"):
+        fname = "x" + __file__[3:-3] + ".nwb"
+    else:
+        fname = "x" + __file__[1:-3] + ".nwb"
+    settings = {}
+    settings["filename"] = fname
+    settings["identifier"] = nwb.create_identifier("spec overlay test")
+    settings["overwrite"] = True
+    settings["description"] = "Test file for spec overlays"
+    neurodata = nwb.NWB(**settings)
+    master = copy.deepcopy(dict(neurodata.spec["TimeSeries"]["TimeSeries"]))
+    first = neurodata.create_timeseries("TimeSeries", "first", "acquisition")
+    second = neurodata.create_timeseries("TimeSeries", "second", "acquisition")
+    first.set_description("first series")
+    first.set_value("custom", "value")
+    if second.spec["_attributes"]["description"]["_value"] != "":
+        ut.error("Setting value", "Value visible in second series")
+    if "custom" in second.spec:
+        ut.error("Setting custom value", "Value visible in second series")
+    if neurodata.spec["TimeSeries"]["TimeSeries"] != master:
+        ut.error("Setting value", "File specification changed")
+    # copies of modified spec are independent
+    dup = copy.deepcopy(first.spec)
+    dup["_attributes"]["description"]["_value"] = "copy"
+    if first.spec["_attributes"]["description"]["_value"] != "first series":
+        ut.error("Copying spec", "Change to copy visible in original")
+    for ts in [first, second]:
+        ts.set_data(np.zeros(10), "Volts", 1.0, 0.001)
+        ts.set_time(np.arange(10) * 0.001)
+    neurodata.close()
+    ut.verify_timeseries(fname, "first", "acquisition/timeseries", "TimeSeries")
+    ut.verify_timeseries(fname, "second", "acquisition/timeseries", "TimeSeries")
+    ut.verify_present(fname, "acquisition/timeseries/first/", "custom")
+    ut.verify_absent(fname, "acquisition/timeseries/second/", "custom")
+
+test_spec_overlay()
+print("%s PASSED" % __file__)
@@ -0,0 +1,94 @@
+#!/usr/bin/python
+import h5py
+import numpy as np
+import test_utils as ut
+import nwb
+
+# test chunking and compression settings
+# TESTS file-level compression policy
+# TESTS per-field storage settings in set_data()
+# TESTS storage log
+# TESTS per-field filter that differs from the file policy
+
+def test_storage_options():
+    if __file__.startswith("./"):
+        fname = "x" + __file__[3:-3] + ".nwb"
+    else:
+        fname = "x" + __file__[1:-3] + ".nwb"
+    log = create_series(fname)
+    f = h5py.File(fname, 'r')
+    dset = f["acquisition/timeseries/default/data"]
+    if dset.compression != "lzf":
+        ut.error("Checking file policy", "Expected lzf, found %s" % dset.compression)
+    dset = f["acquisition/timeseries/custom/data"]
+    if dset.compression != "gzip" or dset.compression_opts != 1:
+        ut.error("Checking field settings", "Expected gzip level 1")
+    if not dset.shuffle or dset.chunks != (100,):
+        ut.error("Checking field settings", "Shuffle or chunks not applied")
+    dset = f["acquisition/timeseries/raw/data"]
+    if dset.compression is not None or dset.chunks is not None:
+        ut.error("Checking field settings", "Expected contiguous, uncompressed data")
+    f.close()
+    paths = [entry["path"] for entry in log]
+    if "/acquisition/timeseries/custom/data" not in paths:
+        ut.error("Checking storage log", "Dataset not recorded")
+    for entry in log:
+        if entry["path"] == "/acquisition/timeseries/custom/data":
+            if entry["compression"] != "gzip" or entry["bytes"] != 4000:
+                ut.error("Checking storage log", "Incorrect record %s" % entry)
+    # gzip level from the file policy isn't passed to another filter
+    create_override(fname)
+    f = h5py.File(fname, 'r')
+    dset = f["acquisition/timeseries/override/data"]
+    if dset.compression != "lzf":
+        ut.error("Checking filter override", "Expected lzf, found %s" % dset.compression)
+    dset = f["acquisition/timeseries/default/data"]
+    if dset.compression != "gzip" or dset.compression_opts != 4:
+        ut.error("Checking filter override", "File policy not used for other fields")
+    f.close()
+
+def create_series(fname):
+    settings = {}
+    settings["filename"] = fname
+    settings["identifier"] = nwb.create_identifier("storage test")
+    settings["overwrite"] = True
+    settings["description"] = "Test file with storage settings"
+    settings["compression"] = "lzf"
+    neurodata = nwb.NWB(**settings)
+    data = np.arange(1000, dtype=np.int32)
+    t = np.arange(1000) * 0.001
+    #
+    ts = neurodata.create_timeseries("TimeSeries", "default", "acquisition")
+    ts.set_data(data, "Volts", 1.0, 0.001)
+    ts.set_time(t)
+    #
+    ts = neurodata.create_timeseries("TimeSeries", "custom", "acquisition")
+    ts.set_data(data, "Volts", 1.0, 0.001, compression="gzip", compression_opts=1, shuffle=True, chunks=(100,))
+    ts.set_time(t)
+    #
+    ts = neurodata.create_timeseries("TimeSeries", "raw", "acquisition")
+    ts.set_data(data, "Volts", 1.0, 0.001, compression="none")
+    ts.set_time(t)
+    neurodata.close()
+    return neurodata.get_storage_log()
+
+def create_override(fname):
+    settings = {}
+    settings["filename"] = fname
+    settings["identifier"] = nwb.create_identifier("storage override test")
+    settings["overwrite"] = True
+    settings["description"] = "Test file with a per-field compression filter"
+    settings["compression"] = "gzip"
+    neurodata = nwb.NWB(**settings)
+    data = np.arange(1000, dtype=np.int32)
+    t = np.arange(1000) * 0.001
+    ts = neurodata.create_timeseries("TimeSeries", "default", "acquisition")
+    ts.set_data(data, "Volts", 1.0, 0.001)
+    ts.set_time(t)
+    ts = neurodata.create_timeseries("TimeSeries", "override", "acquisition")
+    ts.set_data(data, "Volts", 1.0, 0.001, compression="lzf")
+    ts.set_time(t)
+    neurodata.close()
+
+test_storage_options()
+print("%s PASSED" % __file__)
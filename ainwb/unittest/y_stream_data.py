@@ -0,0 +1,74 @@
+#!/usr/bin/python
+import h5py
+import numpy as np
+import test_utils as ut
+import nwb
+
+# test incremental writing of time series data
+# TESTS TimeSeries.append_data()
+# TESTS TimeSeries.append_time()
+# TESTS automatic calculation of num_samples for streamed data
+# TESTS streamed data following time series into an interface
+
+def test_stream_data():
+    if __file__.startswith("./"):
+        fname = "x" + __file__[3:-3] + ".nwb"
+    else:
+        fname = "x" + __file__[1:-3] + ".nwb"
+    name = "stream"
+    create_streamed_series(fname, name)
+    ut.verify_timeseries(fname, name, "acquisition/timeseries", "TimeSeries")
+    ut.verify_timeseries(fname, name, "acquisition/timeseries", "ElectricalSeries")
+    ut.verify_timeseries(fname, name, "processing/mod/LFP", "TimeSeries")
+    f = h5py.File(fname, 'r')
+    ts = f["acquisition/timeseries/" + name]
+    data = ts["data"][()]
+    t = ts["timestamps"][()]
+    if data.shape != (100, 4):
+        ut.error("Checking streamed data", "Unexpected shape %s" % str(data.shape))
+    if not np.all(data[:, 0] == np.arange(100)):
+        ut.error("Checking streamed data", "Data values incorrect")
+    if not np.allclose(t, np.arange(100) * 0.001):
+        ut.error("Checking streamed timestamps", "Timestamp values incorrect")
+    if ts["num_samples"][()] != 100:
+        ut.error("Checking num_samples", "Expected 100, found %d" % ts["num_samples"][()])
+    if not ut.strcmp(ts["data"].attrs["unit"], "Volts"):
+        ut.error("Checking data attributes", "Unit not stored")
+    lfp = f["processing/mod/LFP/" + name]
+    if lfp["num_samples"][()] != 50:
+        ut.error("Checking num_samples", "Expected 50, found %d" % lfp["num_samples"][()])
+    if "starting_time" not in lfp:
+        ut.error("Checking starting time", "starting_time missing")
+    f.close()
+
+def create_streamed_series(fname, name):
+    settings = {}
+    settings["filename"] = fname
+    settings["identifier"] = nwb.create_identifier("stream test")
+    settings["overwrite"] = True
+    settings["description"] = "Test file with streamed data"
+    neurodata = nwb.NWB(**settings)
+    #
+    ts = neurodata.create_timeseries("ElectricalSeries", name, "acquisition")
+    ts.set_value("electrode_idx", [0, 1, 2, 3])
+    for i in range(10):
+        block = np.zeros((10, 4)) + np.arange(i*10, (i+1)*10).reshape(10, 1)
+        ts.append_data(block, "Volts", 1.0, 0.001)
+        ts.append_time(np.arange(i*10, (i+1)*10) * 0.001)
+    ts.finalize()
+    # stream data before the time series is placed in an interface
+    lfp_ts = neurodata.create_timeseries("ElectricalSeries", name)
+    lfp_ts.set_path("/processing/staging/")
+    lfp_ts.set_value("electrode_idx", [0, 1])
+    for i in range(5):
+        lfp_ts.append_data(np.zeros((10, 2)), "Volts", 1.0, 0.001)
+    lfp_ts.set_time_by_rate(0.0, 1000.0)
+    mod = neurodata.create_module("mod")
+    iface = mod.create_interface("LFP")
+    iface.add_timeseries(lfp_ts)
+    iface.finalize()
+    mod.finalize()
+    neurodata.close()
+
+test_stream_data()
+print("%s PASSED" % __file__)
@@ -0,0 +1,44 @@
+#!/usr/bin/python
+import h5py
+import test_utils as ut
+import nwb
+
+# test storage of text arrays
+# TESTS fixed-length text arrays
+# TESTS variable-length text arrays (text_storage='vlen')
+
+def test_text_storage():
+    if __file__.startswith("./"):
+        fname = "x" + __file__[3:-3] + ".nwb"
+    else:
+        fname = "x" + __file__[1:-3] + ".nwb"
+    annot = ["short", "a much longer annotation " * 20, "x"]
+    for storage in ["fixed", "vlen"]:
+        create_annotations(fname, annot, storage)
+        ut.verify_timeseries(fname, "annot", "acquisition/timeseries", "AnnotationSeries")
+        f = h5py.File(fname, 'r')
+        dset = f["acquisition/timeseries/annot/data"]
+        vlen = h5py.check_dtype(vlen=dset.dtype) is not None
+        if vlen != (storage == "vlen"):
+            ut.error("Checking text storage", "Unexpected dtype %s for '%s'" % (dset.dtype, storage))
+        vals = dset[()]
+        for i in range(len(annot)):
+            if not ut.strcmp(vals[i], annot[i]):
+                ut.error("Checking text storage", "Entry %d does not match" % i)
+        f.close()
+
+def create_annotations(fname, annot, storage):
+    settings = {}
+    settings["filename"] = fname
+    settings["identifier"] = nwb.create_identifier("text storage test")
+    settings["overwrite"] = True
+    settings["description"] = "Test file with text arrays"
+    settings["text_storage"] = storage
+    neurodata = nwb.NWB(**settings)
+    ts = neurodata.create_timeseries("AnnotationSeries", "annot", "acquisition")
+    for i in range(len(annot)):
+        ts.add_annotation(annot[i], float(i))
+    neurodata.close()
+
+test_text_storage()
+print("%s PASSED" % __file__)
@@ -0,0 +1,94 @@
+#!/usr/bin/python
+import numpy as np
+import test_utils as ut
+import nwb
+from nwb import nwbep
+
+# test indexes of timestamps used to find epoch overlaps
+# TESTS sorted, block and search indexes give the same overlaps
+# TESTS search of several intervals without an index
+# TESTS search without an index for the first queries
+# TESTS index cache hits, misses and memory limit
+
+def test_timestamp_index():
+    t = np.arange(5000) * 0.01
+    t[1000:1500] = np.nan   # gap spanning blocks
+    t[4000:4096] = np.nan   # gap filling a block
+    t[4990:] = np.nan
+    starts = np.sort(np.random.random(300) * 55.0 - 2.0)
+    stops = starts + np.random.random(300) * 8.0
+    starts = np.concatenate([starts, t[[0, 999, 1500, 3999, 4989]], [9.995, 40.5]])
+    stops = np.concatenate([stops, t[[0, 999, 1500, 3999, 4989]], [14.995, 40.9]])
+    for max_bytes, kind in [(1 << 20, "sorted"), (40000, "block"), (30000, "block"), (100, "search")]:
+        index = nwbep.TimestampIndex(t, max_bytes, 512)
+        if index.kind != kind:
+            ut.error("Building index", "Expected %s index, found %s" % (kind, index.kind))
+        if index.nbytes > max_bytes:
+            ut.error("Building index", "Index larger than limit")
+        i0, i1 = index.find_overlaps(starts, stops)
+        for k in range(len(starts)):
+            ok = np.flatnonzero(~np.isnan(t) & (t >= starts[k]) & (t <= stops[k]))
+            expected = (-1, -1)
+            if len(ok) > 0:
+                expected = (ok[0], ok[-1])
+            if (i0[k], i1[k]) != expected:
+                ut.error("Checking %s index" % kind, "Interval %g-%g: expected %s, found %s" % (starts[k], stops[k], str(expected), str((i0[k], i1[k]))))
+            a, b = index.find_overlap(starts[k], stops[k])
+            if a is None:
+                a, b = -1, -1
+            if (a, b) != expected:
+                ut.error("Checking %s index" % kind, "Single overlap differs for %g-%g" % (starts[k], stops[k]))
+    # search without an index
+    i0, i1 = nwbep.find_overlaps(t, starts, stops, 512)
+    j0, j1 = nwbep.TimestampIndex(t, 1 << 20).find_overlaps(starts, stops)
+    if not np.array_equal(i0, j0) or not np.array_equal(i1, j1):
+        ut.error("Checking search", "Overlaps differ from index")
+
+def test_timestamp_cache():
+    if __file__.startswith("./"):
+        fname = "x" + __file__[3:-3] + ".nwb"
+    else:
+        fname = "x" + __file__[1:-3] + ".nwb"
+    settings = {}
+    settings["filename"] = fname
+    settings["identifier"] = nwb.create_identifier("timestamp index test")
+    settings["overwrite"] = True
+    settings["description"] = "Test file for timestamp index cache"
+    # room for one index at a time
+    settings["timestamp_cache"] = 12000
+    neurodata = nwb.NWB(**settings)
+    series = []
+    for name in ["first", "second"]:
+        ts = neurodata.create_timeseries("TimeSeries", name, "acquisition")
+        ts.set_data(np.zeros(1000), "Volts", 1.0, 0.001)
+        ts.set_time(np.arange(1000) * 0.01)
+        ts.finalize()
+        series.append(ts)
+    # the index is built after a number of searches
+    searches = nwb.nwb.TIMESTAMP_INDEX_QUERIES
+    for i in range(searches + 4):
+        ep = neurodata.create_epoch("ep%d" % i, i * 0.5, i * 0.5 + 0.2)
+        ep.add_timeseries("first", series[0])
+    info = neurodata.get_timestamp_cache_info()
+    if info["searches"] != searches or info["misses"] != 1 or info["hits"] != 3 or info["entries"] != 1:
+        ut.error("Checking cache", "Unexpected statistics %s" % str(info))
+    # many epochs at once use an index
+    names = ["bulk%d" % i for i in range(searches + 1)]
+    starts = np.arange(searches + 1) * 0.5
+    neurodata.create_epochs(names, starts, starts + 0.2, [series[1]])
+    info = neurodata.get_timestamp_cache_info()
+    if info["evictions"] != 1 or info["entries"] != 1 or info["bytes"] > info["max_bytes"]:
+        ut.error("Checking cache", "Index not evicted %s" % str(info))
+    neurodata.create_epochs(["last"], [2.0], [3.0], [series[1]])
+    info = neurodata.get_timestamp_cache_info()
+    if info["hits"] != 4 or info["searches"] != searches:
+        ut.error("Checking cache", "Index not used by create_epochs")
+    neurodata.close()
+    ut.verify_present(fname, "epochs/ep%d/" % (searches + 3), "first")
+    ut.verify_present(fname, "epochs/ep0/", "first")
+    ut.verify_present(fname, "epochs/bulk3/", "second")
+    ut.verify_present(fname, "epochs/last/", "second")
+
+test_timestamp_index()
+test_timestamp_cache()
+print("%s PASSED" % __file__)
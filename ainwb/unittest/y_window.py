@@ -0,0 +1,92 @@
+#!/usr/bin/python
+import numpy as np
+import test_utils as ut
+import nwb
+
+# test reading a time window of a time series
+# TESTS windows of series with timestamps, including NaN gaps
+# TESTS windows of series with a sampling rate
+# TESTS windows that don't overlap the series
+# TESTS empty windows of text series, and windows of series without data
+
+def test_window():
+    if __file__.startswith("./"):
+        fname = "x" + __file__[3:-3] + ".nwb"
+    else:
+        fname = "x" + __file__[1:-3] + ".nwb"
+    t = np.arange(20000) * 0.001
+    t[5000:5100] = np.nan
+    data = np.arange(40000).reshape(20000, 2)
+    create_file(fname, t, data)
+    f = nwb.NWBReader(fname)
+    stamped = f.get_timeseries("/acquisition/timeseries/stamped")
+    rated = f.get_timeseries("/acquisition/timeseries/rated")
+    rate_t = 1.0 + np.arange(20000) / 250.0
+    windows = [(4.95, 5.15), (5.02, 5.08), (-1.0, 0.0), (19.999, 30.0), (30.0, 40.0), (-5.0, -1.0)]
+    for i in range(50):
+        windows.append(tuple(np.sort(np.random.random(2) * 22.0 - 1.0)))
+    for a, b in windows:
+        check_window(stamped, t, data, a, b)
+        check_window(rated, rate_t, data, a, b)
+    check_text_window(f)
+    check_no_data_window(f)
+    f.close()
+
+def check_text_window(f):
+    ts = f.get_timeseries("/acquisition/timeseries/text")
+    d, w = ts.window(0.5, 0.7)
+    if list(d) != ["b"] or d.dtype != object:
+        ut.error("Checking window of text", "Expected decoded text")
+    d, w = ts.window(10.0, 20.0)
+    if d.shape != (0,) or d.dtype != object or len(w) != 0:
+        ut.error("Checking window of text", "Empty window should have decoded type")
+
+def check_no_data_window(f):
+    ts = f.get_timeseries("/acquisition/timeseries/no_data")
+    d, w = ts.window(2.0, 3.0)
+    if d is not None or not np.allclose(w, 2.0 + np.arange(11) * 0.1):
+        ut.error("Checking window of no_data", "Wrong window of series without data")
+    d, w = ts.window(30.0, 40.0)
+    if d is not None or len(w) != 0:
+        ut.error("Checking window of no_data", "Window should be empty")
+
+def check_window(ts, t, data, a, b):
+    ok = np.flatnonzero(~np.isnan(t) & (t >= a) & (t <= b))
+    d, w = ts.window(a, b)
+    if len(ok) == 0:
+        if d.shape != (0, 2) or len(w) != 0:
+            ut.error("Checking window of " + ts.name, "Window %g-%g should be empty" % (a, b))
+        return
+    i0, i1 = ok[0], ok[-1]
+    if ts.window_indices(a, b) != (i0, i1):
+        ut.error("Checking window of " + ts.name, "Window %g-%g: wrong indices" % (a, b))
+    if not np.array_equal(d, data[i0:i1+1]):
+        ut.error("Checking window of " + ts.name, "Window %g-%g: wrong data" % (a, b))
+    if not np.array_equal(w, t[i0:i1+1], equal_nan=True):
+        ut.error("Checking window of " + ts.name, "Window %g-%g: wrong timestamps" % (a, b))
+
+def create_file(fname, t, data):
+    settings = {}
+    settings["filename"] = fname
+    settings["identifier"] = nwb.create_identifier("window test")
+    settings["overwrite"] = True
+    settings["description"] = "Test file for time windows"
+    neurodata = nwb.NWB(**settings)
+    ts = neurodata.create_timeseries("TimeSeries", "stamped", "acquisition")
+    ts.set_data(data, "Volts", 1.0, 0.001)
+    ts.set_time(t)
+    ts = neurodata.create_timeseries("TimeSeries", "rated", "acquisition")
+    ts.set_data(data, "Volts", 1.0, 0.001)
+    ts.set_time_by_rate(1.0, 250.0)
+    ts.set_value("num_samples", len(data))
+    ts = neurodata.create_timeseries("TimeSeries", "text", "acquisition")
+    ts.set_data(["a", "b", "c"], "n/a", 1.0, 1.0)
+    ts.set_time([0.0, 0.6, 1.2])
+    ts = neurodata.create_timeseries("TimeSeries", "no_data", "acquisition")
+    ts.ignore_data()
+    ts.set_time_by_rate(0.0, 10.0)
+    ts.set_value("num_samples", 100)
+    neurodata.close()
+
+test_window()
+print("%s PASSED" % __file__)
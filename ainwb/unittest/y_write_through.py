@@ -0,0 +1,64 @@
+#!/usr/bin/python
+import h5py
+import numpy as np
+import test_utils as ut
+import nwb
+
+# test writing time series data to disk when it's set
+# TESTS write_through file setting
+# TESTS set_data(flush=True) on time series whose path is set later
+
+def test_write_through():
+    if __file__.startswith("./"):
+        fname = "x" + __file__[3:-3] + ".nwb"
+    else:
+        fname = "x" + __file__[1:-3] + ".nwb"
+    create_write_through_series(fname)
+    ut.verify_timeseries(fname, "wt", "acquisition/timeseries", "TimeSeries")
+    ut.verify_timeseries(fname, "flushed", "processing/mod/LFP", "TimeSeries")
+    f = h5py.File(fname, 'r')
+    ts = f["acquisition/timeseries/wt"]
+    if not np.allclose(ts["data"][()], np.arange(1000)):
+        ut.error("Checking written data", "Data values incorrect")
+    if ts["num_samples"][()] != 1000:
+        ut.error("Checking num_samples", "Expected 1000, found %d" % ts["num_samples"][()])
+    if not ut.strcmp(ts["data"].attrs["unit"], "Volts"):
+        ut.error("Checking data attributes", "Unit not stored")
+    lfp = f["processing/mod/LFP/flushed"]
+    if lfp["data"].shape != (200, 2):
+        ut.error("Checking flushed data", "Unexpected shape %s" % str(lfp["data"].shape))
+    f.close()
+
+def create_write_through_series(fname):
+    settings = {}
+    settings["filename"] = fname
+    settings["identifier"] = nwb.create_identifier("write-through test")
+    settings["overwrite"] = True
+    settings["description"] = "Test file with write-through data"
+    settings["write_through"] = True
+    neurodata = nwb.NWB(**settings)
+    #
+    ts = neurodata.create_timeseries("TimeSeries", "wt", "acquisition")
+    ts.set_data(np.arange(1000, dtype=np.float32), "Volts", 1.0, 0.001)
+    ts.set_time(np.arange(1000) * 0.001)
+    # data should be on disk and no longer held by the time series
+    if "_value" in ts.spec["data"] or "_value" in ts.spec["timestamps"]:
+        ut.error("Checking write-through", "Data still held in memory")
+    if "acquisition/timeseries/wt/data" not in neurodata.file_pointer:
+        ut.error("Checking write-through", "Data not written to file")
+    # path unknown when data set -- write is deferred
+    lfp_ts = neurodata.create_timeseries("ElectricalSeries", "flushed")
+    lfp_ts.set_value("electrode_idx", [0, 1])
+    lfp_ts.set_data(np.zeros((200, 2)), "Volts", 1.0, 0.001, flush=True)
+    lfp_ts.set_time_by_rate(0.0, 1000.0)
+    if "_value" not in lfp_ts.spec["data"]:
+        ut.error("Checking deferred write", "Data flushed before path known")
+    mod = neurodata.create_module("mod")
+    iface = mod.create_interface("LFP")
+    iface.add_timeseries(lfp_ts)
+    iface.finalize()
+    mod.finalize()
+    neurodata.close()
+
+test_write_through()
+print("%s PASSED" % __file__)